@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ADs 规则链基准：normalize → keyword → optimize → whitelist → finalize。
+
+对比当前实现在 "禁用不变量" (每个阶段各自排序/去重) 与 "传递不变量" 两种模式下的各阶段耗时。
+两列都是当前代码，"禁用不变量" 一列并非引入不变量之前的旧实现。
+缓存 (白名单索引、content-state) 写入基准的临时目录，不触碰仓库的 .cache。
+
+加 --memory 时改为对比标签驻留的开与关，分别在禁用不变量 (optimize 走排序扫描，持有全部标签元组)
+与传递不变量 (optimize 走已去重路径，不使用标签元组) 下运行。每种组合在独立的 spawn 子进程中运行，
+统计每个阶段结束时子进程的峰值 RSS (resource.getrusage 的 ru_maxrss，为累计高水位)。
+关闭驻留时以不经 sys.intern 的等价实现替换 utils.reversed_labels。
+用法: PYTHONPATH=scripts python3 benchmarks/bench_ads_chain.py [规则条数] [--memory]
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import resource
+import tempfile
+import contextlib
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+import utils
+
+TLDS = ["com", "net", "org", "cn", "io", "com.cn", "co.uk"]
+
+
+def make_corpus(path, allow_path, count, seed=42):
+    rnd = random.Random(seed)
+    domains = []
+    for i in range(count):
+        depth = rnd.choice([0, 0, 1, 1, 2])
+        labels = [f"n{rnd.randrange(50)}" for _ in range(depth)]
+        domains.append(".".join(labels + [f"site{rnd.randrange(count // 4 + 1)}", rnd.choice(TLDS)]))
+    formats = ["0.0.0.0 {}", "||{}^", "{}", "+.{}", "DOMAIN-SUFFIX,{}"]
+    with open(path, "w", encoding="utf-8") as f:
+        for d in domains:
+            f.write(rnd.choice(formats).format(d) + "\n")
+    with open(allow_path, "w", encoding="utf-8") as f:
+        for d in rnd.sample(domains, max(1, count // 200)):
+            f.write(d + "\n")
+
+
+def _plain_reversed_labels(domain):
+    """reversed_labels 的不驻留版本，用于对比。"""
+    return tuple(reversed(domain.split(".")))
+
+
+def _peak_rss_mb():
+    # Linux 上 ru_maxrss 的单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_chain(work, raw, allow, track, memory=False):
+    timings = {}
+    inv = utils.NO_INVARIANTS
+
+    def stage(name, fn, *args):
+        start = time.perf_counter()
+        out = fn(*args)
+        timings[name] = _peak_rss_mb() if memory else time.perf_counter() - start
+        return out if track else utils.NO_INVARIANTS
+
+    p = lambda n: os.path.join(work, n)
+    inv = stage("normalize", utils.process_normalize_domain, raw, p("clean.txt"), True)
+    inv = stage("keyword", utils.apply_keyword_filter, p("clean.txt"), p("filter.txt"), inv)
+    allow_inv = stage("normalize_allow", utils.process_normalize_domain, allow, p("clean_allow.txt"), False)
+    inv = stage("optimize", utils.optimize_smart_self, p("filter.txt"), p("opt.txt"), inv)
+    stage("optimize_allow", utils.optimize_smart_self, p("clean_allow.txt"), p("opt_allow.txt"), allow_inv)
+    inv = stage("whitelist", utils.apply_advanced_whitelist_filter, p("opt.txt"), p("opt_allow.txt"), p("final.txt"), inv)
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        stage("finalize", utils.finalize_output, p("final.txt"), work, "ADs_merged", "add_prefix", inv)
+    return timings
+
+
+def _memory_child(work, raw, allow, track, intern):
+    """spawn 子进程入口：按不变量与驻留开关运行一遍规则链，返回各阶段结束时的峰值 RSS。"""
+    if not intern:
+        utils.reversed_labels = _plain_reversed_labels
+    out_dir = os.path.join(work, f"mem-{int(track)}{int(intern)}")
+    os.makedirs(out_dir)
+    utils.CACHE_DIR = os.path.join(out_dir, "cache")
+    timings = {"start": _peak_rss_mb()}
+    timings.update(run_chain(out_dir, raw, allow, track, memory=True))
+    return timings
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    memory = "--memory" in sys.argv
+    count = int(args[0]) if args else 300000
+    work = tempfile.mkdtemp(prefix="bench_ads_")
+    try:
+        raw, allow = os.path.join(work, "raw.txt"), os.path.join(work, "allow.txt")
+        make_corpus(raw, allow, count)
+        results = {}
+        if memory:
+            ctx = multiprocessing.get_context("spawn")
+            for label, track, intern in (("排序·不驻留", False, False), ("排序·驻留", False, True),
+                                         ("去重·不驻留", True, False), ("去重·驻留", True, True)):
+                with ctx.Pool(1) as pool:
+                    results[label] = pool.apply(_memory_child, (work, raw, allow, track, intern))
+        else:
+            for label, track in (("禁用不变量", False), ("传递不变量", True)):
+                # 每种模式使用独立的空缓存目录，白名单索引都从文本重新构建
+                utils.CACHE_DIR = os.path.join(work, f"cache-{int(track)}")
+                utils._ALLOW_INDEXES.clear()
+                results[label] = run_chain(work, raw, allow, track)
+        unit = "MB" if memory else "s"
+        print(f"📈 ADs 规则链基准 (原始规则 {count:,} 条, {'子进程峰值 RSS (ru_maxrss 高水位)' if memory else '耗时'})")
+        stages = list(next(iter(results.values())))
+        print(f"{'阶段':<16}" + "".join(f"{label:>14}" for label in results))
+        # 峰值 RSS 为累计高水位，total 即最后一个阶段的值
+        for name in stages + ([] if memory else ["total"]):
+            row = [sum(t.values()) if name == "total" else t[name] for t in results.values()]
+            print(f"{name:<16}" + "".join(f"{v:>13.3f}{unit}" for v in row))
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sing-box 源规则集 JSON 写出基准：json.dump(indent=2) 对比流式写出 (缩进 / 紧凑)。
+
+默认读取 output/mihomo/ADs_merged.txt 作为输入，不存在时生成同规模的合成规则集。
+统计各方式的编码写出耗时与文件字节数。
+用法: python3 benchmarks/bench_singbox_json.py [ADs_merged.txt] [合成规则条数]
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import tempfile
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+import build_singbox
+
+TLDS = ["com", "net", "org", "cn", "io"]
+
+
+def make_ads(path, count, seed=42):
+    rnd = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            domain = f"h{i}.site{rnd.randrange(count)}.{rnd.choice(TLDS)}"
+            f.write(("+." if rnd.random() < 0.8 else "") + domain + "\n")
+
+
+def load_rule_dict(txt_path, work):
+    """复用 convert_txt_to_json 的解析结果，保证与实际写出的规则内容一致。"""
+    json_path = os.path.join(work, "parsed.json")
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        build_singbox.convert_txt_to_json(txt_path, json_path, compact=True)
+    with open(json_path, "r", encoding="utf-8") as f:
+        return json.load(f)["rules"][0]
+
+
+def bench(label, fn, path, repeat=3):
+    best = min(_timed(fn, path) for _ in range(repeat))
+    print(f"{label:<24}{best:>10.3f}s{os.path.getsize(path) / 1e6:>12.2f}MB")
+
+
+def _timed(fn, path):
+    start = time.perf_counter()
+    fn(path)
+    return time.perf_counter() - start
+
+
+def main():
+    args = sys.argv[1:]
+    work = tempfile.mkdtemp(prefix="bench_sb_json_")
+    try:
+        src = args[0] if args else "output/mihomo/ADs_merged.txt"
+        if not os.path.exists(src):
+            src = os.path.join(work, "ADs_merged.txt")
+            make_ads(src, int(args[1]) if len(args) > 1 else 300000)
+        rule = load_rule_dict(src, work)
+        total = sum(len(v) for v in rule.values())
+        print(f"📈 Sing-box JSON 写出基准 ({src}, 规则 {total:,} 条)")
+        print(f"{'方式':<22}{'耗时':>11}{'大小':>12}")
+
+        def dump_indent(path):
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({"version": 5, "rules": [rule]}, f, indent=2, ensure_ascii=False)
+
+        out = os.path.join(work, "out.json")
+        bench("json.dump indent=2", dump_indent, out)
+        bench("stream indent=2", lambda p: build_singbox.write_ruleset_json(p, rule), out)
+        bench("stream compact", lambda p: build_singbox.write_ruleset_json(p, rule, compact=True), out)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+构建报告：上游来源贡献与重叠分析等统计数据，写入 output/report/*.json。
+
+来源贡献以最终规则集为准：最终规则中的每一条记录其出现在哪些来源中 (按来源序号位掩码)，
+由此得到每个来源的独占贡献数 (只有它提供的规则) 与两两来源之间的重叠矩阵。
+"""
+import os
+import glob
+import json
+import hashlib
+from collections import Counter
+import utils
+
+REPORT_DIR = "output/report"
+# 独占贡献占最终规则比例低于该值的来源会在日志中提示，可考虑移除
+LOW_CONTRIBUTION_RATIO = 0.001
+
+
+def write_report(name, data):
+    """将报告写入 output/report/<name>.json，返回写入路径。"""
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    path = os.path.join(REPORT_DIR, f"{name}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    return path
+
+
+def source_contributions(ruleset, sources, final_rules):
+    """
+    计算各来源对最终规则集的贡献。
+    sources 为 [(url, 规则集合)]，规则格式须与 final_rules 一致 (同一清洗阶段的产物)。
+    """
+    final_rules = set(final_rules)
+    masks = {}
+    for i, (_, rules) in enumerate(sources):
+        bit = 1 << i
+        for rule in rules:
+            if rule in final_rules:
+                masks[rule] = masks.get(rule, 0) | bit
+    # 不同的来源组合数远少于规则数，按掩码聚合后再统计
+    mask_counts = Counter(masks.values())
+
+    n = len(sources)
+    overlap = [[0] * n for _ in range(n)]
+    unique = [0] * n
+    for mask, count in mask_counts.items():
+        members = [i for i in range(n) if mask >> i & 1]
+        if len(members) == 1:
+            unique[members[0]] += count
+        for i in members:
+            for j in members:
+                overlap[i][j] += count
+
+    return {
+        "ruleset": ruleset,
+        "final_rules": len(final_rules),
+        "unattributed_rules": len(final_rules) - len(masks),
+        "sources": [
+            {
+                "url": url,
+                "rules": len(rules),
+                "in_final": overlap[i][i],
+                "unique": unique[i],
+            }
+            for i, (url, rules) in enumerate(sources)
+        ],
+        "overlap": overlap,
+    }
+
+
+def report_source_contributions(ruleset, sources, final_rules):
+    """计算来源贡献，写入 output/report/sources_<ruleset>.json 并在日志中输出摘要。"""
+    data = source_contributions(ruleset, sources, final_rules)
+    write_report(f"sources_{ruleset}", data)
+    total = data["final_rules"]
+    for entry in data["sources"]:
+        flag = "⚠️" if total and entry["unique"] < total * LOW_CONTRIBUTION_RATIO else "📊"
+        print(f"{flag} [来源] {ruleset:<25} | 独占: {entry['unique']:>7,} | 进入最终: {entry['in_final']:>7,} | "
+              f"原始: {entry['rules']:>7,} | {entry['url']}")
+    return data
+
+
+def report_source_files(ruleset, sources, final_path):
+    """同 report_source_contributions，来源与最终规则均从文件读取 (每行一条)，适合在 CPU 进程池中执行。"""
+    def read_rules(path):
+        if not os.path.exists(path):
+            return set()
+        return {line for line in utils.read_text_bulk(path).split('\n') if line and not line.startswith('#')}
+
+    source_rules = [(url, read_rules(path)) for url, path in sources]
+    return report_source_contributions(ruleset, source_rules, read_rules(final_path))
+
+
+class RulesetIndex:
+    """
+    跨规则集覆盖索引：记录每条精确条目与 +. / . 后缀根出现在哪些规则集中 (位掩码)。
+    覆盖语义与 utils.prune_subsumed 一致：+.S 覆盖 S 及其子域，.S 仅覆盖严格子域，通配条目按固定尾部判定。
+    """
+
+    def __init__(self, rulesets):
+        # rulesets: [(名称, 条目列表)]，条目为 mihomo 文本格式且已剔除注释与 IP
+        self.names = [name for name, _ in rulesets]
+        self.entries = [entries for _, entries in rulesets]
+        self.exact = {}
+        self.plus = {}
+        self.dot = {}
+        for i, entries in enumerate(self.entries):
+            bit = 1 << i
+            for entry in entries:
+                self.exact[entry] = self.exact.get(entry, 0) | bit
+                if '*' in entry: continue
+                if entry.startswith('+.'):
+                    self.plus[entry[2:]] = self.plus.get(entry[2:], 0) | bit
+                elif entry.startswith('.'):
+                    self.dot[entry[1:]] = self.dot.get(entry[1:], 0) | bit
+
+    def _parents_mask(self, domain):
+        mask = 0
+        pos = domain.find('.')
+        while pos != -1:
+            parent = domain[pos + 1:]
+            mask |= self.plus.get(parent, 0) | self.dot.get(parent, 0)
+            pos = domain.find('.', pos + 1)
+        return mask
+
+    def covering_mask(self, entry):
+        """返回包含或覆盖该条目的规则集位掩码 (含条目所在的规则集本身)。"""
+        mask = self.exact.get(entry, 0)
+        if '*' in entry:
+            tail = entry[entry.rfind('*') + 1:]
+            if tail.startswith('.') and len(tail) > 1:
+                root = tail[1:]
+                mask |= self.plus.get(root, 0) | self.dot.get(root, 0) | self._parents_mask(root)
+        elif entry.startswith('+.'):
+            mask |= self._parents_mask(entry[2:])
+        elif entry.startswith('.'):
+            mask |= self.plus.get(entry[1:], 0) | self._parents_mask(entry[1:])
+        else:
+            mask |= self.plus.get(entry, 0) | self._parents_mask(entry)
+        return mask
+
+    def overlap_matrix(self):
+        """matrix[b][a] 为规则集 b 中被规则集 a 包含或覆盖的条目数 (a != b)。"""
+        n = len(self.names)
+        matrix = [[0] * n for _ in range(n)]
+        for b, entries in enumerate(self.entries):
+            row = matrix[b]
+            for entry in entries:
+                others = self.covering_mask(entry) & ~(1 << b)
+                while others:
+                    low = others & -others
+                    row[low.bit_length() - 1] += 1
+                    others ^= low
+        return matrix
+
+
+def read_ruleset_entries(path):
+    """读取 mihomo 文本规则集中的域名条目 (跳过注释与 IP/CIDR)。"""
+    entries = []
+    for line in utils.read_text_bulk(path).split('\n'):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        # 域名条目不含冒号且不以数字结尾，仅对疑似 IP 的行做完整解析
+        if (':' in line or line[-1].isdigit()) and utils.is_valid_ip_or_cidr(line):
+            continue
+        entries.append(line)
+    return entries
+
+
+def report_ruleset_overlaps(txt_dir, exclude=()):
+    """
+    在阶段 1 完成后为 txt_dir 下全部规则集建立覆盖索引，写入 output/report/ruleset_overlap.json。
+    exclude 中的规则集 (如精简版，必然被完整版覆盖) 不参与统计。
+    """
+    paths = sorted(glob.glob(os.path.join(txt_dir, "*.txt")))
+    names = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+    rulesets = [(name, read_ruleset_entries(p)) for name, p in zip(names, paths) if name not in exclude]
+    rulesets = [(name, entries) for name, entries in rulesets if entries]
+    index = RulesetIndex(rulesets)
+    matrix = index.overlap_matrix()
+    pairs = []
+    for b, row in enumerate(matrix):
+        for a, count in enumerate(row):
+            if count:
+                pairs.append({"ruleset": index.names[b], "covered_by": index.names[a], "entries": count,
+                              "ratio": round(count / len(index.entries[b]), 4)})
+    pairs.sort(key=lambda p: -p["entries"])
+    write_report("ruleset_overlap", {
+        "rulesets": {name: len(entries) for name, entries in rulesets},
+        "overlaps": pairs,
+    })
+    for pair in pairs[:10]:
+        print(f"🔁 [重叠] {pair['ruleset']:<25} | 被 {pair['covered_by']} 覆盖: {pair['entries']:,} ({pair['ratio']:.1%})")
+    return pairs
+
+
+def apply_precedence(txt_dir, groups):
+    """
+    按优先级组消除冗余：组内靠前的规则集优先，靠后的规则集中被其覆盖的域名条目被移除，
+    重写 .txt (更新 # Count 头) 并重新编译对应的 .mrs。返回 {规则集: 移除条数}。
+    组内全部规则集 (含未移除条目的) 的 # Updated 头都在此按最终内容记录 (finalize_output 已跳过)。
+    """
+    removed = {}
+    for group in groups:
+        paths = [os.path.join(txt_dir, f"{name}.txt") for name in group]
+        present = [(name, path) for name, path in zip(group, paths) if os.path.exists(path)]
+        index = RulesetIndex([(name, read_ruleset_entries(path)) for name, path in present])
+        for pos, (name, path) in enumerate(present):
+            higher = (1 << pos) - 1
+            drop = {entry for entry in index.entries[pos] if index.covering_mask(entry) & higher} if higher else set()
+            _rewrite_ruleset(name, path, drop)
+            if not drop: continue
+            removed[name] = len(drop)
+            print(f"✂️ [优先级] {name:<25} | 移除被更高优先级规则集覆盖的条目: {len(drop):,}")
+    return removed
+
+
+def _rewrite_ruleset(name, path, drop):
+    lines = utils.read_text_bulk(path).split('\n')
+    kept = [line for line in lines if line.strip() and line.strip() not in drop]
+    rules = [line for line in kept if not line.startswith('#')]
+    headers = {"# Count:": f"# Count: {len(rules)}"}
+    if any(line.startswith("# Updated:") for line in kept):
+        # 与 finalize_output 相同的 key 与摘要口径，每次构建只按最终内容记录一次
+        digest = hashlib.sha256(('\n'.join(rules) + '\n').encode('utf-8')).hexdigest()
+        updated = utils.content_change_time(f"header:{os.path.basename(os.path.dirname(path))}/{name}.txt", digest)
+        headers["# Updated:"] = f"# Updated: {updated}"
+    kept = [headers.get(line[:line.find(':') + 1], line) if line.startswith('#') else line for line in kept]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(kept) + '\n')
+    if drop and utils.check_mihomo():
+        dom_lines = [line for line in rules if not utils.is_valid_ip_or_cidr(line)]
+        temp_path = os.path.join(utils.get_work_dir(), f"{name}_precedence.txt")
+        with open(temp_path, 'w', encoding='utf-8') as tf:
+            tf.write('\n'.join(dom_lines) + '\n')
+        try:
+            utils.compile_ruleset(
+                ["mihomo", "convert-ruleset", "domain", "text", temp_path, os.path.join(os.path.dirname(path), f"{name}.mrs")],
+                f"{name}.mrs"
+            )
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
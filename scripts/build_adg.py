@@ -6,6 +6,21 @@ from utils import download_file
 import utils
 import providers
 
+def adg_block_rules(lines):
+    """
+    域名条目 → AdGuard 拦截规则 ||x^。
+    AdGuard 中 ||x^ 同时匹配 x 及其全部子域，+.x、.x 与 x 写出后等价，
+    因此统一按 +.x 交给 prune_subsumed，移除已被父域规则覆盖的条目与重复项。
+    """
+    roots = []
+    for line in lines:
+        domain = line.strip()
+        if not domain or domain.startswith('#'): continue
+        if domain.startswith("+."): domain = domain[2:]
+        elif domain.startswith("."): domain = domain[1:]
+        roots.append("+." + domain)
+    return [f"||{root[2:]}^" for root in utils.prune_subsumed(roots)]
+
 def run_all():
     os.makedirs("output/adg", exist_ok=True)
 
@@ -18,14 +33,9 @@ def run_all():
     # 添加拦截规则 (从未经过白名单过滤的 opt_ads 读取)
     if os.path.exists(opt_ads_path):
         with open(opt_ads_path, 'r', encoding='utf-8') as f:
-            for line in f.read().splitlines():
-                domain = line.strip()
-                if not domain or domain.startswith('#'): continue
-                if domain.startswith("+."): domain = domain[2:]
-                elif domain.startswith("."): domain = domain[1:]
-                adg_lines.append(f"||{domain}^")
+            adg_lines.extend(adg_block_rules(f.read().splitlines()))
             
-    # 添加放行/白名单规则 (从 opt_allow 读取，并加上 @@|| 前缀)
+    # 添加放行/白名单规则 (从 build_mihomo.gen_ads_reject 写出的 opt_allow 读取，并加上 @@|| 前缀)
     if os.path.exists(opt_allow_path):
         with open(opt_allow_path, 'r', encoding='utf-8') as f:
             for line in f.read().splitlines():
@@ -40,6 +50,16 @@ def run_all():
         f.write('\n'.join(adg_lines) + '\n')
     print(f"✅ [AdGuard] {'ADs_merged_adg':<24} | 规则数: {len(adg_lines):,} (包含白名单例外规则)")
 
+    # 精简版 (已经过白名单过滤，无需附带例外规则)
+    for name, conf in providers.OUTPUT_PROFILES.items():
+        lite_path = f"output/mihomo/{name}.txt"
+        if conf["source"] != "ADs_merged" or not os.path.exists(lite_path): continue
+        with open(lite_path, 'r', encoding='utf-8') as f:
+            lite_lines = adg_block_rules(f.read().splitlines())
+        with open(f"output/adg/{name}_adg.txt", 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lite_lines) + '\n')
+        print(f"✅ [AdGuard] {name + '_adg':<24} | 规则数: {len(lite_lines):,}")
+
     # 2. Httpdns
     content = download_file(providers.ADG_URLS["Httpdns"])
     lines = []
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+V2Ray 风格 geosite.dat / geoip.dat：将全部 Mihomo 规则集打包为两个文件，每个规则集一个分类 (名称转大写)，
+客户端以 geosite:<名称> / geoip:<名称> 引用，启动时只需打开两个文件。
+
+格式为 v2fly 的 protobuf 定义 (GeoSiteList / GeoIPList)，编码由本模块直接按 wire format 写出，不依赖外部程序：
+  GeoSiteList { repeated GeoSite entry = 1 }  GeoSite { string country_code = 1; repeated Domain domain = 2 }
+  Domain { Type type = 1; string value = 2 }  Type: Plain = 0, Regex = 1, Domain = 2, Full = 3
+  GeoIPList { repeated GeoIP entry = 1 }      GeoIP { string country_code = 1; repeated CIDR cidr = 2 }
+  CIDR { bytes ip = 1; uint32 prefix = 2 }
+"""
+import os
+import re
+import glob
+import hashlib
+import ipaddress
+import utils
+
+OUT_DIR = "output/geodat"
+
+DOMAIN_PLAIN = 0
+DOMAIN_REGEX = 1
+DOMAIN_SUFFIX = 2
+DOMAIN_FULL = 3
+
+
+def _varint(value):
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _bytes_field(field, data):
+    return _varint(field << 3 | 2) + _varint(len(data)) + data
+
+
+def _varint_field(field, value):
+    # proto3 标量取默认值 0 时不写出
+    return _varint(field << 3) + _varint(value) if value else b""
+
+
+def _wildcard_regex(body):
+    # Mihomo 通配：标签 * 匹配恰好一级，标签内的 * 匹配该级内任意字符
+    return r'\.'.join('[^.]+' if label == '*' else re.escape(label).replace(r'\*', '[^.]*')
+                      for label in body.split('.'))
+
+
+def domain_entry(rule):
+    """Mihomo 域名条目 → (Domain.Type, value)：+.x 为 Domain，x 为 Full，.x 与通配条目转为等价正则。"""
+    if rule.startswith('+.'):
+        body = rule[2:]
+        if '*' not in body: return DOMAIN_SUFFIX, body
+        return DOMAIN_REGEX, rf'^(?:.+\.)?{_wildcard_regex(body)}$'
+    if rule.startswith('.'):
+        return DOMAIN_REGEX, rf'^.+\.{_wildcard_regex(rule[1:])}$'
+    if '*' in rule:
+        return DOMAIN_REGEX, f'^{_wildcard_regex(rule)}$'
+    return DOMAIN_FULL, rule
+
+
+def encode_geosite(code, rules):
+    domains = b"".join(
+        _bytes_field(2, _varint_field(1, kind) + _bytes_field(2, value.encode('utf-8')))
+        for kind, value in map(domain_entry, rules)
+    )
+    return _bytes_field(1, code.encode('utf-8')) + domains
+
+
+def encode_geoip(code, networks):
+    cidrs = b"".join(
+        _bytes_field(2, _bytes_field(1, net.network_address.packed) + _varint_field(2, net.prefixlen))
+        for net in networks
+    )
+    return _bytes_field(1, code.encode('utf-8')) + cidrs
+
+
+def collapse_networks(lines):
+    """IP/CIDR 行合并为最少的网段列表 (IPv4 在前，各自有序)，无法解析的行跳过。"""
+    nets = []
+    for line in lines:
+        try:
+            nets.append(ipaddress.ip_network(line, strict=False))
+        except ValueError:
+            continue
+    v4 = ipaddress.collapse_addresses(n for n in nets if n.version == 4)
+    v6 = ipaddress.collapse_addresses(n for n in nets if n.version == 6)
+    return list(v4) + list(v6)
+
+
+def split_ruleset(path):
+    """
+    读取 Mihomo 文本规则集，拆分为 (域名条目, IP/CIDR 条目)。
+    IP 条目取 clean_ip_line 清洗后的纯网段，带 IP-CIDR, / no-resolve 等附加字段或误加前缀的行同样识别。
+    """
+    domains, ips = [], []
+    for line in utils.read_text_bulk(path).split('\n'):
+        line = line.strip()
+        if not line or line.startswith('#'): continue
+        if ':' in line or ',' in line or line[-1].isdigit():
+            ip = utils.clean_ip_line(line)
+            if ip:
+                ips.append(ip)
+                continue
+        domains.append(line)
+    return domains, ips
+
+
+def _write(path, entries):
+    data = b"".join(_bytes_field(1, entry) for entry in entries)
+    with open(path, 'wb') as f:
+        f.write(data)
+    with open(path + ".sha256sum", 'w', encoding='utf-8') as f:
+        f.write(f"{hashlib.sha256(data).hexdigest()}  {os.path.basename(path)}\n")
+    return len(data)
+
+
+def run_all(txt_dir="output/mihomo", out_dir=OUT_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    sites, geoips = [], []
+    for path in sorted(glob.glob(os.path.join(txt_dir, "*.txt"))):
+        code = os.path.splitext(os.path.basename(path))[0].upper()
+        domains, ips = split_ruleset(path)
+        if domains:
+            sites.append((code, domains))
+        if ips:
+            geoips.append((code, collapse_networks(ips)))
+
+    site_size = _write(os.path.join(out_dir, "geosite.dat"), [encode_geosite(code, rules) for code, rules in sites])
+    ip_size = _write(os.path.join(out_dir, "geoip.dat"), [encode_geoip(code, nets) for code, nets in geoips])
+    print(f"✅ [GeoDat] {'geosite.dat':<25} | 分类: {len(sites)} | 条目: {sum(len(r) for _, r in sites):,} | {site_size / 1e6:.2f}MB")
+    print(f"✅ [GeoDat] {'geoip.dat':<25} | 分类: {len(geoips)} | 网段: {sum(len(n) for _, n in geoips):,} | {ip_size / 1e6:.2f}MB")
+
+
+if __name__ == '__main__':
+    run_all()
@@ -1,11 +1,18 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import os
-import re
 import shutil
-from concurrent.futures import ThreadPoolExecutor
+import threading
 import utils
+import executors
 import providers
+import analytics
+import delta
+import rule_history
+
+# 精简版来源规则集 -> (各上游来源清洗后的文件, finalize 模式)，由各 gen_* 登记
+_PROFILE_SOURCES = {}
+_PROFILE_SOURCES_LOCK = threading.Lock()
 
 def _merge_allow_list(raw_allow_path, merged_output_path):
     """合并共享白名单和 exclude-keyword.txt 为统一的白名单文件"""
@@ -22,121 +29,202 @@ def _merge_allow_list(raw_allow_path, merged_output_path):
     with open(merged_output_path, 'w', encoding='utf-8') as f:
         f.write("".join(allow_content))
 
+def _shared_clean_allow_path():
+    return os.path.join(utils.get_work_dir(), "shared", "clean_allow.txt")
+
+def _normalize_sources(sources, skip_allow_rules):
+    """逐来源清洗 (CPU 进程池并行)，返回 [(url, 清洗后路径)]。各来源输出均有序去重，可直接线性归并。"""
+    cleaned = [(url, os.path.splitext(path)[0] + "_clean.txt") for url, path in sources]
+    futures = [
+        executors.cpu_pool().submit(utils.process_normalize_domain, src, dst, skip_allow_rules=skip_allow_rules,
+                                    fmt=providers.SOURCE_FORMATS.get(url))
+        for (url, src), (_, dst) in zip(sources, cleaned)
+    ]
+    for future in futures:
+        future.result()
+    return cleaned
+
+def _promote_suffixes(ruleset, block_in, final_out, invariants):
+    """按 providers.SUFFIX_PROMOTION 对规则集做密集子域提升 (未配置时原样复制)，写出报告并返回不变量。"""
+    conf = providers.SUFFIX_PROMOTION.get(ruleset)
+    if not conf:
+        shutil.copyfile(block_in, final_out)
+        return invariants
+    invariants, report = executors.run_cpu(
+        utils.promote_dense_subdomains, block_in, _shared_clean_allow_path(), final_out,
+        conf["threshold"], conf.get("apply", False), invariants
+    )
+    analytics.write_report(f"suffix_promotion_{ruleset}", {"ruleset": ruleset, **report})
+    state = "已应用" if report["applied"] else "仅评估"
+    print(f"🪄 [后缀提升] {ruleset:<25} | {state} | 可提升: {len(report['promoted']):,} 个域名 | "
+          f"节省规则: {report['saved']:,} | 白名单阻止: {len(report['allowlisted']):,}")
+    return invariants
+
+def _register_profile_sources(ruleset, source_paths, mode):
+    """登记精简版来源规则集的上游来源文件，精简版在优先级裁剪之后由 _emit_profiles 统一生成。"""
+    with _PROFILE_SOURCES_LOCK:
+        _PROFILE_SOURCES[ruleset] = (list(source_paths), mode)
+
+def _emit_profiles():
+    """
+    按 providers.OUTPUT_PROFILES 从 output/mihomo 下的最终规则集生成精简版。
+    在 analytics.apply_precedence 之后执行，精简版不会含有来源规则集已被裁剪掉的条目。
+    """
+    with _PROFILE_SOURCES_LOCK:
+        registered = dict(_PROFILE_SOURCES)
+    for name, conf in providers.OUTPUT_PROFILES.items():
+        final_path = os.path.join("output/mihomo", f"{conf['source']}.txt")
+        if conf["source"] not in registered or not os.path.exists(final_path): continue
+        source_paths, mode = registered[conf["source"]]
+        profile_path = os.path.join(utils.get_work_dir(), f"{name}_profile.txt")
+        profile_inv, stats = executors.run_cpu(
+            utils.select_budget_profile, final_path, source_paths, profile_path,
+            conf.get("max_rules"), conf.get("max_bytes"), conf.get("score", "sources"), mode == "add_prefix"
+        )
+        min_sources = f" | 最低来源数: {stats['min_sources']}" if "min_sources" in stats else ""
+        print(f"🪶 [精简版] {name:<25} | 选取: {stats['rules']:,}/{stats['total_rules']:,} | "
+              f"{stats['bytes'] / 1e6:.2f}MB{min_sources}")
+        utils.finalize_output(profile_path, "output/mihomo", name, mode, profile_inv)
+
+def _read_lines(path):
+    if not os.path.exists(path): return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().splitlines()
+
 def gen_ads_reject():
     mod_dir = os.path.join(utils.get_work_dir(), "ads")
     os.makedirs(mod_dir, exist_ok=True)
-    raw_ads, raw_allow = os.path.join(mod_dir, "raw_ads.txt"), os.path.join(mod_dir, "raw_allow.txt")
+    raw_ads = os.path.join(mod_dir, "raw_ads.txt")
     
-    # 下载广告规则
-    utils.download_files_parallel(raw_ads, providers.ADS_BLOCK_URLS)
-    
-    # 从共享缓存复制白名单规则
-    shared_allow = os.path.join(utils.get_work_dir(), "shared", "raw_allow.txt")
-    if os.path.exists(shared_allow):
-        shutil.copyfile(shared_allow, raw_allow)
-    else:
-        with open(raw_allow, 'w', encoding='utf-8') as f:
-            pass
+    # 下载广告规则，逐来源保存以便统计各来源贡献
+    sources = utils.download_files_parallel(raw_ads, providers.ADS_BLOCK_URLS, source_dir=os.path.join(mod_dir, "sources"))
 
+    # 各来源并行清洗后归并，结果与整体清洗一致
     clean_ads, filter_ads = os.path.join(mod_dir, "clean_ads.txt"), os.path.join(mod_dir, "filter_ads.txt")
-    utils.process_normalize_domain(raw_ads, clean_ads, skip_allow_rules=True)
-    utils.apply_keyword_filter(clean_ads, filter_ads)
-
-    merged_allow_raw = os.path.join(mod_dir, "merged_allow_raw.txt")
-    _merge_allow_list(raw_allow, merged_allow_raw)
+    clean_sources = _normalize_sources(sources, skip_allow_rules=True)
+    ads_inv = utils.merge_sorted_files([path for _, path in clean_sources], clean_ads)
+    ads_inv = utils.apply_keyword_filter(clean_ads, filter_ads, ads_inv)
 
-    clean_allow, opt_ads, opt_allow, final_ads = [os.path.join(mod_dir, x) for x in ["clean_allow.txt", "opt_ads.txt", "opt_allow.txt", "final_ads.txt"]]
-    utils.process_normalize_domain(merged_allow_raw, clean_allow, skip_allow_rules=False)
-    utils.optimize_smart_self(filter_ads, opt_ads)
-    utils.optimize_smart_self(clean_allow, opt_allow)
-    utils.apply_advanced_whitelist_filter(opt_ads, opt_allow, final_ads)
-    utils.finalize_output(final_ads, "output/mihomo", "ADs_merged", "add_prefix")
+    # 使用 run_all 中预先清洗并编译好索引的共享白名单
+    clean_allow = _shared_clean_allow_path()
+    opt_ads, opt_allow, final_ads = [os.path.join(mod_dir, x) for x in ["opt_ads.txt", "opt_allow.txt", "final_ads.txt"]]
+    ads_inv = executors.run_cpu(utils.optimize_smart_self, filter_ads, opt_ads, ads_inv)
+    # opt_allow 不参与白名单过滤 (过滤直接使用 clean_allow 的预编译索引)，由 build_adg 读取生成 @@|| 放行规则
+    executors.run_cpu(utils.optimize_smart_self, clean_allow, opt_allow, utils.SORTED_UNIQUE)
+    ads_inv = executors.run_cpu(utils.apply_advanced_whitelist_filter, opt_ads, clean_allow, final_ads, ads_inv)
+    executors.run_cpu(analytics.report_source_files, "ADs_merged", clean_sources, final_ads)
+    rule_history.register_sources("ADs_merged", clean_sources)
+    promoted_ads = os.path.join(mod_dir, "promoted_ads.txt")
+    ads_inv = _promote_suffixes("ADs_merged", final_ads, promoted_ads, ads_inv)
+    utils.finalize_output(promoted_ads, "output/mihomo", "ADs_merged", "add_prefix", ads_inv)
+    _register_profile_sources("ADs_merged", [path for _, path in clean_sources], "add_prefix")
 
 def gen_ai():
     mod_dir = os.path.join(utils.get_work_dir(), "ai")
     os.makedirs(mod_dir, exist_ok=True)
     raw_ai, clean_ai, opt_ai = [os.path.join(mod_dir, x) for x in ["raw_ai.txt", "clean_ai.txt", "opt_ai.txt"]]
-    utils.download_files_parallel(raw_ai, providers.AI_URLS)
-    utils.process_normalize_domain(raw_ai, clean_ai, skip_allow_rules=False)
-    utils.optimize_smart_self(clean_ai, opt_ai)
-    utils.finalize_output(opt_ai, "output/mihomo", "AIs_merged", "add_prefix")
+    sources = utils.download_files_parallel(raw_ai, providers.AI_URLS, source_dir=os.path.join(mod_dir, "sources"))
+    clean_sources = _normalize_sources(sources, skip_allow_rules=False)
+    ai_inv = utils.merge_sorted_files([path for _, path in clean_sources], clean_ai)
+    ai_inv = executors.run_cpu(utils.optimize_smart_self, clean_ai, opt_ai, ai_inv)
+    executors.run_cpu(analytics.report_source_files, "AIs_merged", clean_sources, opt_ai)
+    rule_history.register_sources("AIs_merged", clean_sources)
+    utils.finalize_output(opt_ai, "output/mihomo", "AIs_merged", "add_prefix", ai_inv)
 
 def gen_fakeip():
     mod_dir = os.path.join(utils.get_work_dir(), "fakeip")
     os.makedirs(mod_dir, exist_ok=True)
     raw_fakeip_dl = os.path.join(mod_dir, "raw_fakeip_dl.txt")
-    utils.download_files_parallel(raw_fakeip_dl, providers.FAKE_IP_URLS)
-    unique_lines = set()
-    if os.path.exists(raw_fakeip_dl):
-        with open(raw_fakeip_dl, 'r', encoding='utf-8') as f:
-            for line in f.read().splitlines():
-                line = line.lower()
-                if re.match(r'^\s*(dns:|fake-ip-filter:)', line): continue
-                line = re.sub(r'^\s*-\s*', '', line).replace('"', '').replace("'", '').replace('\\', '').strip()
-                if line and not line.startswith('#'): unique_lines.add(line)
+    sources = utils.download_files_parallel(raw_fakeip_dl, providers.FAKE_IP_URLS, source_dir=os.path.join(mod_dir, "sources"))
+    source_rules = []
+    for url, path in sources:
+        text = utils.read_text_bulk(path, lower=True) if os.path.exists(path) else ""
+        source_rules.append((url, utils.parse_fakeip_text(text, providers.SOURCE_FORMATS.get(url))))
+    unique_lines = set().union(*(rules for _, rules in source_rules))
     clean_fakeip, final_fakeip = os.path.join(mod_dir, "clean_fakeip.txt"), os.path.join(mod_dir, "final_fakeip.txt")
     with open(clean_fakeip, 'w', encoding='utf-8') as f: f.write('\n'.join(sorted(unique_lines)) + '\n')
-    utils.optimize_smart_self(clean_fakeip, final_fakeip)
-    utils.finalize_output(final_fakeip, "output/mihomo", "Fake_IP_Filter_merged", "none")
+    fakeip_inv = utils.optimize_smart_self(clean_fakeip, final_fakeip, utils.SORTED_UNIQUE)
+    # Fake-IP 过滤列表只在 Mihomo 中生效，按其通配语义移除被更宽模式覆盖的条目
+    fakeip_lines = _read_lines(final_fakeip)
+    pruned_lines = utils.prune_wildcard_subsumed(fakeip_lines)
+    if len(pruned_lines) < len(fakeip_lines):
+        with open(final_fakeip, 'w', encoding='utf-8') as f: f.write('\n'.join(pruned_lines) + '\n')
+        print(f"🧹 [通配覆盖] {'Fake_IP_Filter_merged':<25} | 移除被更宽通配模式覆盖的条目: {len(fakeip_lines) - len(pruned_lines):,}")
+    analytics.report_source_contributions("Fake_IP_Filter_merged", source_rules, _read_lines(final_fakeip))
+    rule_history.register_sources("Fake_IP_Filter_merged", source_rules)
+    utils.finalize_output(final_fakeip, "output/mihomo", "Fake_IP_Filter_merged", "none", fakeip_inv)
 
 def gen_ads_drop():
     mod_dir = os.path.join(utils.get_work_dir(), "drop")
     os.makedirs(mod_dir, exist_ok=True)
     raw_rd = os.path.join(mod_dir, "raw_rd.txt")
-    utils.download_files_parallel(raw_rd, providers.DROP_URLS)
-    rd_lines = set()
-    if os.path.exists(raw_rd):
-        with open(raw_rd, 'r', encoding='utf-8') as f:
-            for line in f.read().splitlines():
-                cleaned = utils.clean_mihomo_domain_line(line)
-                if cleaned and "skk.moe" not in line.lower() and cleaned != "+.":
-                    rd_lines.add(cleaned)
+    sources = utils.download_files_parallel(raw_rd, providers.DROP_URLS, source_dir=os.path.join(mod_dir, "sources"))
+    source_rules = []
+    for url, path in sources:
+        rules = set()
+        for line in _read_lines(path):
+            cleaned = utils.clean_mihomo_domain_line(line)
+            if cleaned and "skk.moe" not in line.lower() and cleaned != "+.":
+                rules.add(cleaned)
+        source_rules.append((url, rules))
+    rd_lines = set().union(*(rules for _, rules in source_rules))
     clean_rd = os.path.join(mod_dir, "clean_rd.txt")
     with open(clean_rd, 'w', encoding='utf-8') as f: f.write('\n'.join(sorted(rd_lines)) + '\n')
     
-    raw_allow_temp = os.path.join(utils.get_work_dir(), "shared", "raw_allow.txt")
-    merged_allow_raw = os.path.join(mod_dir, "merged_allow_raw.txt")
-    _merge_allow_list(raw_allow_temp, merged_allow_raw)
-    
-    clean_rd_allow, final_rd = os.path.join(mod_dir, "clean_rd_allow.txt"), os.path.join(mod_dir, "final_rd.txt")
-    utils.process_normalize_domain(merged_allow_raw, clean_rd_allow, skip_allow_rules=False)
-    utils.apply_advanced_whitelist_filter(clean_rd, clean_rd_allow, final_rd)
-    utils.finalize_output(final_rd, "output/mihomo", "Reject_Drop_merged", "none")
+    final_rd = os.path.join(mod_dir, "final_rd.txt")
+    rd_inv = executors.run_cpu(utils.apply_advanced_whitelist_filter, clean_rd, _shared_clean_allow_path(), final_rd, utils.SORTED_UNIQUE)
+    analytics.report_source_contributions("Reject_Drop_merged", source_rules, _read_lines(final_rd))
+    rule_history.register_sources("Reject_Drop_merged", source_rules)
+    promoted_rd = os.path.join(mod_dir, "promoted_rd.txt")
+    rd_inv = _promote_suffixes("Reject_Drop_merged", final_rd, promoted_rd, rd_inv)
+    utils.finalize_output(promoted_rd, "output/mihomo", "Reject_Drop_merged", "none", rd_inv)
 
 def gen_cn():
     mod_dir = os.path.join(utils.get_work_dir(), "cn")
     os.makedirs(mod_dir, exist_ok=True)
     raw_cn_1, raw_cn_2 = os.path.join(mod_dir, "raw_cn_1.txt"), os.path.join(mod_dir, "raw_cn_2.txt")
-    utils.download_files_parallel(raw_cn_1, providers.CN_URLS_1)
-    utils.download_files_parallel(raw_cn_2, providers.CN_URLS_2)
+    sources_1 = utils.download_files_parallel(raw_cn_1, providers.CN_URLS_1, source_dir=os.path.join(mod_dir, "sources_1"))
+    sources_2 = utils.download_files_parallel(raw_cn_2, providers.CN_URLS_2, source_dir=os.path.join(mod_dir, "sources_2"))
+    source_rules = []
+    for url, path in sources_1:
+        rules = []
+        for line in _read_lines(path):
+            line = line.strip()
+            if line and not line.startswith('#'):
+                line = line.split('#')[0].strip()
+                if line:
+                    rules.append("+." + line)
+        source_rules.append((url, rules))
+    for url, path in sources_2:
+        rules = []
+        for line in _read_lines(path):
+            line_lower = line.strip().lower()
+            if not line_lower or line_lower.startswith('#') or "skk.moe" in line_lower:
+                continue
+            # 原逻辑仅匹配以 domain-suffix 或 domain 开头的行
+            if line_lower.startswith("domain-suffix,") or line_lower.startswith("domain,"):
+                cleaned = utils.clean_mihomo_domain_line(line)
+                if cleaned:
+                    rules.append(cleaned)
+        source_rules.append((url, rules))
     merged_cn = os.path.join(mod_dir, "merged_cn_raw.txt")
     with open(merged_cn, 'w', encoding='utf-8') as f:
-        if os.path.exists(raw_cn_1):
-            with open(raw_cn_1, 'r', encoding='utf-8') as rf:
-                for line in rf.read().splitlines():
-                    line = line.strip()
-                    if line and not line.startswith('#'):
-                        line = line.split('#')[0].strip()
-                        if line:
-                            f.write("+." + line + "\n")
-        if os.path.exists(raw_cn_2):
-            with open(raw_cn_2, 'r', encoding='utf-8') as rf:
-                for line in rf.read().splitlines():
-                    line_lower = line.strip().lower()
-                    if not line_lower or line_lower.startswith('#') or "skk.moe" in line_lower:
-                        continue
-                    # 原逻辑仅匹配以 domain-suffix 或 domain 开头的行
-                    if line_lower.startswith("domain-suffix,") or line_lower.startswith("domain,"):
-                        cleaned = utils.clean_mihomo_domain_line(line)
-                        if cleaned:
-                            f.write(cleaned + "\n")
+        for _, rules in source_rules:
+            f.writelines(rule + "\n" for rule in rules)
     final_cn = os.path.join(mod_dir, "final_cn.txt")
-    utils.optimize_smart_self(merged_cn, final_cn)
-    utils.finalize_output(final_cn, "output/mihomo", "CN_merged", "none")
+    cn_inv = utils.optimize_smart_self(merged_cn, final_cn)
+    analytics.report_source_contributions("CN_merged", source_rules, _read_lines(final_cn))
+    rule_history.register_sources("CN_merged", source_rules)
+    utils.finalize_output(final_cn, "output/mihomo", "CN_merged", "none", cn_inv)
 
 def gen_extra_mihomo():
-    for name, url in providers.MIHOMO_GENERIC_RAW.items():
-        content = utils.download_file(url)
+    # 两组来源全部提前并行下载，避免逐个串行等待慢速来源
+    pool = executors.io_pool()
+    generic_futures = [pool.submit(utils.download_file, url) for url in providers.MIHOMO_GENERIC_RAW.values()]
+    skk_futures = [pool.submit(utils.download_file, url) for url in providers.MIHOMO_SKK.values()]
+
+    for name, future in zip(providers.MIHOMO_GENERIC_RAW, generic_futures):
+        content = future.result()
         lines = []
         is_ip_ruleset = name.endswith("_IP") or name == "cnip"
         for line in content.splitlines():
@@ -156,10 +244,12 @@ def gen_extra_mihomo():
                     if cleaned_dom:
                         lines.append(cleaned_dom)
         
+        lines = utils.prune_subsumed(lines)
         print(f"✅ [Mihomo] {name:<25} | 规则数: {len(lines):,}")
 
         txt_path = f"output/mihomo/{name}.txt"
         with open(txt_path, 'w', encoding='utf-8') as f: f.write('\n'.join(lines) + '\n')
+        utils.set_output_invariants(txt_path, {utils.INV_PRUNED})
         if utils.check_mihomo():
             rule_type = "ipcidr" if is_ip_ruleset else "domain"
             if not is_ip_ruleset:
@@ -186,8 +276,8 @@ def gen_extra_mihomo():
                     f"{name}.mrs"
                 )
 
-    for name, url in providers.MIHOMO_SKK.items():
-        content = utils.download_file(url)
+    for name, future in zip(providers.MIHOMO_SKK, skk_futures):
+        content = future.result()
         lines = []
         for line in content.splitlines():
             if 'skk.moe' in line or line.startswith('DOMAIN-WILDCARD,'): continue
@@ -201,10 +291,12 @@ def gen_extra_mihomo():
                 if cleaned_dom and cleaned_dom != '+.':
                     lines.append(cleaned_dom)
             
+        lines = utils.prune_subsumed(lines)
         print(f"✅ [Mihomo] {name:<25} | 规则数: {len(lines):,}")
 
         txt_path = f"output/mihomo/{name}.txt"
         with open(txt_path, 'w', encoding='utf-8') as f: f.write('\n'.join(lines) + '\n')
+        utils.set_output_invariants(txt_path, {utils.INV_PRUNED})
         if utils.check_mihomo():
             # 过滤出仅包含域名的临时文件用于编译 Mihomo domain ruleset
             dom_lines = [l for l in lines if not utils.is_valid_ip_or_cidr(l)]
@@ -232,11 +324,32 @@ def run_all():
     shared_allow = os.path.join(shared_dir, "raw_allow.txt")
     utils.download_files_parallel(shared_allow, providers.ALLOW_URLS)
 
+    # 白名单 (ALLOW_URLS + exclude-keyword.txt) 每次构建只清洗、编译一次，
+    # 索引按内容哈希落盘，gen_ads_reject / gen_ads_drop 所在进程直接反序列化复用
+    merged_allow_raw = os.path.join(shared_dir, "merged_allow_raw.txt")
+    _merge_allow_list(shared_allow, merged_allow_raw)
+    clean_allow = _shared_clean_allow_path()
+    executors.run_cpu(utils.process_normalize_domain, merged_allow_raw, clean_allow, skip_allow_rules=False)
+    allow_count = executors.run_cpu(utils.prepare_allow_index, clean_allow)
+    print(f"🛡️ 白名单索引已就绪: {allow_count:,} 条")
+
     tasks = [gen_ads_reject, gen_ai, gen_fakeip, gen_ads_drop, gen_cn, gen_extra_mihomo]
-    with ThreadPoolExecutor() as executor:
-        futures = [executor.submit(t) for t in tasks]
-        for future in futures:
-            future.result()
+    futures = [executors.stage_pool().submit(t) for t in tasks]
+    for future in futures:
+        future.result()
+
+    # 全部规则集生成后建立跨规则集覆盖索引；配置了优先级组时移除低优先级规则集中的冗余条目
+    analytics.report_ruleset_overlaps("output/mihomo", exclude=set(providers.OUTPUT_PROFILES))
+    if providers.OVERLAP_PRECEDENCE:
+        analytics.apply_precedence("output/mihomo", providers.OVERLAP_PRECEDENCE)
+    # 精简版以裁剪后的最终规则集为来源
+    _emit_profiles()
+
+    # 与上次构建的快照比较，输出供带宽受限客户端使用的增量文件
+    delta.emit_deltas("output/mihomo")
+
+    # 开启规则历史库时记录本次构建 (新增规则标注进入时的上游来源)
+    rule_history.record_if_enabled("output/mihomo")
 
 if __name__ == '__main__':
     run_all()
\ No newline at end of file
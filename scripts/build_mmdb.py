@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+IP 规则集的 MaxMind DB (.mmdb) 输出：将各 Mihomo 规则集中的 IP/CIDR 条目写入一棵二叉前缀树，
+查询耗时只与前缀长度有关，文件可被 mihomo / sing-box 等直接内存映射。
+
+采用 Mihomo 的 Meta-geoip0 约定：database_type 为 "Meta-geoip0"，每个网段的值为包含它的规则集名称
+(小写)，只属于一个规则集时为字符串、属于多个时为字符串数组，配置中以 geoip:<名称> 引用。
+IPv6 树 (ip_version 6)，IPv4 网段位于 ::/96 之下；相邻且取值相同的网段在树中合并。
+编码按 MaxMind DB 二进制格式 2.0 规范直接写出，不依赖外部库。
+"""
+import os
+import glob
+import struct
+import hashlib
+import ipaddress
+from datetime import datetime
+import utils
+import build_geodat
+
+OUT_DIR = "output/geodat"
+OUT_NAME = "geoip.mmdb"
+DATABASE_TYPE = "Meta-geoip0"
+
+METADATA_MARKER = b"\xab\xcd\xefMaxMind.com"
+DATA_SECTION_SEPARATOR = b"\x00" * 16
+
+# 数据段类型编号 (>= 8 为扩展类型)
+TYPE_STRING = 2
+TYPE_MAP = 7
+TYPE_UINT16 = 5
+TYPE_UINT32 = 6
+TYPE_UINT64 = 9
+TYPE_ARRAY = 11
+
+
+def _control(type_num, size):
+    """控制字节 (+扩展类型字节 +长度扩展字节)。"""
+    if size < 29:
+        head, extra = size, b""
+    elif size < 285:
+        head, extra = 29, bytes([size - 29])
+    elif size < 65821:
+        head, extra = 30, (size - 285).to_bytes(2, "big")
+    else:
+        head, extra = 31, (size - 65821).to_bytes(3, "big")
+    if type_num < 8:
+        return bytes([type_num << 5 | head]) + extra
+    return bytes([head, type_num - 7]) + extra
+
+
+def encode_string(value):
+    data = value.encode("utf-8")
+    return _control(TYPE_STRING, len(data)) + data
+
+
+def encode_uint(type_num, value):
+    data = value.to_bytes((value.bit_length() + 7) // 8, "big")
+    return _control(type_num, len(data)) + data
+
+
+def encode_array(items):
+    return _control(TYPE_ARRAY, len(items)) + b"".join(items)
+
+
+def encode_map(pairs):
+    return _control(TYPE_MAP, len(pairs)) + b"".join(encode_string(k) + v for k, v in pairs)
+
+
+def encode_codes(codes):
+    """Meta-geoip0 取值：单个规则集为字符串，多个为字符串数组。"""
+    codes = sorted(codes)
+    if len(codes) == 1:
+        return encode_string(codes[0])
+    return encode_array([encode_string(code) for code in codes])
+
+
+class _Node:
+    __slots__ = ("children", "codes")
+
+    def __init__(self):
+        self.children = [None, None]
+        self.codes = None
+
+
+def _ipv6_key(network):
+    """IPv4 网段映射到 ::/96 之下，返回 (128 位整数地址, 前缀长度)。"""
+    if network.version == 4:
+        return int(network.network_address), network.prefixlen + 96
+    return int(network.network_address), network.prefixlen
+
+
+def build_tree(rulesets):
+    """
+    rulesets: [(规则集名称, 网段列表)]。返回解析后的树：
+    ("leaf", frozenset(名称)) 或 ("node", 左, 右)，取值相同的相邻子树已合并。
+    """
+    root = _Node()
+    for code, networks in rulesets:
+        for network in networks:
+            address, prefix = _ipv6_key(network)
+            node = root
+            for i in range(prefix):
+                bit = address >> (127 - i) & 1
+                if node.children[bit] is None:
+                    node.children[bit] = _Node()
+                node = node.children[bit]
+            node.codes = (node.codes or frozenset()) | {code}
+
+    def resolve(node, inherited):
+        # 网段可能相互嵌套 (同一地址属于多个规则集)：祖先的取值下推到子树
+        codes = inherited | node.codes if node.codes else inherited
+        if node.children[0] is None and node.children[1] is None:
+            return ("leaf", codes)
+        left, right = (resolve(child, codes) if child else ("leaf", codes) for child in node.children)
+        if left[0] == "leaf" and left == right:
+            return left
+        return ("node", left, right)
+
+    tree = resolve(root, frozenset())
+    if tree[0] == "leaf":
+        tree = ("node", tree, tree)
+    return tree
+
+
+def _record_size(max_value):
+    for size in (24, 28, 32):
+        if max_value < 1 << size:
+            return size
+    raise ValueError("mmdb 记录值超出 32 位")
+
+
+def _pack_node(left, right, record_size):
+    if record_size == 24:
+        return left.to_bytes(3, "big") + right.to_bytes(3, "big")
+    if record_size == 28:
+        middle = (left >> 24 & 0x0F) << 4 | right >> 24 & 0x0F
+        return (left & 0xFFFFFF).to_bytes(3, "big") + bytes([middle]) + (right & 0xFFFFFF).to_bytes(3, "big")
+    return struct.pack(">II", left, right)
+
+
+def encode_database(tree, build_epoch=0, description="Wuiiled rule sets"):
+    """将解析后的树编码为完整的 mmdb 字节串。"""
+    # 广度优先为内部节点编号，根节点为 0
+    nodes = [tree]
+    index = 0
+    while index < len(nodes):
+        _, left, right = nodes[index]
+        for child in (left, right):
+            if child[0] == "node":
+                nodes.append(child)
+        index += 1
+    node_ids = {id(node): i for i, node in enumerate(nodes)}
+    node_count = len(nodes)
+
+    # 数据段：相同取值只写一次
+    data = bytearray()
+    offsets = {}
+    records = []
+    for _, left, right in nodes:
+        pair = []
+        for child in (left, right):
+            if child[0] == "node":
+                pair.append(node_ids[id(child)])
+            elif not child[1]:
+                pair.append(node_count)
+            else:
+                if child[1] not in offsets:
+                    offsets[child[1]] = len(data)
+                    data += encode_codes(child[1])
+                pair.append(node_count + 16 + offsets[child[1]])
+        records.append(pair)
+
+    record_size = _record_size(node_count + 16 + len(data))
+    tree_bytes = b"".join(_pack_node(left, right, record_size) for left, right in records)
+    metadata = encode_map([
+        ("binary_format_major_version", encode_uint(TYPE_UINT16, 2)),
+        ("binary_format_minor_version", encode_uint(TYPE_UINT16, 0)),
+        ("build_epoch", encode_uint(TYPE_UINT64, build_epoch)),
+        ("database_type", encode_string(DATABASE_TYPE)),
+        ("description", encode_map([("en", encode_string(description))])),
+        ("ip_version", encode_uint(TYPE_UINT16, 6)),
+        ("languages", encode_array([encode_string("en")])),
+        ("node_count", encode_uint(TYPE_UINT32, node_count)),
+        ("record_size", encode_uint(TYPE_UINT16, record_size)),
+    ])
+    return tree_bytes + DATA_SECTION_SEPARATOR + bytes(data) + METADATA_MARKER + metadata
+
+
+def collect_ip_rulesets(txt_dir):
+    """读取 txt_dir 下各规则集的 IP/CIDR 条目，返回 [(小写名称, 合并后的网段列表)]。"""
+    rulesets = []
+    for path in sorted(glob.glob(os.path.join(txt_dir, "*.txt"))):
+        _, ips = build_geodat.split_ruleset(path)
+        if not ips: continue
+        networks = []
+        for net in build_geodat.collapse_networks(ips):
+            # 形如 ::ffff:a.b.c.d 的 IPv4 映射地址按 IPv4 处理，统一落在 ::/96 之下
+            if net.version == 6 and net.prefixlen >= 96 and net.network_address.ipv4_mapped:
+                net = ipaddress.ip_network(f"{net.network_address.ipv4_mapped}/{net.prefixlen - 96}")
+            networks.append(net)
+        rulesets.append((os.path.splitext(os.path.basename(path))[0].lower(), networks))
+    return rulesets
+
+
+def run_all(txt_dir="output/mihomo", out_dir=OUT_DIR):
+    os.makedirs(out_dir, exist_ok=True)
+    rulesets = collect_ip_rulesets(txt_dir)
+    tree = build_tree(rulesets)
+    body = encode_database(tree)
+    # build_epoch 取内容最后变化的时间，内容不变时文件逐字节一致
+    digest = hashlib.sha256(body).hexdigest()
+    changed = utils.content_change_time(f"mmdb:{os.path.basename(os.path.normpath(out_dir))}/{OUT_NAME}", digest)
+    build_epoch = int(datetime.strptime(changed, "%Y-%m-%d %H:%M:%S").timestamp())
+    data = encode_database(tree, build_epoch)
+
+    path = os.path.join(out_dir, OUT_NAME)
+    with open(path, 'wb') as f:
+        f.write(data)
+    with open(path + ".sha256sum", 'w', encoding='utf-8') as f:
+        f.write(f"{hashlib.sha256(data).hexdigest()}  {OUT_NAME}\n")
+    networks = sum(len(nets) for _, nets in rulesets)
+    print(f"✅ [MMDB] {OUT_NAME:<27} | 规则集: {len(rulesets)} | 网段: {networks:,} | {len(data) / 1e6:.2f}MB")
+
+
+if __name__ == '__main__':
+    run_all()
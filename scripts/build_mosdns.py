@@ -6,18 +6,24 @@ import providers
 def run_all():
     os.makedirs("output/mosdns-x", exist_ok=True)
 
-    # 1. 转换 ADs_merged
-    base_ads = "output/mihomo/ADs_merged.txt"
-    if os.path.exists(base_ads):
+    # 1. 转换 ADs_merged 及其精简版 (ADs_merged_lite -> ad_domain_list_lite)
+    ads_names = ["ADs_merged"] + [name for name, conf in providers.OUTPUT_PROFILES.items() if conf["source"] == "ADs_merged"]
+    for ads_name in ads_names:
+        base_ads = f"output/mihomo/{ads_name}.txt"
+        if not os.path.exists(base_ads): continue
+        out_name = "ad_domain_list" + ads_name[len("ADs_merged"):]
         lines = []
         with open(base_ads, 'r', encoding='utf-8') as f:
-            for line in f.read().splitlines():
-                if not line.strip() or line.startswith('#'): continue
-                line = re.sub(r'^(DOMAIN-SUFFIX,|\+\.)', '', line)
-                lines.append(line)
-        with open("output/mosdns-x/ad_domain_list.txt", 'w', encoding='utf-8') as f:
+            src_lines = f.read().splitlines()
+        if utils.INV_PRUNED not in utils.get_output_invariants(base_ads):
+            src_lines = utils.prune_subsumed(src_lines)
+        for line in src_lines:
+            if not line.strip() or line.startswith('#'): continue
+            line = re.sub(r'^(DOMAIN-SUFFIX,|\+\.)', '', line)
+            lines.append(line)
+        with open(f"output/mosdns-x/{out_name}.txt", 'w', encoding='utf-8') as f:
             f.write('\n'.join(lines) + '\n')
-        print(f"✅ [MosDNS] {'ad_domain_list':<25} | 规则数: {len(lines):,}")
+        print(f"✅ [MosDNS] {out_name:<25} | 规则数: {len(lines):,}")
 
     # 2. SKK 规则 (从 mihomo 已生成的 txt 读取，不再重复下载)
     for name in providers.MIHOMO_SKK:
@@ -28,20 +34,22 @@ def run_all():
             continue
         lines = []
         with open(mihomo_txt, 'r', encoding='utf-8') as f:
-            for line in f:
-                cleaned = line.strip()
-                if not cleaned or cleaned.startswith('#') or cleaned == '+.':
-                    continue
-                if 'skk.moe' in cleaned:
-                    continue
-                # 跳过 IP/CIDR 行：原始代码仅通过 clean_mihomo_domain_line 处理，
-                # IP/CIDR 返回 None 被过滤。mihomo 输出含 IP 行，需显式跳过以保持一致。
-                if utils.is_valid_ip_or_cidr(cleaned):
-                    continue
-                if cleaned.startswith('+.'):
-                    lines.append('domain:' + cleaned[2:])
-                else:
-                    lines.append('full:' + cleaned)
+            src_lines = [line.strip() for line in f]
+        if utils.INV_PRUNED not in utils.get_output_invariants(mihomo_txt):
+            src_lines = utils.prune_subsumed(src_lines)
+        for cleaned in src_lines:
+            if not cleaned or cleaned.startswith('#') or cleaned == '+.':
+                continue
+            if 'skk.moe' in cleaned:
+                continue
+            # 跳过 IP/CIDR 行：原始代码仅通过 clean_mihomo_domain_line 处理，
+            # IP/CIDR 返回 None 被过滤。mihomo 输出含 IP 行，需显式跳过以保持一致。
+            if utils.is_valid_ip_or_cidr(cleaned):
+                continue
+            if cleaned.startswith('+.'):
+                lines.append('domain:' + cleaned[2:])
+            else:
+                lines.append('full:' + cleaned)
         with open(f"output/mosdns-x/{name}.txt", 'w', encoding='utf-8') as f:
             f.write('\n'.join(lines) + '\n')
         print(f"✅ [MosDNS] {name:<25} | 规则数: {len(lines):,}")
\ No newline at end of file
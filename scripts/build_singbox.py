@@ -2,13 +2,19 @@
 # -*- coding: utf-8 -*-
 import os
 import sys
-import json
 import subprocess
 import re
 import ipaddress
 from glob import glob
 import shutil
+from json.encoder import encode_basestring as _encode_string
 import utils
+import executors
+
+# 规则总数达到该阈值的规则集写出紧凑 JSON (无缩进与换行)，小规则集保留便于阅读的 indent=2 排版
+COMPACT_JSON_MIN_RULES = 10000
+# 流式写出数组时每批编码的元素数，限制中间字符串大小
+_JSON_WRITE_BATCH = 4096
 
 def check_singbox():
     has_sb = shutil.which("sing-box") is not None
@@ -102,94 +108,247 @@ def compact_regexes(regex_set):
         
     return sorted(list(step3))
 
-def convert_txt_to_json(txt_path, json_path):
-    domains = set()
-    domain_suffixes = set()
+# convert_txt_to_json 生成的正则形如 ^(.*\.)?<主体>$ 或 ^<主体>$，主体只由转义字符、普通字符与 .* 组成
+_REGEX_ANCHORS = ("^(.*\\.)?", "^")
+_REGEX_META = set(".^$*+?{}[]()|")
+_TRIE_END = ""
+# 单条合并正则最多容纳的原始规则数，避免生成过长的正则
+MAX_REGEX_ALTERNATIVES = 200
+
+def _parse_generated_regex(regex):
+    """拆成 (锚定前缀, 原子列表)；不符合生成格式 (如 compact_regexes 产出的 \\d*、分组) 时返回 None。"""
+    for anchor in _REGEX_ANCHORS:
+        if regex.startswith(anchor) and regex.endswith("$") and not regex.endswith("\\$"):
+            body = regex[len(anchor):-1]
+            break
+    else:
+        return None
+    tokens = []
+    i = 0
+    while i < len(body):
+        if body[i] == "\\":
+            if i + 1 >= len(body): return None
+            tokens.append(body[i:i + 2])
+            i += 2
+        elif body.startswith(".*", i):
+            tokens.append(".*")
+            i += 2
+        elif body[i] in _REGEX_META:
+            return None
+        else:
+            tokens.append(body[i])
+            i += 1
+    if not tokens:
+        return None
+    return anchor, tokens
+
+def _build_trie(token_lists):
+    root = {}
+    for tokens in token_lists:
+        node = root
+        for tok in tokens:
+            node = node.setdefault(tok, {})
+        node[_TRIE_END] = {}
+    return root
+
+def _emit_trie(node, suffix_trie):
+    """
+    把前缀树还原为等价正则 (结果可直接参与拼接)。依据 xA|yA ≡ (x|y)A 与 Ax|Ay ≡ A(x|y)，
+    只做公因子提取，匹配集合与原正则的并集严格相同。
+    """
+    alts = []
+    for tok in sorted(node):
+        if tok == _TRIE_END: continue
+        sub = _emit_trie(node[tok], suffix_trie)
+        alts.append(sub + tok if suffix_trie else tok + sub)
+    if _TRIE_END in node:
+        return f"(?:{'|'.join(alts)})?" if alts else ""
+    if len(alts) == 1:
+        return alts[0]
+    return f"(?:{'|'.join(alts)})"
+
+def _consolidate_group(anchor, token_lists):
+    # 后缀树适合共享域名后缀的规则，前缀树适合共享前缀的规则，取较短者
+    suffix_form = _emit_trie(_build_trie([t[::-1] for t in token_lists]), True)
+    prefix_form = _emit_trie(_build_trie(token_lists), False)
+    body = suffix_form if len(suffix_form) <= len(prefix_form) else prefix_form
+    return f"{anchor}{body}$"
+
+def consolidate_regexes(regexes):
+    """
+    通用正则合并器：将同一锚定形式的生成正则按后缀/前缀树分解为少量交替分组，
+    语义与逐条匹配完全等价；无法解析的正则原样保留。
+    """
+    groups = {}
+    result = set()
+    for regex in regexes:
+        parsed = _parse_generated_regex(regex)
+        if parsed is None:
+            result.add(regex)
+            continue
+        anchor, tokens = parsed
+        groups.setdefault(anchor, set()).add(tuple(tokens))
+    for anchor, token_set in groups.items():
+        # 按反转原子排序后分块，使共享后缀的规则落在同一块内
+        ordered = sorted(token_set, key=lambda t: t[::-1])
+        for i in range(0, len(ordered), MAX_REGEX_ALTERNATIVES):
+            result.add(_consolidate_group(anchor, ordered[i:i + MAX_REGEX_ALTERNATIVES]))
+    return sorted(result)
+
+def lower_wildcard(body, with_apex):
+    """
+    将通配规则改写为等价且更廉价的 sing-box 匹配器，无法等价改写时返回 None。
+    body 为剥离 +. / . 前缀后的通配主体，with_apex 表示带前缀 (对应正则 ^(.*\\.)?)。
+    - *kw* 与 +.*kw*  -> domain_keyword: kw   (^(.*\\.)?.*kw.*$ 即子串匹配)
+    - +.*.X 与 .*.X   -> domain_suffix: .X   (^(.*\\.)?.*\\.X$ 即严格子域匹配)
+    """
+    if len(body) > 2 and body[0] == '*' and body[-1] == '*':
+        keyword = body.strip('*')
+        if keyword and '*' not in keyword:
+            return "domain_keyword", keyword
+    if with_apex and body.startswith('*.'):
+        rest = body[2:]
+        if rest and '*' not in rest:
+            return "domain_suffix", "." + rest
+    return None
+
+def _json_ruleset_chunks(rule_dict, version, compact):
+    """按 json.dump(indent=2, ensure_ascii=False) 的排版逐段产出规则集 JSON，compact 时去除全部空白。"""
+    if compact:
+        indent = lambda depth: ""
+        colon = ":"
+    else:
+        indent = lambda depth: "\n" + "  " * depth
+        colon = ": "
+    yield f'{{{indent(1)}"version"{colon}{version},{indent(1)}"rules"{colon}[{indent(2)}{{'
+    for n, (key, values) in enumerate(rule_dict.items()):
+        yield f'{"," if n else ""}{indent(3)}{_encode_string(key)}{colon}'
+        if not values:
+            yield "[]"
+            continue
+        sep = "," + indent(4)
+        yield "[" + indent(4)
+        for i in range(0, len(values), _JSON_WRITE_BATCH):
+            if i: yield sep
+            yield sep.join(map(_encode_string, values[i:i + _JSON_WRITE_BATCH]))
+        yield indent(3) + "]"
+    yield f"{indent(2)}}}{indent(1)}]{indent(0)}}}"
+
+def write_ruleset_json(json_path, rule_dict, compact=False, version=5):
+    """流式写出 sing-box 源规则集：数组分批编码后直接写入文件，不构造完整 JSON 字符串。"""
+    with open(json_path, 'w', encoding='utf-8') as f:
+        f.writelines(_json_ruleset_chunks(rule_dict, version, compact))
+
+def convert_txt_to_json(txt_path, json_path, invariants=None, compact=None):
+    if invariants is None:
+        invariants = utils.get_output_invariants(txt_path)
+    # 输入已有序去重时，domain 与各前缀来源的 domain_suffix 均按输入顺序收集，
+    # 之后只需线性归并，无需再建集合与排序
+    presorted = utils.SORTED_UNIQUE <= invariants
+    domains = []
+    suffix_runs = {"+.": [], ".": [], "*.": []}
+    lowered_suffixes = set()
+    domain_keywords = set()
     domain_regexes = set()
     ip_cidrs = set()
+    lowered_count = 0
     
     base_name = os.path.splitext(os.path.basename(txt_path))[0]
 
-    with open(txt_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if not line or line.startswith('#'): continue
-            
-            line = line.split('#')[0].strip()
-            if not line: continue
+    def add_wildcard(body, with_apex):
+        nonlocal lowered_count
+        lowered = lower_wildcard(body, with_apex)
+        if lowered is None:
+            escaped = re.escape(body).replace(r'\*', '.*')
+            domain_regexes.add(f"^(.*\\.)?{escaped}$" if with_apex else f"^{escaped}$")
+            return
+        lowered_count += 1
+        kind, value = lowered
+        (domain_keywords if kind == "domain_keyword" else lowered_suffixes).add(value)
 
-            # 拦截 1: 严格 IP 与 CIDR 提取
-            try:
-                net = ipaddress.ip_network(line, strict=False)
-                ip_cidrs.add(str(net))
-                continue
-            except ValueError:
-                pass
+    rules = []
+    for line in utils.read_text_bulk(txt_path).split('\n'):
+        line = line.strip()
+        if not line or line.startswith('#'): continue
+        line = line.split('#')[0].strip()
+        if line: rules.append(line)
+    # 未经裁剪的输入 (如 _DOMAIN + _IP 合并文件) 先移除被更宽后缀覆盖的条目
+    if utils.INV_PRUNED not in invariants:
+        rules = utils.prune_subsumed(rules)
+
+    for line in rules:
+        # 拦截 1: 严格 IP 与 CIDR 提取
+        try:
+            net = ipaddress.ip_network(line, strict=False)
+            ip_cidrs.add(str(net))
+            continue
+        except ValueError:
+            pass
 
-            # 拦截 2: 过滤包含空格或冒号的脏数据
-            if ' ' in line or ':' in line:
-                continue
+        # 拦截 2: 过滤包含空格或冒号的脏数据
+        if ' ' in line or ':' in line:
+            continue
 
-            # 拦截 3: 安全转义处理与前缀剥离
-            if line.startswith('+.'):
+        # 拦截 3: 安全转义处理与前缀剥离
+        if line.startswith('+.'):
+            suffix = line[2:]
+            if not suffix: continue 
+            if '*' in suffix:
+                add_wildcard(suffix, True)
+            else:
+                suffix_runs["+."].append(suffix)
+        elif line.startswith('.'):
+            suffix = line[1:]
+            if not suffix: continue
+            if '*' in suffix:
+                add_wildcard(suffix, True)
+            else:
+                suffix_runs["."].append(suffix)
+        elif '*' in line:
+            if line == '*':
+                pass # 抛弃
+            elif line.startswith('*.') and line.count('*') == 1:
                 suffix = line[2:]
-                if not suffix: continue 
-                if '*' in suffix:
-                    escaped = re.escape(suffix).replace(r'\*', '.*')
-                    domain_regexes.add(f"^(.*\\.)?{escaped}$")
-                else:
-                    domain_suffixes.add(suffix)
-            elif line.startswith('.'):
-                suffix = line[1:]
-                if not suffix: continue
-                if '*' in suffix:
-                    escaped = re.escape(suffix).replace(r'\*', '.*')
-                    domain_regexes.add(f"^(.*\\.)?{escaped}$")
-                else:
-                    domain_suffixes.add(suffix)
-            elif '*' in line:
-                if line == '*':
-                    pass # 抛弃
-                elif line.startswith('*.') and line.count('*') == 1:
-                    suffix = line[2:]
-                    if suffix: domain_suffixes.add(suffix)
-                else:
-                    escaped = re.escape(line).replace(r'\*', '.*')
-                    domain_regexes.add(f"^{escaped}$")
+                if suffix: suffix_runs["*."].append(suffix)
             else:
-                domains.add(line)
+                add_wildcard(line, False)
+        else:
+            domains.append(line)
+
+    if presorted:
+        domain_suffixes = list(utils.merge_sorted_unique(*suffix_runs.values(), sorted(lowered_suffixes)))
+    else:
+        domains = sorted(set(domains))
+        domain_suffixes = sorted(lowered_suffixes.union(*suffix_runs.values()))
 
     rule_dict = {}
     
-    if domains: rule_dict["domain"] = sorted(list(domains))
-    if domain_suffixes: rule_dict["domain_suffix"] = sorted(list(domain_suffixes))
+    if domains: rule_dict["domain"] = domains
+    if domain_suffixes: rule_dict["domain_suffix"] = domain_suffixes
+    if domain_keywords: rule_dict["domain_keyword"] = sorted(domain_keywords)
     if ip_cidrs: rule_dict["ip_cidr"] = sorted(list(ip_cidrs))
     
-    # 核心改动：仅对 Fake-IP 列表执行智能正则压缩，其他列表原样输出
+    # Fake-IP 列表先执行启发式正则压缩，随后所有列表统一做等价的前缀/后缀树合并
+    raw_regex_count = len(domain_regexes)
     if domain_regexes:
         is_fake_ip = "fake_ip" in base_name.lower() or "fake-ip" in base_name.lower()
         if is_fake_ip:
-            optimized_regexes = compact_regexes(domain_regexes)
-            if optimized_regexes:
-                rule_dict["domain_regex"] = optimized_regexes
-        else:
-            rule_dict["domain_regex"] = sorted(list(domain_regexes))
+            domain_regexes = compact_regexes(domain_regexes)
+        optimized_regexes = consolidate_regexes(domain_regexes)
+        if optimized_regexes:
+            rule_dict["domain_regex"] = optimized_regexes
 
-    total_rules = len(domains) + len(domain_suffixes) + len(ip_cidrs) + len(rule_dict.get("domain_regex", []))
+    total_rules = len(domains) + len(domain_suffixes) + len(domain_keywords) + len(ip_cidrs) + len(rule_dict.get("domain_regex", []))
     
     if total_rules == 0: 
         print(f"⚠️ [Sing-box] {base_name:<23} | ⚠️ 规则为空被跳过")
         return False
 
-    print(f"✅ [Sing-box] {base_name:<23} | 规则总数: {total_rules:,} (正则: {len(rule_dict.get('domain_regex', [])):,}, 后缀: {len(domain_suffixes):,}, 域名: {len(domains):,}, IP: {len(ip_cidrs):,})")
+    print(f"✅ [Sing-box] {base_name:<23} | 规则总数: {total_rules:,} (正则: {len(rule_dict.get('domain_regex', [])):,} (降级 {lowered_count:,}, 合并前 {raw_regex_count:,}), 后缀: {len(domain_suffixes):,}, 关键字: {len(domain_keywords):,}, 域名: {len(domains):,}, IP: {len(ip_cidrs):,})")
 
-    json_data = {
-        "version": 5,
-        "rules": [rule_dict]
-    }
-
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(json_data, f, indent=2, ensure_ascii=False)
+    if compact is None:
+        compact = total_rules >= COMPACT_JSON_MIN_RULES
+    write_ruleset_json(json_path, rule_dict, compact=compact)
     return True
 
 def run_all():
@@ -198,6 +357,8 @@ def run_all():
     
     txt_files = glob("output/mihomo/*.txt")
     processed_files = set()
+    # (输入 txt, 输出名, 不变量, 是否为临时合并文件)
+    jobs = []
     
     # 查找所有后缀为 _DOMAIN.txt 的文件，并匹配是否有同名的 _IP.txt 文件
     domain_files = [f for f in txt_files if os.path.splitext(os.path.basename(f))[0].endswith("_DOMAIN")]
@@ -222,20 +383,7 @@ def run_all():
             temp_f_path = os.path.join(temp_dir, f"{prefix}.txt")
             with open(temp_f_path, 'w', encoding='utf-8') as temp_f:
                 temp_f.writelines(merged_lines)
-                
-            try:
-                json_path = os.path.join("output/singbox", f"{prefix}.json")
-                srs_path = os.path.join("output/singbox", f"{prefix}.srs")
-                
-                if convert_txt_to_json(temp_f_path, json_path):
-                    if has_sb:
-                        utils.compile_ruleset(
-                            ["sing-box", "rule-set", "compile", json_path, "-o", srs_path],
-                            f"{prefix}.srs"
-                        )
-            finally:
-                if os.path.exists(temp_f_path):
-                    os.remove(temp_f_path)
+            jobs.append((temp_f_path, prefix, utils.NO_INVARIANTS, True))
             
             processed_files.add(domain_path)
             processed_files.add(ip_path)
@@ -244,17 +392,26 @@ def run_all():
     for txt_path in txt_files:
         if txt_path in processed_files:
             continue
-            
         base_name = os.path.splitext(os.path.basename(txt_path))[0]
-        json_path = os.path.join("output/singbox", f"{base_name}.json")
-        srs_path = os.path.join("output/singbox", f"{base_name}.srs")
-        
-        if convert_txt_to_json(txt_path, json_path):
-            if has_sb:
+        jobs.append((txt_path, base_name, utils.get_output_invariants(txt_path), False))
+
+    # 转换在 CPU 进程池中并行执行；子进程看不到本进程的不变量登记表，需显式传入
+    futures = [
+        executors.cpu_pool().submit(convert_txt_to_json, txt_path, os.path.join("output/singbox", f"{name}.json"), invariants)
+        for txt_path, name, invariants, _ in jobs
+    ]
+    for (txt_path, name, _, is_temp), future in zip(jobs, futures):
+        json_path = os.path.join("output/singbox", f"{name}.json")
+        srs_path = os.path.join("output/singbox", f"{name}.srs")
+        try:
+            if future.result() and has_sb:
                 utils.compile_ruleset(
                     ["sing-box", "rule-set", "compile", json_path, "-o", srs_path],
-                    f"{base_name}.srs"
+                    f"{name}.srs"
                 )
+        finally:
+            if is_temp and os.path.exists(txt_path):
+                os.remove(txt_path)
 
 if __name__ == '__main__':
     run_all()
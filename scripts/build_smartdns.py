@@ -7,48 +7,57 @@ import utils
 def convert_txt_to_smartdns(src_path, dst_path, is_ip):
     base_name = os.path.splitext(os.path.basename(src_path))[0]
     smartdns_lines = []
-    
+
     with open(src_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            if line.startswith('#'):
-                smartdns_lines.append(line)
-                continue
-            
-            # 过滤尾部注释
-            parts = line.split('#')
-            rule = parts[0].strip()
-            comment = f" #{parts[1]}" if len(parts) > 1 else ""
+        src_lines = f.readlines()
+    # 域名集在转换前移除被更宽后缀覆盖的条目 (finalize_output 等已裁剪过的输入直接跳过)
+    kept_rules = None
+    if not is_ip and utils.INV_PRUNED not in utils.get_output_invariants(src_path):
+        rules = [l.split('#')[0].strip() for l in src_lines if l.strip() and not l.strip().startswith('#')]
+        kept_rules = set(utils.prune_subsumed([r for r in rules if r]))
+
+    for line in src_lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#'):
+            smartdns_lines.append(line)
+            continue
+        
+        # 过滤尾部注释
+        parts = line.split('#')
+        rule = parts[0].strip()
+        comment = f" #{parts[1]}" if len(parts) > 1 else ""
+        
+        if not rule:
+            continue
             
-            if not rule:
+        if is_ip:
+            # IP-set 模式：只保留有效的 IP 或 CIDR
+            cleaned_ip = utils.clean_ip_line(rule)
+            if cleaned_ip and utils.is_valid_ip_or_cidr(cleaned_ip):
+                smartdns_lines.append(cleaned_ip + comment)
+        else:
+            # Domain-set 模式：过滤掉 IP，并转换域名匹配语法
+            if utils.is_valid_ip_or_cidr(rule):
+                continue
+            if kept_rules is not None and rule not in kept_rules:
                 continue
                 
-            if is_ip:
-                # IP-set 模式：只保留有效的 IP 或 CIDR
-                cleaned_ip = utils.clean_ip_line(rule)
-                if cleaned_ip and utils.is_valid_ip_or_cidr(cleaned_ip):
-                    smartdns_lines.append(cleaned_ip + comment)
+            if rule.startswith('+.'):
+                converted = rule[2:]
+            elif rule.startswith('.'):
+                converted = rule[1:]
+            elif rule.startswith('*.'):
+                converted = rule
+            elif rule.startswith('-.'):
+                converted = rule
             else:
-                # Domain-set 模式：过滤掉 IP，并转换域名匹配语法
-                if utils.is_valid_ip_or_cidr(rule):
-                    continue
-                    
-                if rule.startswith('+.'):
-                    converted = rule[2:]
-                elif rule.startswith('.'):
-                    converted = rule[1:]
-                elif rule.startswith('*.'):
-                    converted = rule
-                elif rule.startswith('-.'):
-                    converted = rule
-                else:
-                    # Mihomo 中不含通配前缀的为精确匹配，映射到 SmartDNS 的 -. 匹配
-                    converted = "-." + rule
-                    
-                smartdns_lines.append(converted + comment)
-            
+                # Mihomo 中不含通配前缀的为精确匹配，映射到 SmartDNS 的 -. 匹配
+                converted = "-." + rule
+                
+            smartdns_lines.append(converted + comment)
+        
     # 统计有效规则条数 (排除了空行和注释)
     rules_count = sum(1 for l in smartdns_lines if l.strip() and not l.strip().startswith('#'))
     
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预压缩产物：为各输出目录中的文本 / JSON 规则文件生成 .gz 以及可选的 .zst / .br 变体，
+镜像或本地服务层可直接下发，无需实时压缩。
+
+gzip 固定 mtime=0 且不写入文件名，内容不变时压缩结果逐字节一致。
+zstd / brotli 依赖可选的 zstandard / brotli 包，未安装时跳过对应变体。
+"""
+import os
+import gzip
+import executors
+import analytics
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTS = (".txt", ".json")
+COMPRESSED_EXTS = (".gz", ".zst", ".br")
+GZIP_LEVEL = 9
+ZSTD_LEVEL = 19
+BROTLI_QUALITY = 11
+
+
+def available_variants():
+    variants = ["gzip"]
+    if zstandard is not None: variants.append("zstd")
+    if brotli is not None: variants.append("brotli")
+    return variants
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def compress_file(path):
+    """为单个文件生成全部可用的压缩变体，返回 {"size": 原始大小, 变体名: 压缩后大小}。"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    sizes = {"size": len(data)}
+    outputs = [("gzip", ".gz", lambda d: gzip.compress(d, compresslevel=GZIP_LEVEL, mtime=0))]
+    if zstandard is not None:
+        outputs.append(("zstd", ".zst", lambda d: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(d)))
+    if brotli is not None:
+        outputs.append(("brotli", ".br", lambda d: brotli.compress(d, quality=BROTLI_QUALITY)))
+    for variant, ext, fn in outputs:
+        packed = fn(data)
+        _write_atomic(path + ext, packed)
+        sizes[variant] = len(packed)
+    return sizes
+
+
+def precompress_outputs(out_dirs):
+    """在 CPU 进程池中并行压缩 out_dirs 顶层的文本 / JSON 文件，并将各变体大小写入构建报告。"""
+    paths = []
+    for out_dir in out_dirs:
+        if not os.path.isdir(out_dir): continue
+        for name in sorted(os.listdir(out_dir)):
+            path = os.path.join(out_dir, name)
+            if name.endswith(COMPRESSIBLE_EXTS) and name != "manifest.json" and os.path.isfile(path):
+                paths.append(path)
+    pool = executors.cpu_pool()
+    futures = [pool.submit(compress_file, path) for path in paths]
+    files = {path.replace(os.sep, "/"): future.result() for path, future in zip(paths, futures)}
+
+    variants = available_variants()
+    totals = {key: sum(sizes[key] for sizes in files.values()) for key in ["size"] + variants}
+    analytics.write_report("compression", {"variants": variants, "totals": totals, "files": files})
+    summary = ", ".join(f"{v}: {totals[v] / 1e6:.2f}MB ({totals[v] / totals['size']:.0%})" for v in variants) if totals["size"] else "-"
+    print(f"🗜️ [预压缩] {len(files)} 个文件 | 原始: {totals['size'] / 1e6:.2f}MB | {summary}")
+    return files
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+构建间增量产物：与上一次构建的规则集快照比较，为每个规则集输出新增/删除条目文件与 manifest.json。
+
+规则集版本号为其有序规则行 (不含注释头) 以换行连接后的 sha256，客户端可按同样方式自行计算；
+持有 base 版本的客户端先删除 removed 中的行、再追加 added 中的行即得到 target 版本。
+快照保存在 CACHE_DIR/snapshots/ (CI 中由 actions/cache 跨构建恢复)。
+"""
+import os
+import json
+import glob
+import shutil
+import hashlib
+import utils
+
+DELTA_DIRNAME = "delta"
+
+
+def _snapshot_dir():
+    return os.path.join(utils.CACHE_DIR, "snapshots")
+
+
+def read_rules(path):
+    """读取规则集的有序去重规则行 (跳过空行与注释)。"""
+    if not os.path.exists(path):
+        return None
+    lines = (line.strip() for line in utils.read_text_bulk(path).split('\n'))
+    return sorted({line for line in lines if line and not line.startswith('#')})
+
+
+def ruleset_version(rules):
+    return hashlib.sha256('\n'.join(rules).encode('utf-8')).hexdigest()
+
+
+def _write_lines(path, lines):
+    with open(path, 'w', encoding='utf-8') as f:
+        if lines: f.write('\n'.join(lines) + '\n')
+
+
+def emit_deltas(txt_dir):
+    """
+    为 txt_dir 下的每个规则集生成相对上次构建的增量文件，写入 txt_dir/delta/，并更新快照。
+    返回 manifest 字典。
+    """
+    delta_dir = os.path.join(txt_dir, DELTA_DIRNAME)
+    shutil.rmtree(delta_dir, ignore_errors=True)
+    os.makedirs(delta_dir, exist_ok=True)
+    snapshot_dir = _snapshot_dir()
+    os.makedirs(snapshot_dir, exist_ok=True)
+
+    rulesets = {}
+    for path in sorted(glob.glob(os.path.join(txt_dir, "*.txt"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        current = read_rules(path)
+        target = ruleset_version(current)
+        snapshot_path = os.path.join(snapshot_dir, f"{name}.txt")
+        previous = read_rules(snapshot_path)
+        entry = {"target": target, "rules": len(current)}
+        if previous is None:
+            # 首次构建没有基线，客户端需全量获取
+            entry["base"] = None
+        else:
+            entry["base"] = ruleset_version(previous)
+            prev_set, cur_set = set(previous), set(current)
+            added = [rule for rule in current if rule not in prev_set]
+            removed = [rule for rule in previous if rule not in cur_set]
+            entry["added"] = len(added)
+            entry["removed"] = len(removed)
+            if added or removed:
+                added_name, removed_name = f"{name}.added.txt", f"{name}.removed.txt"
+                _write_lines(os.path.join(delta_dir, added_name), added)
+                _write_lines(os.path.join(delta_dir, removed_name), removed)
+                entry["added_file"] = added_name
+                entry["removed_file"] = removed_name
+        if entry["base"] != target:
+            _write_lines(snapshot_path, current)
+        rulesets[name] = entry
+
+    manifest = {
+        "version_scheme": "sha256 of sorted rule lines joined by \\n",
+        "rulesets": rulesets,
+    }
+    with open(os.path.join(delta_dir, "manifest.json"), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    changed = sum(1 for e in rulesets.values() if e.get("added") or e.get("removed"))
+    print(f"🧩 [增量] {len(rulesets)} 个规则集, {changed} 个有变化, 增量文件写入 {delta_dir}")
+    return manifest
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全局共享执行层：按负载类型划分的有界池，替代各模块各自创建的 ThreadPoolExecutor。
+
+- stage:   阶段编排任务 (各 gen_* 与各平台 run_all)，只负责调度和等待
+- io:      网络下载
+- fetch:   下载内部的单次 HTTP 请求 (含对冲请求)，由运行在 io 池中的 download_file 提交
+- cpu:     CPU 密集型的清洗 / 去重 / 过滤 (进程池，避开 GIL 争用)
+- compile: mihomo / sing-box 外部编译子进程
+
+注意：提交到某个池的任务不得再向同一个池提交并等待，否则在池满时会互相等待而死锁。
+"""
+import os
+import time
+import threading
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+
+_CPU_COUNT = os.cpu_count() or 1
+
+POOL_SIZES = {
+    "stage": 8,
+    "io": min(16, _CPU_COUNT * 4 + 4),
+    # 每个下载最多同时有 1 + 镜像数 个请求在途，按 io 的两倍留出对冲余量
+    "fetch": min(32, _CPU_COUNT * 8 + 8),
+    "cpu": _CPU_COUNT,
+    "compile": _CPU_COUNT,
+}
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def _run_timed(fn, args, kwargs):
+    """在工作线程/子进程中执行任务并返回 (结果, 耗时)，供父进程统计忙碌时长。"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+class MeteredPool:
+    """Executor 的薄封装：记录提交数、排队深度峰值与忙碌时长。"""
+
+    def __init__(self, name, executor, workers):
+        self.name = name
+        self.workers = workers
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._first_submit = None
+        self.submitted = 0
+        self.completed = 0
+        self.in_flight = 0
+        self.peak_queue = 0
+        self.busy_seconds = 0.0
+
+    def submit(self, fn, *args, **kwargs):
+        outer = Future()
+        with self._lock:
+            if self._first_submit is None:
+                self._first_submit = time.monotonic()
+            self.submitted += 1
+            self.in_flight += 1
+            # 超出 worker 数的在途任务即为排队中的任务
+            self.peak_queue = max(self.peak_queue, self.in_flight - self.workers)
+        inner = self._executor.submit(_run_timed, fn, args, kwargs)
+        inner.add_done_callback(lambda f: self._on_done(f, outer))
+        return outer
+
+    def _on_done(self, inner, outer):
+        result, elapsed, error = None, 0.0, None
+        try:
+            result, elapsed = inner.result()
+        except BaseException as e:
+            error = e
+        # 先更新统计再完成外层 Future：被 result() 唤醒的调用方看到的计数已包含本任务
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+            self.busy_seconds += elapsed
+        if error is not None:
+            outer.set_exception(error)
+        else:
+            outer.set_result(result)
+
+    def map(self, fn, *iterables):
+        futures = [self.submit(fn, *args) for args in zip(*iterables)]
+        return [f.result() for f in futures]
+
+    def stats(self):
+        with self._lock:
+            wall = time.monotonic() - self._first_submit if self._first_submit else 0.0
+            capacity = wall * self.workers
+            return {
+                "workers": self.workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "queue_depth": max(0, self.in_flight - self.workers),
+                "peak_queue_depth": self.peak_queue,
+                "busy_seconds": round(self.busy_seconds, 3),
+                "utilization": round(self.busy_seconds / capacity, 3) if capacity > 0 else 0.0,
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def _create_pool(name):
+    workers = POOL_SIZES[name]
+    if name == "cpu":
+        # spawn 避免在多线程父进程中 fork 带来的锁状态继承问题
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"wuiiled-{name}")
+    return MeteredPool(name, executor, workers)
+
+
+def get_pool(name):
+    with _POOLS_LOCK:
+        pool = _POOLS.get(name)
+        if pool is None:
+            pool = _POOLS[name] = _create_pool(name)
+        return pool
+
+
+def stage_pool():
+    return get_pool("stage")
+
+
+def io_pool():
+    return get_pool("io")
+
+
+def fetch_pool():
+    return get_pool("fetch")
+
+
+def cpu_pool():
+    return get_pool("cpu")
+
+
+def compile_pool():
+    return get_pool("compile")
+
+
+def run_cpu(fn, *args, **kwargs):
+    """在 CPU 进程池中同步执行模块级函数 (参数与返回值须可 pickle)。"""
+    return cpu_pool().submit(fn, *args, **kwargs).result()
+
+
+def report():
+    """在构建日志中输出各池的排队深度与利用率。"""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+    for pool in pools:
+        s = pool.stats()
+        print(f"📊 [执行层] {pool.name:<8} | 并发上限: {s['workers']:>2} | 任务数: {s['submitted']:>4} | "
+              f"当前排队: {s['queue_depth']:>3} | 峰值排队: {s['peak_queue_depth']:>3} | "
+              f"忙碌: {s['busy_seconds']:.1f}s | 利用率: {s['utilization']:.0%}")
+
+
+def shutdown():
+    with _POOLS_LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.shutdown(wait=True)
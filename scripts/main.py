@@ -2,17 +2,23 @@
 # -*- coding: utf-8 -*-
 import os
 import sys
-from concurrent.futures import ThreadPoolExecutor
 
+import executors
+import utils
+import manifest
+import compress
 import build_mihomo
 import build_adg
 import build_mosdns
 import build_singbox
 import build_smartdns
+import build_geodat
+import build_mmdb
+import rule_index
 
 def main():
     print("⚡️ 创建基础输出目录...")
-    for d in ["output/mihomo", "output/adg", "output/mosdns-x", "output/singbox", "output/smartdns"]:
+    for d in ["output/mihomo", "output/adg", "output/mosdns-x", "output/singbox", "output/smartdns", "output/geodat", "output/report"]:
         os.makedirs(d, exist_ok=True)
 
     print("\n🚀 [阶段 1/2] 构建 Mihomo 规则 (其他平台的前置依赖)...")
@@ -22,21 +28,39 @@ def main():
         print(f"❌ Mihomo 规则构建失败: {e}")
         sys.exit(1)
 
-    print("\n🚀 [阶段 2/2] 并行构建 ADG、MosDNS、Sing-box 与 SmartDNS 规则...")
-    with ThreadPoolExecutor() as executor:
-        futures = {
-            "AdGuard Home": executor.submit(build_adg.run_all),
-            "MosDNS": executor.submit(build_mosdns.run_all),
-            "Sing-box": executor.submit(build_singbox.run_all),
-            "SmartDNS": executor.submit(build_smartdns.run_all),
-        }
-        for name, future in futures.items():
-            try:
-                future.result()
-                print(f"  ✅ {name} 构建完成")
-            except Exception as e:
-                print(f"  ❌ {name} 构建失败: {e}")
-                sys.exit(1)
+    print("\n🚀 [阶段 2/2] 并行构建 ADG、MosDNS、Sing-box、SmartDNS、GeoDat、MMDB 规则与查询索引...")
+    pool = executors.stage_pool()
+    futures = {
+        "AdGuard Home": pool.submit(build_adg.run_all),
+        "MosDNS": pool.submit(build_mosdns.run_all),
+        "Sing-box": pool.submit(build_singbox.run_all),
+        "SmartDNS": pool.submit(build_smartdns.run_all),
+        "GeoDat": pool.submit(build_geodat.run_all),
+        "MMDB": pool.submit(build_mmdb.run_all),
+        "查询索引": pool.submit(rule_index.build_index),
+    }
+    for name, future in futures.items():
+        try:
+            future.result()
+            print(f"  ✅ {name} 构建完成")
+        except Exception as e:
+            print(f"  ❌ {name} 构建失败: {e}")
+            sys.exit(1)
+
+    deploy_dirs = ["output/mihomo", "output/adg", "output/mosdns-x", "output/singbox", "output/smartdns", "output/geodat"]
+    print("\n🗜️ 生成预压缩产物...")
+    compress.precompress_outputs(deploy_dirs)
+
+    print("\n🧾 生成输出目录清单 (manifest.json)...")
+    for d in deploy_dirs:
+        files = manifest.write_manifest(d)["files"]
+        print(f"  ✅ {d:<18} | 文件数: {len(files)}")
+
+    print(f"\n📁 本地解析的仓库内来源: {utils.local_source_hits()} 个 (节省同等次数的网络请求)")
+
+    print("\n📊 执行层统计:")
+    executors.report()
+    executors.shutdown()
 
     print("\n🎉 所有规则转换与打包任务完美执行完毕！")
 
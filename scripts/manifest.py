@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+输出目录清单：为每个输出目录生成 manifest.json，记录各产物的 sha256、大小、规则数与内容最后变化时间。
+客户端与部署步骤可据此比对哈希，跳过未变化的文件。
+"""
+import os
+import json
+import hashlib
+import utils
+
+MANIFEST_NAME = "manifest.json"
+_HASH_CHUNK = 1 << 20
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def count_rules(path):
+    """统计规则数：文本按非空非注释行计；sing-box JSON 按各规则数组长度求和；二进制规则集沿用同名源文件的计数。"""
+    base, ext = os.path.splitext(path)
+    if ext == ".txt":
+        return sum(1 for line in utils.read_text_bulk(path).split('\n') if line.strip() and not line.lstrip().startswith('#'))
+    if ext == ".json":
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return sum(len(v) if isinstance(v, list) else 1 for rule in data.get("rules", []) for v in rule.values())
+        except (ValueError, AttributeError, TypeError):
+            return None
+    source = {".mrs": ".txt", ".srs": ".json"}.get(ext)
+    if source and os.path.exists(base + source):
+        return count_rules(base + source)
+    return None
+
+
+def write_manifest(out_dir):
+    """扫描 out_dir 顶层文件生成 manifest.json，返回清单字典。"""
+    target = os.path.basename(os.path.normpath(out_dir))
+    files = {}
+    for name in sorted(os.listdir(out_dir)):
+        path = os.path.join(out_dir, name)
+        if name == MANIFEST_NAME or not os.path.isfile(path):
+            continue
+        digest = file_sha256(path)
+        files[name] = {
+            "sha256": digest,
+            "size": os.path.getsize(path),
+            "rules": count_rules(path),
+            "changed": utils.content_change_time(f"manifest:{target}/{name}", digest),
+        }
+    manifest = {"target": target, "files": files}
+    with open(os.path.join(out_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    return manifest
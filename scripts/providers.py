@@ -72,3 +72,61 @@ ADG_URLS = {
     "Httpdns": "https://raw.githubusercontent.com/MetaCubeX/meta-rules-dat/meta/geo/geosite/category-httpdns-cn.list",
     "PCDN": "https://raw.githubusercontent.com/wuiiled/PCDN-mihomo-list/main/pcdn.list"
 }
+
+# 跨规则集冗余消除的优先级组 (默认关闭)：每组内按优先级从高到低排列，
+# 低优先级规则集中已被高优先级规则集包含或覆盖的域名条目会被移除并重新编译。
+# 仅当客户端配置中的规则顺序与此一致时才可启用，例如：
+# OVERLAP_PRECEDENCE = [["Reject_Drop_merged", "ADs_merged"], ["Custom_Proxy", "proxy"]]
+OVERLAP_PRECEDENCE = []
+
+# 密集子域提升：同一可注册域名下被拦截的不同子域达到 threshold 个时合并为一条 +.<可注册域名>
+# (可注册域名按 scripts/public_suffix_list.dat 判定，白名单涉及的域名除外)。
+# apply 为 False 时只评估候选并写入 output/report/suffix_promotion_<规则集>.json，不改动规则集；
+# 提升会连带拦截可注册域名本身及其全部子域，启用前请先核对报告中的候选。
+SUFFIX_PROMOTION = {
+    "ADs_merged": {"threshold": 20, "apply": False},
+    "Reject_Drop_merged": {"threshold": 20, "apply": False},
+}
+
+# 体积受限的精简版规则集 (如 128MB 内存的路由器)：{输出名: 配置}，
+# source 为来源规则集 (目前支持 ADs_merged)，max_rules / max_bytes 为规则数与 Mihomo 文本字节预算 (可只设其一)，
+# score 为评分方式 (utils.PROFILE_SCORES)：sources 按列出该规则的上游来源数，breadth 按覆盖范围。
+# 精简版与完整版一样输出到各平台分支 (Mihomo / Sing-box / SmartDNS / MosDNS / AdGuard Home)。
+OUTPUT_PROFILES = {
+    "ADs_merged_lite": {"source": "ADs_merged", "max_rules": 50000, "max_bytes": None, "score": "sources"},
+}
+
+# 规则历史库 (默认关闭)：启用后每次构建把 output/mihomo 下各规则集的规则连同进入时的上游来源
+# 写入 SQLite 库 (CACHE_DIR/history.sqlite3，随构建缓存跨构建保留)，查询与比较见 scripts/rule_history.py。
+RULE_HISTORY = False
+
+# 下载镜像改写规则：(匹配原始 URL 的正则, [镜像 URL 模板])，模板中的 {0} {1} ... 为正则分组。
+# 原始地址超过对冲阈值未响应或请求失败时，依次向镜像加发请求，先返回者胜出。
+# 注意 jsDelivr 对分支引用有缓存，仅作为慢速/失败时的兜底。
+DOWNLOAD_MIRRORS = [
+    (r"^https://raw\.githubusercontent\.com/([^/]+)/([^/]+)/(?:refs/heads/)?([^/]+)/(.+)$", [
+        "https://cdn.jsdelivr.net/gh/{0}/{1}@{2}/{3}",
+        "https://ghfast.top/https://raw.githubusercontent.com/{0}/{1}/{2}/{3}",
+    ]),
+    (r"^https://github\.com/([^/]+)/([^/]+)/raw/(?:refs/heads/)?([^/]+)/(.+)$", [
+        "https://cdn.jsdelivr.net/gh/{0}/{1}@{2}/{3}",
+        "https://ghfast.top/https://raw.githubusercontent.com/{0}/{1}/{2}/{3}",
+    ]),
+]
+
+# 指向本仓库的来源前缀：CI 已检出工作区，匹配的 URL 直接读取本地文件 (不存在时回退为网络下载)
+LOCAL_SOURCE_PREFIXES = [
+    "https://raw.githubusercontent.com/wuiiled/Wuiiled_Setup/master/",
+]
+
+# 来源格式声明 (utils.SOURCE_FORMATS 之一)：选择对应的快速解析器，未声明的来源按文件开头自动探测。
+# 解析器遇到非典型行时回退为通用清洗，声明有误只影响速度、不影响结果。
+SOURCE_FORMATS = {
+    "https://adguardteam.github.io/HostlistsRegistry/assets/filter_1.txt": "adguard",
+    "https://adguardteam.github.io/HostlistsRegistry/assets/filter_3.txt": "adguard",
+    "https://adguardteam.github.io/HostlistsRegistry/assets/filter_4.txt": "adguard",
+    "https://raw.githubusercontent.com/Cats-Team/AdRules/main/adrules_domainset.txt": "domainset",
+    "https://raw.githubusercontent.com/ForestL18/rules-dat/mihomo/geo/classical/pcdn.list": "clash",
+    "https://ruleset.skk.moe/List/non_ip/ai.conf": "clash",
+    "https://ruleset.skk.moe/Internal/clash_fake_ip_filter.yaml": "yaml",
+}
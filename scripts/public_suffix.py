@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+公共后缀查询：按 Public Suffix List 规则 (普通 / 通配 / 例外，未命中时退回默认规则 "*")
+求域名的公共后缀与可注册域名 (公共后缀再加一级)。
+
+默认加载随仓库附带的上游 Public Suffix List 完整快照 public_suffix_list.dat (未经改动，版本见文件头的
+VERSION / COMMIT 行，更新时从 https://publicsuffix.org/list/public_suffix_list.dat 整体替换)，同一进程内只解析一次。
+"""
+import os
+import threading
+
+DEFAULT_LIST_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "public_suffix_list.dat")
+
+_DEFAULT = None
+_DEFAULT_LOCK = threading.Lock()
+
+
+class PublicSuffixList:
+    def __init__(self, lines):
+        self.rules = set()
+        self.wildcards = set()
+        self.exceptions = set()
+        for line in lines:
+            # 上游规则以空白结束，其后内容一律忽略
+            rule = line.strip().split(' ')[0].lower()
+            if not rule or rule.startswith('//'):
+                continue
+            if rule.startswith('!'):
+                self.exceptions.add(rule[1:])
+            elif rule.startswith('*.'):
+                self.wildcards.add(rule[2:])
+            else:
+                self.rules.add(rule)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(f)
+
+    def public_suffix(self, domain):
+        """返回 domain 的公共后缀 (最长匹配规则；例外规则优先，去掉其最左一级)。"""
+        labels = domain.lower().strip('.').split('.')
+        for i in range(len(labels)):
+            suffix = '.'.join(labels[i:])
+            if suffix in self.exceptions:
+                return '.'.join(labels[i + 1:])
+            if suffix in self.rules:
+                return suffix
+            if i + 1 < len(labels) and '.'.join(labels[i + 1:]) in self.wildcards:
+                return suffix
+        return labels[-1]
+
+    def registrable_domain(self, domain):
+        """返回 domain 的可注册域名，domain 本身即公共后缀时返回 None。"""
+        domain = domain.lower().strip('.')
+        suffix = self.public_suffix(domain)
+        if domain == suffix:
+            return None
+        head = domain[:-len(suffix) - 1]
+        return f"{head.rsplit('.', 1)[-1]}.{suffix}"
+
+
+def default_list():
+    """进程内共享的默认列表 (随仓库附带的上游快照)。"""
+    global _DEFAULT
+    with _DEFAULT_LOCK:
+        if _DEFAULT is None:
+            _DEFAULT = PublicSuffixList.load(DEFAULT_LIST_PATH)
+        return _DEFAULT
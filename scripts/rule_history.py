@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+规则历史库：把每次构建的各规则集写入 SQLite，记录每条规则何时进入、何时离开以及进入时由哪些上游来源提供，
+可直接回答 "某域名何时进入 ADs_merged、来自哪个来源"，并在不重新读取旧文本产物的情况下比较任意两次构建。
+
+规则的存在以区间记录 (spans)：连续出现的构建合并为一行 [first_build, last_build]，仍在最新构建中的区间 last_build 为 NULL，
+离开时写入最后出现的构建，再次出现时新增一行。每次构建只写入发生变化的规则，库的大小与规则变化量而非构建次数成正比。
+由 providers.RULE_HISTORY 开启 (默认关闭)，库文件位于 CACHE_DIR/history.sqlite3。
+
+用法：
+  python3 scripts/rule_history.py builds
+  python3 scripts/rule_history.py domain example.com [--ruleset ADs_merged]
+  python3 scripts/rule_history.py diff ADs_merged [--base 3] [--target 5]
+"""
+import os
+import sys
+import glob
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+import utils
+import providers
+
+DB_NAME = "history.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS builds (
+    id INTEGER PRIMARY KEY,
+    built_at TEXT NOT NULL,
+    revision TEXT
+);
+CREATE TABLE IF NOT EXISTS rulesets (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS spans (
+    id INTEGER PRIMARY KEY,
+    ruleset_id INTEGER NOT NULL REFERENCES rulesets(id),
+    rule TEXT NOT NULL,
+    domain TEXT NOT NULL,
+    first_build INTEGER NOT NULL REFERENCES builds(id),
+    last_build INTEGER REFERENCES builds(id)
+);
+CREATE TABLE IF NOT EXISTS span_sources (
+    span_id INTEGER NOT NULL REFERENCES spans(id),
+    source_id INTEGER NOT NULL REFERENCES sources(id),
+    PRIMARY KEY (span_id, source_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS spans_domain ON spans(domain);
+CREATE INDEX IF NOT EXISTS spans_ruleset_rule ON spans(ruleset_id, rule);
+CREATE INDEX IF NOT EXISTS spans_ruleset_first ON spans(ruleset_id, first_build);
+CREATE INDEX IF NOT EXISTS spans_ruleset_last ON spans(ruleset_id, last_build);
+"""
+
+# 构建过程中登记的上游来源：{规则集: [(url, 规则集合或清洗后的来源文件路径)]}
+_SOURCES = {}
+_SOURCES_LOCK = threading.Lock()
+
+
+def db_path():
+    return os.path.join(utils.CACHE_DIR, DB_NAME)
+
+
+def enabled():
+    return bool(providers.RULE_HISTORY)
+
+
+def rule_domain(rule):
+    """规则的域名主体 (去掉 +. / . 前缀)，IP/CIDR 与其它条目原样返回。"""
+    if rule.startswith('+.'): return rule[2:]
+    if rule.startswith('.'): return rule[1:]
+    return rule
+
+
+def register_sources(ruleset, sources):
+    """
+    登记规则集的上游来源，供 record_build 标注新进入规则的来源。
+    sources 为 [(url, 规则集合)] 或 [(url, 来源文件路径)]，规则格式与最终规则集一致或为不带前缀的域名。
+    未开启历史库时不保存，避免无谓地持有来源数据。
+    """
+    if not enabled(): return
+    with _SOURCES_LOCK:
+        _SOURCES[ruleset] = list(sources)
+
+
+def _source_domains(rules):
+    if isinstance(rules, str):
+        if not os.path.exists(rules): return set()
+        rules = (line for line in utils.read_text_bulk(rules).split('\n') if line and not line.startswith('#'))
+    return {rule_domain(rule) for rule in rules}
+
+
+def connect(path=None):
+    conn = sqlite3.connect(path or db_path())
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _id(conn, table, column, value):
+    conn.execute(f"INSERT OR IGNORE INTO {table}({column}) VALUES (?)", (value,))
+    return conn.execute(f"SELECT id FROM {table} WHERE {column} = ?", (value,)).fetchone()[0]
+
+
+def _read_rules(path):
+    lines = (line.strip() for line in utils.read_text_bulk(path).split('\n'))
+    return {line for line in lines if line and not line.startswith('#')}
+
+
+def record_build(txt_dir="output/mihomo", path=None, sources=None, built_at=None, revision=None):
+    """
+    记录一次构建：txt_dir 下每个规则集的规则批量写入历史库，消失的规则关闭其区间，新出现的规则新增区间并标注来源。
+    sources 缺省时使用 register_sources 登记的来源。返回 (构建编号, {规则集: {"added": n, "removed": n}})。
+    """
+    if sources is None:
+        with _SOURCES_LOCK:
+            sources = dict(_SOURCES)
+    os.makedirs(os.path.dirname(os.path.abspath(path or db_path())), exist_ok=True)
+    conn = connect(path)
+    try:
+        with conn:
+            prev_build = conn.execute("SELECT MAX(id) FROM builds").fetchone()[0] or 0
+            build_id = conn.execute(
+                "INSERT INTO builds(built_at, revision) VALUES (?, ?)",
+                (built_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S"), revision or os.environ.get("GITHUB_SHA")),
+            ).lastrowid
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS current_rules (rule TEXT PRIMARY KEY, domain TEXT NOT NULL) WITHOUT ROWID")
+            stats = {}
+            seen = []
+            for txt_path in sorted(glob.glob(os.path.join(txt_dir, "*.txt"))):
+                name = os.path.splitext(os.path.basename(txt_path))[0]
+                ruleset_id = _id(conn, "rulesets", "name", name)
+                seen.append(ruleset_id)
+                conn.execute("DELETE FROM current_rules")
+                conn.executemany("INSERT INTO current_rules(rule, domain) VALUES (?, ?)",
+                                 ((rule, rule_domain(rule)) for rule in _read_rules(txt_path)))
+                # 未关闭的区间：本次仍存在则保持不动，否则以上次构建为最后出现
+                removed = conn.execute(
+                    "UPDATE spans SET last_build = ? WHERE ruleset_id = ? AND last_build IS NULL "
+                    "AND rule NOT IN (SELECT rule FROM current_rules)", (prev_build, ruleset_id)).rowcount
+                added = conn.execute(
+                    "INSERT INTO spans(ruleset_id, rule, domain, first_build) "
+                    "SELECT ?, rule, domain, ? FROM current_rules WHERE rule NOT IN "
+                    "(SELECT rule FROM spans WHERE ruleset_id = ? AND last_build IS NULL)",
+                    (ruleset_id, build_id, ruleset_id)).rowcount
+                if added and name in sources:
+                    _attribute(conn, ruleset_id, build_id, sources[name])
+                stats[name] = {"added": added, "removed": removed}
+            # 本次构建不再生成的规则集：关闭其全部区间
+            conn.execute(
+                f"UPDATE spans SET last_build = ? WHERE last_build IS NULL AND ruleset_id NOT IN ({','.join('?' * len(seen))})",
+                (prev_build, *seen))
+            conn.execute("DROP TABLE current_rules")
+        conn.execute("PRAGMA optimize")
+    finally:
+        conn.close()
+    return build_id, stats
+
+
+def _attribute(conn, ruleset_id, build_id, sources):
+    """为本次新增的区间批量写入提供该规则 (按域名主体比较) 的上游来源。"""
+    new_spans = conn.execute(
+        "SELECT id, domain FROM spans WHERE ruleset_id = ? AND first_build = ?", (ruleset_id, build_id)).fetchall()
+    for url, rules in sources:
+        source_id = _id(conn, "sources", "url", url)
+        domains = _source_domains(rules)
+        conn.executemany("INSERT OR IGNORE INTO span_sources(span_id, source_id) VALUES (?, ?)",
+                         ((span_id, source_id) for span_id, domain in new_spans if domain in domains))
+
+
+def _parent_domains(domain):
+    parents = []
+    pos = domain.find('.')
+    while pos != -1:
+        parents.append(domain[pos + 1:])
+        pos = domain.find('.', pos + 1)
+    return parents
+
+
+def domain_history(conn, domain, ruleset=None):
+    """
+    返回涉及该域名的全部区间：域名本身的条目，以及覆盖它的父域后缀条目 (+. / .)。
+    每项为 dict(ruleset, rule, first_build, first_seen, last_build, last_seen, sources)，按规则集与进入时间排序；
+    仍在最新构建中的区间 last_build / last_seen 为 None。
+    """
+    domain = domain.strip().lower().rstrip('.')
+    domains = [domain, *_parent_domains(domain)]
+    query = f"""
+        SELECT s.id, r.name, s.rule, s.first_build, fb.built_at, s.last_build, lb.built_at
+        FROM spans s
+        JOIN rulesets r ON r.id = s.ruleset_id
+        JOIN builds fb ON fb.id = s.first_build
+        LEFT JOIN builds lb ON lb.id = s.last_build
+        WHERE s.domain IN ({",".join("?" * len(domains))}) AND (s.domain = ? OR s.rule != s.domain)
+    """
+    params = [*domains, domain]
+    if ruleset:
+        query += " AND r.name = ?"
+        params.append(ruleset)
+    rows = conn.execute(query + " ORDER BY r.name, s.first_build, s.rule", params).fetchall()
+    result = []
+    for span_id, name, rule, first_build, first_seen, last_build, last_seen in rows:
+        urls = [url for (url,) in conn.execute(
+            "SELECT src.url FROM span_sources ss JOIN sources src ON src.id = ss.source_id "
+            "WHERE ss.span_id = ? ORDER BY src.url", (span_id,))]
+        result.append({"ruleset": name, "rule": rule, "first_build": first_build, "first_seen": first_seen,
+                       "last_build": last_build, "last_seen": last_seen, "sources": urls})
+    return result
+
+
+def ruleset_diff(conn, ruleset, base, target):
+    """
+    比较规则集在两次构建之间的变化，返回 (新增规则列表, 删除规则列表)，均有序。
+    只需查找在两次构建之间开始或结束的区间，不必载入整个规则集。
+    """
+    if base > target:
+        removed, added = ruleset_diff(conn, ruleset, target, base)
+        return added, removed
+    row = conn.execute("SELECT id FROM rulesets WHERE name = ?", (ruleset,)).fetchone()
+    if row is None:
+        return [], []
+    # 按 (规则集, 规则) 定位同一规则的其它区间；未收集统计信息时查询规划器可能误选按构建编号的索引
+    present_at = ("SELECT 1 FROM spans p INDEXED BY spans_ruleset_rule WHERE p.ruleset_id = s.ruleset_id AND p.rule = s.rule "
+                  "AND p.first_build <= ? AND (p.last_build IS NULL OR p.last_build >= ?)")
+    added = conn.execute(
+        f"SELECT s.rule FROM spans s WHERE s.ruleset_id = ? AND s.first_build > ? AND s.first_build <= ? "
+        f"AND (s.last_build IS NULL OR s.last_build >= ?) AND NOT EXISTS ({present_at})",
+        (row[0], base, target, target, base, base)).fetchall()
+    removed = conn.execute(
+        f"SELECT s.rule FROM spans s WHERE s.ruleset_id = ? AND s.last_build >= ? AND s.last_build < ? "
+        f"AND s.first_build <= ? AND NOT EXISTS ({present_at})",
+        (row[0], base, target, base, target, target)).fetchall()
+    return sorted(rule for (rule,) in added), sorted(rule for (rule,) in removed)
+
+
+def list_builds(conn):
+    return conn.execute("SELECT id, built_at, revision FROM builds ORDER BY id").fetchall()
+
+
+def record_if_enabled(txt_dir="output/mihomo"):
+    """构建流程的挂载点：开启历史库时记录本次构建并输出摘要。"""
+    if not enabled(): return None
+    build_id, stats = record_build(txt_dir)
+    added = sum(s["added"] for s in stats.values())
+    removed = sum(s["removed"] for s in stats.values())
+    print(f"🗃️ [历史] 构建 #{build_id:<20} | 规则集: {len(stats)} | 新增: {added:,} | 删除: {removed:,} | {db_path()}")
+    return build_id, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="规则历史库查询")
+    parser.add_argument("--db", default=None, help=f"历史库路径 (默认 CACHE_DIR/{DB_NAME})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("builds", help="列出已记录的构建")
+    domain = sub.add_parser("domain", help="查询域名进入 / 离开各规则集的时间与来源")
+    domain.add_argument("domain")
+    domain.add_argument("--ruleset")
+    diff = sub.add_parser("diff", help="比较规则集在两次构建之间的变化 (默认最近两次)")
+    diff.add_argument("ruleset")
+    diff.add_argument("--base", type=int)
+    diff.add_argument("--target", type=int)
+    args = parser.parse_args(argv)
+
+    path = args.db or db_path()
+    if not os.path.exists(path):
+        print(f"❌ 历史库不存在: {path}")
+        return 1
+    conn = connect(path)
+    try:
+        if args.command == "builds":
+            for build_id, built_at, revision in list_builds(conn):
+                print(f"  #{build_id:<6} {built_at}  {revision or ''}")
+        elif args.command == "domain":
+            for row in domain_history(conn, args.domain, args.ruleset):
+                left = "至今" if row["last_build"] is None else f"#{row['last_build']} {row['last_seen']}"
+                print(f"  {row['ruleset']:<25} {row['rule']:<35} 进入: #{row['first_build']} {row['first_seen']} | "
+                      f"最后出现: {left} | 来源: {', '.join(row['sources']) or '-'}")
+        else:
+            builds = [build_id for build_id, _, _ in list_builds(conn)]
+            target = args.target or (builds[-1] if builds else 0)
+            base = args.base or (builds[-2] if len(builds) > 1 else 0)
+            added, removed = ruleset_diff(conn, args.ruleset, base, target)
+            print(f"🔀 {args.ruleset}: #{base} → #{target} | 新增: {len(added):,} | 删除: {len(removed):,}")
+            for rule in added:
+                print(f"  + {rule}")
+            for rule in removed:
+                print(f"  - {rule}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
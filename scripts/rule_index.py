@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+规则集本地查询索引：对 output/mihomo 下全部规则集建立后缀索引与 CIDR 索引，写入单个可内存映射的二进制文件，
+查询 "哪些规则集 (哪条规则) 命中该域名 / IP" 时只需按标签逐级二分查找，不必遍历文本。
+
+匹配语义与 optimize_smart_self / convert_txt_to_json 一致：
+  x 精确匹配；+.x、.x 与 *.x 匹配 x 及其子域；其余通配条目按 ^(.*\\.)?主体$ (带前缀) 或 ^主体$ 的正则匹配，* 匹配任意字符。
+
+文件布局 (整数均为大端)：
+  MAGIC | 各数据段 | JSON 目录 | u64 目录偏移
+  key_index  (n+1) × u32  键在 key_blob 中的起止偏移，键按字节序排列
+  key_blob   域名键 (去掉前缀的规则主体)
+  post_index (n+1) × u32  键对应的 postings 区间
+  postings   u16 规则集编号 + u8 规则类型
+  ipv4/L, ipv6/L  按前缀长度分段，记录为网络地址 (4/16 字节) + u16 规则集编号，按字节序排列
+通配条目数量很少，直接存放在 JSON 目录中。
+
+用法：
+  python3 scripts/rule_index.py build
+  python3 scripts/rule_index.py query example.com 1.2.3.4
+"""
+import os
+import re
+import sys
+import mmap
+import glob
+import json
+import struct
+import bisect
+import argparse
+import ipaddress
+from collections import namedtuple
+import utils
+
+INDEX_PATH = "output/report/rule_index.bin"
+MAGIC = b"WRIDX01\n"
+
+KIND_EXACT = 0
+KIND_PLUS = 1
+KIND_DOT = 2
+KIND_STAR = 3
+KIND_PREFIX = {KIND_EXACT: "", KIND_PLUS: "+.", KIND_DOT: ".", KIND_STAR: "*."}
+
+_U32 = struct.Struct(">I")
+_POSTING = struct.Struct(">HB")
+_RULESET_ID = struct.Struct(">H")
+
+Match = namedtuple("Match", ["ruleset", "rule"])
+
+
+def classify_rule(line):
+    """
+    Mihomo 规则 → ("domain", 类型, 键) / ("wildcard", 规则) / ("ip", 网段)，无法使用的行返回 None。
+    分类与 convert_txt_to_json 相同：*.x 仅在只含一个前导 * 时按后缀处理，单独的 * 丢弃。
+    IP 条目取 clean_ip_line 清洗后的纯网段 (兼容 IP-CIDR, / no-resolve 等附加字段)，清洗失败的行按域名处理。
+    """
+    if ':' in line or ',' in line or line[-1].isdigit():
+        ip = utils.clean_ip_line(line)
+        if ip:
+            return "ip", ipaddress.ip_network(ip, strict=False)
+    if ' ' in line or ':' in line:
+        return None
+    if line.startswith('+.'):
+        body, kind = line[2:], KIND_PLUS
+    elif line.startswith('.'):
+        body, kind = line[1:], KIND_DOT
+    elif line.startswith('*.') and line.count('*') == 1:
+        body, kind = line[2:], KIND_STAR
+    else:
+        body, kind = line, KIND_EXACT
+    if not body or line == '*':
+        return None
+    if '*' in body:
+        return "wildcard", line
+    return "domain", kind, body
+
+
+def wildcard_regex(rule):
+    """通配条目的等价正则 (与 convert_txt_to_json 写出的 domain_regex 相同)。"""
+    with_apex = rule.startswith('.') or rule.startswith('+.')
+    body = rule[2:] if rule.startswith('+.') else rule[1:] if with_apex else rule
+    escaped = re.escape(body).replace(r'\*', '.*')
+    return re.compile(f"^(.*\\.)?{escaped}$" if with_apex else f"^{escaped}$")
+
+
+def _read_rules(path):
+    for line in utils.read_text_bulk(path).split('\n'):
+        line = line.strip()
+        if not line or line.startswith('#'): continue
+        line = line.split('#')[0].strip()
+        if line: yield line
+
+
+def build_index(txt_dir="output/mihomo", out_path=INDEX_PATH):
+    """扫描 txt_dir 下的全部规则集，写出索引文件并返回统计信息。"""
+    rulesets = []
+    keys = {}
+    wildcards = []
+    networks = {}
+    for path in sorted(glob.glob(os.path.join(txt_dir, "*.txt"))):
+        rid = len(rulesets)
+        rulesets.append(os.path.splitext(os.path.basename(path))[0])
+        for line in _read_rules(path):
+            entry = classify_rule(line)
+            if entry is None: continue
+            if entry[0] == "domain":
+                keys.setdefault(entry[2], set()).add((rid, entry[1]))
+            elif entry[0] == "wildcard":
+                wildcards.append([rid, entry[1]])
+            else:
+                net = entry[1]
+                networks.setdefault((net.version, net.prefixlen), set()).add((net.network_address.packed, rid))
+
+    sections = {}
+    out = bytearray(MAGIC)
+
+    def add_section(name, data):
+        sections[name] = [len(out), len(data)]
+        out.extend(data)
+
+    encoded = sorted((key.encode('utf-8'), key) for key in keys)
+    key_index, key_blob = [0], bytearray()
+    post_index, postings = [0], bytearray()
+    for raw, key in encoded:
+        key_blob += raw
+        key_index.append(len(key_blob))
+        for rid, kind in sorted(keys[key]):
+            postings += _POSTING.pack(rid, kind)
+        post_index.append(len(postings) // _POSTING.size)
+    add_section("key_index", struct.pack(f">{len(key_index)}I", *key_index))
+    add_section("key_blob", key_blob)
+    add_section("post_index", struct.pack(f">{len(post_index)}I", *post_index))
+    add_section("postings", postings)
+    for (version, prefixlen), records in sorted(networks.items()):
+        add_section(f"ipv{version}/{prefixlen}", b"".join(addr + _RULESET_ID.pack(rid) for addr, rid in sorted(records)))
+
+    directory = json.dumps({"rulesets": rulesets, "wildcards": wildcards, "sections": sections},
+                           ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    footer = len(out)
+    out += directory + struct.pack(">Q", footer)
+
+    os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+    with open(out_path, 'wb') as f:
+        f.write(out)
+    stats = {
+        "rulesets": len(rulesets),
+        "domain_keys": len(keys),
+        "wildcards": len(wildcards),
+        "networks": sum(len(records) for records in networks.values()),
+        "bytes": len(out),
+    }
+    print(f"✅ [索引] {os.path.basename(out_path):<27} | 规则集: {stats['rulesets']} | 域名键: {stats['domain_keys']:,} | "
+          f"通配: {stats['wildcards']:,} | 网段: {stats['networks']:,} | {stats['bytes'] / 1e6:.2f}MB")
+    return stats
+
+
+class _KeyTable:
+    """按序号访问 key_blob 中的键，供 bisect 直接在映射内存上二分。"""
+
+    def __init__(self, buf, index_off, blob_off, count):
+        self.buf, self.index_off, self.blob_off, self.count = buf, index_off, blob_off, count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        start, end = struct.unpack_from(">II", self.buf, self.index_off + 4 * i)
+        return self.buf[self.blob_off + start:self.blob_off + end]
+
+
+class _NetworkTable:
+    """定长网段记录 (地址 + 规则集编号)，按序号返回地址部分。"""
+
+    def __init__(self, buf, offset, length, addr_size):
+        self.buf, self.offset, self.addr_size = buf, offset, addr_size
+        self.record_size = addr_size + _RULESET_ID.size
+        self.count = length // self.record_size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        start = self.offset + i * self.record_size
+        return self.buf[start:start + self.addr_size]
+
+    def ruleset_id(self, i):
+        return _RULESET_ID.unpack_from(self.buf, self.offset + i * self.record_size + self.addr_size)[0]
+
+
+class RuleIndex:
+    """只读打开索引文件 (内存映射)，query() 返回命中的 (规则集, 规则) 列表。"""
+
+    def __init__(self, path=INDEX_PATH):
+        with open(path, 'rb') as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._buf[:len(MAGIC)] != MAGIC:
+            self._buf.close()
+            raise ValueError(f"不是规则索引文件: {path}")
+        footer = struct.unpack_from(">Q", self._buf, len(self._buf) - 8)[0]
+        directory = json.loads(self._buf[footer:len(self._buf) - 8])
+        self.rulesets = directory["rulesets"]
+        sections = directory["sections"]
+        count = sections["key_index"][1] // 4 - 1
+        self._keys = _KeyTable(self._buf, sections["key_index"][0], sections["key_blob"][0], count)
+        self._post_index_off = sections["post_index"][0]
+        self._postings_off = sections["postings"][0]
+        self._wildcards = [(rid, rule, wildcard_regex(rule)) for rid, rule in directory["wildcards"]]
+        self._networks = {4: [], 6: []}
+        for name, (offset, length) in sections.items():
+            if not name.startswith("ipv"): continue
+            version, prefixlen = map(int, name[3:].split('/'))
+            self._networks[version].append((prefixlen, _NetworkTable(self._buf, offset, length, 4 if version == 4 else 16)))
+
+    def close(self):
+        self._buf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _postings(self, i):
+        start, end = struct.unpack_from(">II", self._buf, self._post_index_off + 4 * i)
+        for n in range(start, end):
+            yield _POSTING.unpack_from(self._buf, self._postings_off + n * _POSTING.size)
+
+    def query_domain(self, domain):
+        domain = domain.strip().lower().rstrip('.')
+        if not domain: return []
+        matches = set()
+        # 依次查找域名自身及其各级父域
+        suffix, pos = domain, 0
+        while True:
+            raw = suffix.encode('utf-8')
+            i = bisect.bisect_left(self._keys, raw)
+            if i < len(self._keys) and self._keys[i] == raw:
+                for rid, kind in self._postings(i):
+                    if kind == KIND_EXACT and pos: continue
+                    matches.add(Match(self.rulesets[rid], KIND_PREFIX[kind] + suffix))
+            pos = domain.find('.', pos) + 1
+            if not pos: break
+            suffix = domain[pos:]
+        for rid, rule, regex in self._wildcards:
+            if regex.match(domain):
+                matches.add(Match(self.rulesets[rid], rule))
+        return sorted(matches)
+
+    def query_ip(self, ip):
+        address = ipaddress.ip_address(ip)
+        value = int(address)
+        matches = set()
+        for prefixlen, table in self._networks[address.version]:
+            host_bits = address.max_prefixlen - prefixlen
+            raw = (value >> host_bits << host_bits).to_bytes(address.max_prefixlen // 8, "big")
+            i = bisect.bisect_left(table, raw)
+            while i < len(table) and table[i] == raw:
+                network = ipaddress.ip_network(f"{ipaddress.ip_address(raw)}/{prefixlen}")
+                matches.add(Match(self.rulesets[table.ruleset_id(i)], str(network)))
+                i += 1
+        return sorted(matches)
+
+    def query(self, target):
+        """target 为 IP 地址时查 CIDR 索引，否则按域名查询。"""
+        try:
+            ipaddress.ip_address(target.strip())
+        except ValueError:
+            return self.query_domain(target)
+        return self.query_ip(target.strip())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="规则集本地查询索引")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="从 Mihomo 文本规则集生成索引")
+    build.add_argument("--txt-dir", default="output/mihomo")
+    build.add_argument("--index", default=INDEX_PATH)
+    query = sub.add_parser("query", help="查询命中域名 / IP 的规则集与规则")
+    query.add_argument("targets", nargs="+")
+    query.add_argument("--index", default=INDEX_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        build_index(args.txt_dir, args.index)
+        return 0
+    found = False
+    with RuleIndex(args.index) as index:
+        for target in args.targets:
+            matches = index.query(target)
+            found = found or bool(matches)
+            print(f"🔎 {target}: {len(matches)} 条命中")
+            for match in matches:
+                print(f"  {match.ruleset:<30} {match.rule}")
+    return 0 if found else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
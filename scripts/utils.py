@@ -7,18 +7,71 @@ import shutil
 import tempfile
 import time
 import re
+import json
+import heapq
 import atexit
+import hashlib
+import marshal
+import queue
+import random
+import zlib
+import threading
+from collections import Counter, namedtuple
 import ipaddress
+import urllib.parse
 import urllib.request
 import subprocess
-from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import executors
+import providers
+import public_suffix
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 WORK_DIR = None
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(SCRIPT_DIR)
 EXCLUDE_FILE = os.path.join(SCRIPT_DIR, "exclude-keyword.txt")
+# 跨构建持久化的缓存目录 (CI 中由 actions/cache 恢复)
+CACHE_DIR = os.environ.get("WUIILED_CACHE_DIR", os.path.join(REPO_ROOT, ".cache"))
 os.environ["LC_ALL"] = "C"
 
+# 规则集合在阶段之间传递时携带的有序/去重不变量：
+# 各阶段函数返回其输出满足的不变量，下游据此跳过已经做过的排序与去重
+INV_SORTED = "sorted"
+INV_UNIQUE = "unique"
+INV_PRUNED = "pruned"
+SORTED_UNIQUE = frozenset({INV_SORTED, INV_UNIQUE})
+NO_INVARIANTS = frozenset()
+
+# 已写入 output/ 的最终规则文件的不变量登记表 (path -> invariants)，供阶段 2 的转换器查询
+_OUTPUT_INVARIANTS = {}
+
+# 预编译白名单索引：domains 为白名单域名本身，parents 为其所有父域 (Option A 检测用)
+AllowIndex = namedtuple("AllowIndex", ["domains", "parents"])
+_ALLOW_INDEX_FORMAT = 1
+_ALLOW_INDEX_KEEP = 4
+_ALLOW_INDEXES = {}
+_ALLOW_INDEX_LOCK = threading.Lock()
+
+# 下载时分块读取的大小 (字节)，压缩响应边读边解压
+_DOWNLOAD_CHUNK = 64 * 1024
+# 单个来源的总截止时间、对冲请求触发阈值与退避基数 (秒)
+DOWNLOAD_DEADLINE = 90
+DOWNLOAD_HEDGE_AFTER = 5.0
+DOWNLOAD_BACKOFF_BASE = 1.0
+# 由本地工作区文件满足的来源计数 (本仓库的规则文件无需经网络下载)
+_LOCAL_HITS = [0]
+_LOCAL_HITS_LOCK = threading.Lock()
+
 # Security: explicit SSL context to ensure certificate verification is always enabled
 _SSL_CONTEXT = ssl.create_default_context()
 
@@ -46,190 +99,957 @@ def check_mihomo():
         sys.exit(1)
     return has_mihomo
 
-def download_file(url, timeout=20, retries=3):
+class _DeflateDecoder:
+    """HTTP deflate 既可能是 zlib 封装也可能是裸 deflate 流，首块解压失败时回退为裸流。"""
+
+    def __init__(self):
+        self._obj = zlib.decompressobj()
+        self._first = True
+
+    def decompress(self, chunk):
+        if self._first:
+            self._first = False
+            try:
+                return self._obj.decompress(chunk)
+            except zlib.error:
+                self._obj = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._obj.decompress(chunk)
+
+    def flush(self):
+        return self._obj.flush()
+
+class _BrotliDecoder:
+    def __init__(self):
+        self._obj = brotli.Decompressor()
+
+    def decompress(self, chunk):
+        return self._obj.process(chunk)
+
+    def flush(self):
+        return b""
+
+def _accept_encoding():
+    encodings = ["gzip", "deflate"]
+    if brotli is not None: encodings.append("br")
+    if zstandard is not None: encodings.append("zstd")
+    return ", ".join(encodings)
+
+def _content_decoder(encoding):
+    """按 Content-Encoding 返回流式解码器 (decompress / flush)，identity 返回 None。"""
+    encoding = (encoding or "identity").strip().lower()
+    if encoding in ("", "identity"):
+        return None
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        return _DeflateDecoder()
+    if encoding == "br" and brotli is not None:
+        return _BrotliDecoder()
+    if encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompressobj()
+    raise ValueError(f"不支持的 Content-Encoding: {encoding}")
+
+def _read_decoded(response, attempt=None):
+    """分块读取响应并流式解压，返回 (解码后字节, 线上传输字节数)。attempt 被取消时中止读取。"""
+    decoder = _content_decoder(response.headers.get("Content-Encoding"))
+    chunks = []
+    wire = 0
+    while True:
+        if attempt is not None: attempt.check()
+        chunk = response.read(_DOWNLOAD_CHUNK)
+        if not chunk: break
+        wire += len(chunk)
+        chunks.append(decoder.decompress(chunk) if decoder else chunk)
+    if decoder:
+        chunks.append(decoder.flush())
+    return b"".join(chunks), wire
+
+def resolve_local_source(url):
+    """本仓库内的来源 (providers.LOCAL_SOURCE_PREFIXES) 映射到工作区中的文件路径，文件不存在时返回 None。"""
+    for prefix in providers.LOCAL_SOURCE_PREFIXES:
+        if url.startswith(prefix):
+            rel_path = urllib.parse.unquote(url[len(prefix):].split('?')[0])
+            path = os.path.normpath(os.path.join(REPO_ROOT, rel_path))
+            # 仅允许解析到仓库目录之内
+            if path.startswith(REPO_ROOT + os.sep) and os.path.isfile(path):
+                return path
+    return None
+
+def local_source_hits():
+    """本次构建中由本地文件直接满足、省去网络请求的来源次数。"""
+    with _LOCAL_HITS_LOCK:
+        return _LOCAL_HITS[0]
+
+def mirror_urls(url):
+    """按 providers.DOWNLOAD_MIRRORS 的改写规则返回 url 的镜像地址列表 (无匹配时为空)。"""
+    for pattern, templates in providers.DOWNLOAD_MIRRORS:
+        m = re.match(pattern, url)
+        if m:
+            return [t.format(*m.groups()) for t in templates]
+    return []
+
+class _FetchAttempt:
+    """一次对冲请求的取消句柄：落选后关闭其响应连接，尚未开始或仍在读取的请求随即中止。"""
+
+    def __init__(self, url):
+        self.url = url
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._response = None
+
+    def check(self):
+        with self._lock:
+            if self._cancelled:
+                raise ConnectionAbortedError(f"对冲请求已取消: {self.url}")
+
+    def attach(self, response):
+        with self._lock:
+            self._response = response
+        self.check()
+
+    def cancel(self):
+        with self._lock:
+            self._cancelled = True
+            response, self._response = self._response, None
+        if response is not None:
+            try:
+                response.close()
+            except Exception:
+                pass
+
+def _fetch_once(url, timeout, attempt=None):
+    if attempt is not None: attempt.check()
     ua = "Mozilla/5.0 (compatible; MihomoRuleConverter/1.0)"
-    req = urllib.request.Request(url, headers={'User-Agent': ua})
+    req = urllib.request.Request(url, headers={'User-Agent': ua, 'Accept-Encoding': _accept_encoding()})
+    with urllib.request.urlopen(req, timeout=timeout, context=_SSL_CONTEXT) as response:
+        if attempt is not None: attempt.attach(response)
+        data, wire = _read_decoded(response, attempt)
+        # 读取途中被关闭的响应可能表现为提前结束，不能当作完整内容
+        if attempt is not None: attempt.check()
+    ratio = f"{wire / len(data):.0%}" if data else "-"
+    print(f"📦 传输: {wire / 1024:,.1f}KB | 解码: {len(data) / 1024:,.1f}KB ({ratio}) | {url}")
+    return data.decode('utf-8', errors='ignore')
+
+def _hedged_fetch(candidates, timeout, hedge_after, deadline_at):
+    """
+    一轮对冲请求：先请求首个地址，超过 hedge_after 秒未返回或请求失败时加发下一个候选地址，
+    返回最先成功的结果。请求提交到有界的 fetch 池 (调用方本身运行在 io 池中，不能向 io 池提交并等待)，
+    本轮结束时取消其余请求并关闭其响应连接。
+    """
+    pool = executors.fetch_pool()
+    results = queue.Queue()
+    attempts = []
+    pending = 0
+    errors = []
+
+    def launch():
+        nonlocal pending
+        attempt = _FetchAttempt(candidates[len(attempts)])
+        attempts.append(attempt)
+        future = pool.submit(_fetch_once, attempt.url, timeout, attempt)
+        future.add_done_callback(lambda f: results.put((attempt, f)))
+        pending += 1
+
+    try:
+        launch()
+        while pending:
+            remaining = deadline_at - time.monotonic()
+            if remaining <= 0:
+                break
+            can_hedge = len(attempts) < len(candidates)
+            try:
+                attempt, future = results.get(timeout=min(remaining, hedge_after) if can_hedge else remaining)
+            except queue.Empty:
+                # 当前请求迟迟未返回：向下一个镜像加发对冲请求，先返回者胜出
+                if can_hedge: launch()
+                continue
+            pending -= 1
+            err = future.exception()
+            if err is None:
+                if attempt.url != candidates[0]:
+                    print(f"🔀 镜像响应: {attempt.url}")
+                return future.result()
+            errors.append(f"{attempt.url}: {err}")
+            # 请求失败时不必等待对冲阈值，立即改用下一个镜像
+            if len(attempts) < len(candidates): launch()
+    finally:
+        for attempt in attempts:
+            attempt.cancel()
+    raise TimeoutError("; ".join(errors) if errors else "超过下载截止时间")
+
+def _backoff_delay(attempt):
+    """指数退避叠加随机抖动，避免多个来源在同一时刻集中重试。"""
+    return DOWNLOAD_BACKOFF_BASE * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+def download_file(url, timeout=20, retries=3, mirrors=None, deadline=None, hedge_after=None):
+    """
+    下载文本内容，失败时返回空字符串。
+    - mirrors: 镜像地址列表，默认按 providers.DOWNLOAD_MIRRORS 由 url 推导
+    - deadline: 该来源的总截止时间 (秒)，包含全部重试与退避等待
+    - hedge_after: 当前请求超过该秒数仍未返回时向下一个镜像加发对冲请求
+    """
+    local_path = resolve_local_source(url)
+    if local_path:
+        with _LOCAL_HITS_LOCK:
+            _LOCAL_HITS[0] += 1
+        with open(local_path, 'rb') as f:
+            return f.read().decode('utf-8', errors='ignore')
+    candidates = [url] + (mirror_urls(url) if mirrors is None else list(mirrors))
+    deadline_at = time.monotonic() + (DOWNLOAD_DEADLINE if deadline is None else deadline)
+    hedge_after = DOWNLOAD_HEDGE_AFTER if hedge_after is None else hedge_after
     for attempt in range(retries):
+        remaining = deadline_at - time.monotonic()
         try:
-            with urllib.request.urlopen(req, timeout=timeout, context=_SSL_CONTEXT) as response:
-                return response.read().decode('utf-8', errors='ignore')
+            return _hedged_fetch(candidates, min(timeout, max(remaining, 0.001)), hedge_after, deadline_at)
         except Exception as e:
-            if attempt == retries - 1:
-                print(f"⚠️ 下载失败 (重试 {retries} 次后放弃): {url}\n   错误: {e}")
+            remaining = deadline_at - time.monotonic()
+            if attempt == retries - 1 or remaining <= 0:
+                print(f"⚠️ 下载失败 (重试 {attempt + 1} 次后放弃): {url}\n   错误: {e}")
                 return ""
-            time.sleep(1 * (attempt + 1))
+            time.sleep(min(remaining, _backoff_delay(attempt)))
     return ""
 
-def download_files_parallel(output_file, urls):
-    with ThreadPoolExecutor(max_workers=min(len(urls) + 1, 10)) as executor:
-        futures_map = {executor.submit(download_file, url): url for url in urls}
-        results = []
-        success_count = 0
-        fail_count = 0
-        for future, url in futures_map.items():
-            try:
-                content = future.result()
-                if content.strip():
-                    if not content.endswith('\n'): content += '\n'
-                    results.append(content)
-                    success_count += 1
-                else:
-                    fail_count += 1
-            except Exception as e:
-                print(f"⚠️ 并行下载异常: {url} -> {e}")
+def download_files_parallel(output_file, urls, source_dir=None):
+    """
+    并行下载并按 urls 顺序拼接写入 output_file。
+    指定 source_dir 时另将每个成功的来源单独保存为 source_dir/src_<序号>.txt，
+    返回 [(url, 路径)] 供按来源统计贡献使用。
+    """
+    pool = executors.io_pool()
+    futures_map = {pool.submit(download_file, url): url for url in urls}
+    results = []
+    sources = []
+    success_count = 0
+    fail_count = 0
+    if source_dir: os.makedirs(source_dir, exist_ok=True)
+    for idx, (future, url) in enumerate(futures_map.items()):
+        try:
+            content = future.result()
+            if content.strip():
+                if not content.endswith('\n'): content += '\n'
+                results.append(content)
+                success_count += 1
+                if source_dir:
+                    source_path = os.path.join(source_dir, f"src_{idx}.txt")
+                    with open(source_path, 'w', encoding='utf-8') as f: f.write(content)
+                    sources.append((url, source_path))
+            else:
                 fail_count += 1
+        except Exception as e:
+            print(f"⚠️ 并行下载异常: {url} -> {e}")
+            fail_count += 1
     if urls:
         print(f"📥 下载完成: {success_count} 成功, {fail_count} 失败 (共 {len(urls)} 源)")
     with open(output_file, 'w', encoding='utf-8') as f:
         if results: f.write("".join(results))
+    return sources
+
+_COMMENT_TAIL_RE = re.compile(r'[\$#].*')
+_HOSTS_PREFIX_RE = re.compile(r'^(0\.0\.0\.0|127\.0\.0\.1)\s+')
+_RULE_TYPE_PREFIX_RE = re.compile(r'^(domain-keyword|domain-suffix|domain),')
+_WILDCARD_PREFIX_RE = re.compile(r'^(\+\.|\.)')
+_DOMAIN_START_RE = re.compile(r'^[a-z0-9_]')
+_IPV4_RE = re.compile(r'^[0-9]+\.[0-9]+\.[0-9]+\.[0-9]+$')
+# 已是标准小写域名的行 (绝大多数域名集源) 可跳过 normalize_domain_line 的整条正则链，结果完全一致
+_PLAIN_DOMAIN_RE = re.compile(r'[a-z0-9_][a-z0-9_-]*(?:\.[a-z0-9_-]+)+')
 
 def normalize_domain_line(line):
     line = line.strip()
-    line = re.sub(r'[\$#].*', '', line)
-    line = re.sub(r'^(0\.0\.0\.0|127\.0\.0\.1)\s+', '', line)
+    line = _COMMENT_TAIL_RE.sub('', line)
+    line = _HOSTS_PREFIX_RE.sub('', line)
     if line.startswith("!"): return None
     if line.startswith("@@"): line = line[2:]
     line = line.replace("||", "").replace("^", "").replace("|", "")
-    line = re.sub(r'^(domain-keyword|domain-suffix|domain),', '', line)
+    line = _RULE_TYPE_PREFIX_RE.sub('', line)
     if ',' in line: line = line.split(',')[0]
-    line = re.sub(r'^(\+\.|\.)', '', line)
+    line = _WILDCARD_PREFIX_RE.sub('', line)
     line = line.rstrip('.')
-    if '.' not in line or '*' in line or not re.match(r'^[a-z0-9_]', line) or re.match(r'^[0-9]+\.[0-9]+\.[0-9]+\.[0-9]+$', line) or '/' in line: return None
+    if '.' not in line or '*' in line or not _DOMAIN_START_RE.match(line) or _IPV4_RE.match(line) or '/' in line: return None
     return line
 
-def process_normalize_domain(input_file, output_file, skip_allow_rules=False):
+# ================= 按来源格式解析 =================
+# 各格式解析器只处理本格式的典型行 (结果与 normalize_domain_line 完全一致)，
+# 其余行交回 normalize_domain_line，因此格式声明或探测有误只影响速度、不影响结果。
+# 输入行须已 strip 且小写、非空。
+SOURCE_FORMATS = ("domainset", "hosts", "adguard", "clash", "yaml")
+_HOSTS_ADDRESSES = ("0.0.0.0", "127.0.0.1")
+_CLASH_DOMAIN_TYPES = ("domain", "domain-suffix", "domain-keyword")
+_RULE_TYPE_NAME_RE = re.compile(r'[a-z0-9-]+')
+_SNIFF_LINES = 200
+
+def _is_plain_domain(line):
+    return _PLAIN_DOMAIN_RE.fullmatch(line) is not None and not _IPV4_RE.match(line)
+
+def _parse_domainset_line(line):
+    """域名集：example.com / .example.com / +.example.com。"""
+    if _is_plain_domain(line): return line
+    if line[0] in '#!': return None
+    if line.startswith('+.'):
+        if _is_plain_domain(line[2:]): return line[2:]
+    elif line[0] == '.' and _is_plain_domain(line[1:]):
+        return line[1:]
+    return normalize_domain_line(line)
+
+def _parse_hosts_line(line):
+    """hosts：0.0.0.0 example.com / 127.0.0.1 example.com。"""
+    if line[0] in '#!': return None
+    parts = line.split()
+    if len(parts) == 2 and parts[0] in _HOSTS_ADDRESSES and _is_plain_domain(parts[1]): return parts[1]
+    return _parse_domainset_line(line)
+
+def _parse_adguard_line(line):
+    """AdGuard：||example.com^ / @@||example.com^，带修饰符 ($...) 的行走通用路径。"""
+    if line[0] in '#!': return None
+    if line.endswith('^'):
+        if line.startswith('||'):
+            if _is_plain_domain(line[2:-1]): return line[2:-1]
+        elif line.startswith('@@||') and _is_plain_domain(line[4:-1]):
+            return line[4:-1]
+    return _parse_domainset_line(line)
+
+def _parse_clash_line(line):
+    """Clash 经典规则：DOMAIN,x / DOMAIN-SUFFIX,x / DOMAIN-KEYWORD,x[,策略]，其余规则类型 (IP-CIDR 等) 直接丢弃。"""
+    if line[0] in '#!': return None
+    rule_type, sep, rest = line.partition(',')
+    if sep:
+        if rule_type in _CLASH_DOMAIN_TYPES:
+            value = rest.split(',', 1)[0]
+            if _is_plain_domain(value): return value
+        elif _RULE_TYPE_NAME_RE.fullmatch(rule_type):
+            # 通用路径对非域名规则类型取逗号前字段，不含 "." 必为 None
+            return None
+        return normalize_domain_line(line)
+    return _parse_domainset_line(line)
+
+_FORMAT_PARSERS = {
+    "domainset": _parse_domainset_line,
+    "hosts": _parse_hosts_line,
+    "adguard": _parse_adguard_line,
+    "clash": _parse_clash_line,
+    # YAML 列表项 ("- ...") 在通用路径中本就被丢弃，没有可安全走捷径的行
+    "yaml": normalize_domain_line,
+}
+
+def _sniff_line_format(line):
+    if line.startswith(_HOSTS_ADDRESSES): return "hosts"
+    if line.startswith(('||', '@@')): return "adguard"
+    if line.startswith('- ') or line.endswith(':'): return "yaml"
+    rule_type, sep, _ = line.partition(',')
+    if sep and _RULE_TYPE_NAME_RE.fullmatch(rule_type): return "clash"
+    return "domainset"
+
+def detect_source_format(text):
+    """按开头若干条非注释行的多数格式探测来源格式 (SOURCE_FORMATS 之一)，无法判断时视为域名集。"""
+    counts = Counter()
+    for line in text.split('\n', _SNIFF_LINES * 4)[:_SNIFF_LINES * 4]:
+        line = line.strip().lower()
+        if not line or line[0] in '#!': continue
+        counts[_sniff_line_format(line)] += 1
+        if sum(counts.values()) >= _SNIFF_LINES: break
+    return counts.most_common(1)[0][0] if counts else "domainset"
+
+def parse_fakeip_line(line):
+    """Fake-IP 过滤列表的通用清洗 (兼容 YAML 列表项与引号)，返回条目或 None。"""
+    line = line.lower()
+    if re.match(r'^\s*(dns:|fake-ip-filter:)', line): return None
+    line = re.sub(r'^\s*-\s*', '', line).replace('"', '').replace("'", '').replace('\\', '').strip()
+    return line if line and not line.startswith('#') else None
+
+def _parse_fakeip_fast(line, fmt):
+    # YAML 典型行 "- '+.lan'" 直接切片；列表格式典型行无需任何替换
+    stripped = line.strip()
+    if fmt == "yaml" and stripped.startswith('- '):
+        value = stripped[2:].strip()
+        if len(value) > 2 and value[0] == value[-1] and value[0] in '"\'':
+            value = value[1:-1]
+        stripped = value
+    if not stripped or stripped[0] in '#-' or stripped.startswith(('dns:', 'fake-ip-filter:')) \
+            or any(c in stripped for c in '"\'\\') or stripped != stripped.strip():
+        return parse_fakeip_line(line)
+    return stripped
+
+def parse_fakeip_text(text, fmt=None):
+    """解析整个 Fake-IP 过滤列表 (须已小写)，返回条目集合。fmt 为 None 时自动探测。"""
+    fmt = fmt or detect_source_format(text)
+    entries = set()
+    for line in text.split('\n'):
+        if not line.strip(): continue
+        entry = _parse_fakeip_fast(line, fmt)
+        if entry: entries.add(entry)
+    return entries
+
+def read_text_bulk(path, lower=False):
+    """
+    以二进制整块读取并一次性解码，替代逐行的文本模式解码与 strip().lower()。
+    纯 ASCII 内容走 bytes.lower + ASCII 解码的快速路径；含非 ASCII 字节时按 UTF-8 解码后
+    再整体 str.lower，结果与逐行处理一致。换行统一为 \\n (与文本模式的通用换行等价)。
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if b'\r' in data:
+        data = data.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+    if data.isascii():
+        return (data.lower() if lower else data).decode('ascii')
+    text = data.decode('utf-8')
+    return text.lower() if lower else text
+
+def merge_sorted_unique(*runs):
+    """线性归并若干个已排序的序列，并去除相邻重复项。"""
+    last = None
+    for item in heapq.merge(*runs):
+        if item != last:
+            yield item
+            last = item
+
+def merge_sorted_files(paths, output_file):
+    """将若干有序去重的规则文件线性归并为一个有序去重文件 (返回 SORTED_UNIQUE)。"""
+    runs = [read_text_bulk(path).splitlines() for path in paths if os.path.exists(path)]
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for line in merge_sorted_unique(*runs):
+            if line: f.write(line + '\n')
+    return SORTED_UNIQUE
+
+def get_output_invariants(path):
+    return _OUTPUT_INVARIANTS.get(os.path.abspath(path), NO_INVARIANTS)
+
+def set_output_invariants(path, invariants):
+    _OUTPUT_INVARIANTS[os.path.abspath(path)] = frozenset(invariants)
+
+def prune_subsumed(lines):
+    """
+    跨类型覆盖裁剪：移除被同一规则集中更宽的 +. / . 后缀规则覆盖的精确、后缀与通配条目，并去除重复行。
+    语义取各后端的公共子集：+.S 覆盖 S 及其全部子域，.S 仅覆盖 S 的严格子域；
+    通配条目按最后一个 * 之后的固定尾部判定 (尾部须以 . 开头)。
+    IP/CIDR 与注释行原样保留，输出保持输入顺序 (有序/去重不变量不受影响)。
+    """
+    plus, dot = set(), set()
+    for line in lines:
+        if '*' in line: continue
+        if line.startswith('+.'): plus.add(line[2:])
+        elif line.startswith('.'): dot.add(line[1:])
+
+    def parent_covered(domain):
+        pos = domain.find('.')
+        while pos != -1:
+            parent = domain[pos + 1:]
+            if parent in plus or parent in dot: return True
+            pos = domain.find('.', pos + 1)
+        return False
+
+    result = []
+    seen = set()
+    for line in lines:
+        if line in seen: continue
+        seen.add(line)
+        # 注释、IP 与 CIDR (以数字结尾或含冒号) 不参与裁剪
+        if not line or line.startswith('#') or ':' in line or line[-1].isdigit():
+            result.append(line)
+            continue
+        if '*' in line:
+            tail = line[line.rfind('*') + 1:]
+            # 通配条目只能匹配以固定尾部结尾的域名，即 tail[1:] 的严格子域
+            covered = tail.startswith('.') and len(tail) > 1 and (
+                tail[1:] in plus or tail[1:] in dot or parent_covered(tail[1:]))
+        elif line.startswith('+.'):
+            covered = parent_covered(line[2:])
+        elif line.startswith('.'):
+            covered = line[1:] in plus or parent_covered(line[1:])
+        else:
+            covered = line in plus or parent_covered(line)
+        if not covered:
+            result.append(line)
+    return result
+
+# 各前缀形式的最少附加标签数：+.S 含 S 自身，.S 至少多一级
+_TAIL_MIN_LABELS = {None: 0, '+': 0, '.': 1}
+
+def _wildcard_pattern(line):
+    """
+    将 Mihomo 域名条目拆为 (反转的固定标签元组, 前缀类型)，前缀类型为 None / '+' / '.'。
+    标签 * 匹配恰好一级；含部分通配的标签 (如 ntp*) 在各后端语义不一，返回 None 不参与覆盖判断。
+    """
+    tail = None
+    if line.startswith('+.'): body, tail = line[2:], '+'
+    elif line.startswith('.'): body, tail = line[1:], '.'
+    else: body = line
+    labels = body.split('.')
+    for label in labels:
+        if not label or ('*' in label and label != '*'): return None
+    return tuple(reversed(labels)), tail
+
+def _pattern_covers(p, q):
+    """模式 p 匹配的域名集合是否包含模式 q 匹配的全部域名。"""
+    p_labels, p_tail = p
+    q_labels, q_tail = q
+    if p_tail is None:
+        if q_tail is not None or len(q_labels) != len(p_labels): return False
+    elif len(q_labels) + _TAIL_MIN_LABELS[q_tail] < len(p_labels) + _TAIL_MIN_LABELS[p_tail]:
+        return False
+    for i, label in enumerate(p_labels):
+        if label == '*': continue
+        # q 在该位置为 * 或已进入其前缀部分 (任意标签) 时，字面标签无法覆盖
+        if i >= len(q_labels) or q_labels[i] != label: return False
+    return True
+
+def _is_portable_pattern(labels):
+    # 仅最左一级为 * 的模式在 SmartDNS (*.) 与 sing-box (正则) 中均被等价或更宽地表达
+    return '*' not in labels[:-1]
+
+def prune_wildcard_subsumed(lines):
+    """
+    按 Mihomo 通配语义裁剪：* 匹配恰好一级，+.S 匹配 S 及其子域，.S 仅匹配严格子域，
+    移除被同一列表中其它 (通配或后缀) 模式完全覆盖的条目，语义等价的条目只保留最短的一条。
+    中间级含 * 的模式 (如 time.*.com) 其它后端无法表达，只用于裁剪同样不可移植的条目。
+    IP/CIDR、注释与含部分通配标签的行原样保留，输出保持输入顺序。
+    """
+    patterns = {}
+    for line in lines:
+        if not line or line.startswith('#') or ':' in line or line[-1].isdigit(): continue
+        pattern = _wildcard_pattern(line)
+        if pattern is not None: patterns[line] = pattern
+
+    # 反转标签前缀树：节点为 (子节点字典, 以该节点结尾的条目列表)
+    root = ({}, [])
+    for line, (labels, _) in patterns.items():
+        node = root
+        for label in labels:
+            node = node[0].setdefault(label, ({}, []))
+        node[1].append(line)
+
+    def candidates(labels, tail):
+        # 沿 q 的字面标签与 * 分支下探；越过 q 的固定部分后只有带前缀的 q 还能被 * 继续匹配
+        stack = [(root, 0)]
+        while stack:
+            node, i = stack.pop()
+            yield from node[1]
+            children = node[0]
+            if i < len(labels):
+                if labels[i] != '*' and labels[i] in children: stack.append((children[labels[i]], i + 1))
+                if '*' in children: stack.append((children['*'], i + 1))
+            elif tail is not None and '*' in children:
+                stack.append((children['*'], i + 1))
+
+    def rank(line):
+        return len(line), line
+
+    removed = set()
+    for line, q in patterns.items():
+        q_portable = _is_portable_pattern(q[0])
+        for other in candidates(*q):
+            if other == line: continue
+            p = patterns[other]
+            if not _pattern_covers(p, q): continue
+            if not _is_portable_pattern(p[0]) and q_portable: continue
+            # 互相覆盖即语义等价 (如 .lan 与 +.*.lan)，保留排序靠前的一条
+            if _pattern_covers(q, p) and rank(line) < rank(other): continue
+            removed.add(line)
+            break
+    return [line for line in lines if line not in removed]
+
+def process_normalize_domain(input_file, output_file, skip_allow_rules=False, fmt=None):
+    """
+    清洗为纯域名，输出有序且去重 (返回 SORTED_UNIQUE)。
+    fmt 为来源格式 (SOURCE_FORMATS 之一)，为 None 时按文件开头探测。
+    """
     if not os.path.exists(input_file):
         with open(output_file, 'w', encoding='utf-8') as f:
             pass
-        return
+        return SORTED_UNIQUE
+    text = read_text_bulk(input_file, lower=True)
+    parse = _FORMAT_PARSERS[fmt or detect_source_format(text)]
     domains = set()
-    with open(input_file, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip().lower()
-            if not line: continue
-            if skip_allow_rules and line.startswith("@@"): continue
-            res = normalize_domain_line(line)
-            if res: domains.add(res)
+    for line in text.split('\n'):
+        line = line.strip()
+        if not line: continue
+        if skip_allow_rules and line.startswith("@@"): continue
+        res = parse(line)
+        if res: domains.add(res)
     with open(output_file, 'w', encoding='utf-8') as f:
         for d in sorted(domains): f.write(d + '\n')
+    return SORTED_UNIQUE
 
-def apply_keyword_filter(input_file, output_file):
+def apply_keyword_filter(input_file, output_file, invariants=NO_INVARIANTS):
+    """按关键字剔除行。仅删除不重排，输入的不变量原样保留并返回。"""
     keywords = []
     if os.path.exists(EXCLUDE_FILE) and os.path.getsize(EXCLUDE_FILE) > 0:
         with open(EXCLUDE_FILE, 'r', encoding='utf-8') as kf:
             keywords = [k.strip().lower() for k in kf if k.strip() and not k.strip().startswith("#")]
     if not keywords:
         shutil.copyfile(input_file, output_file)
-        return
+        return invariants
     with open(input_file, 'r', encoding='utf-8') as infile, open(output_file, 'w', encoding='utf-8') as outfile:
         for line in infile:
             if not any(kw in line.lower() for kw in keywords):
                 outfile.write(line)
+    return invariants
 
-def optimize_smart_self(input_file, output_file):
+def optimize_smart_self(input_file, output_file, invariants=NO_INVARIANTS):
+    """
+    前缀树去重：移除被 +. / . 通配父域覆盖的条目。
+    输入已去重时改用哈希查父域，无需按反转标签排序，输出保持输入顺序并继承其不变量；
+    否则按反转标签排序扫描，输出去重但不保证字典序。
+    """
     if not os.path.exists(input_file) or os.path.getsize(input_file) == 0:
         with open(output_file, 'w', encoding='utf-8') as f:
             pass
-        return
-    with open(input_file, 'r', encoding='utf-8') as f:
-        lines = f.read().splitlines()
+        return SORTED_UNIQUE
+    lines = read_text_bulk(input_file).splitlines()
+    if INV_UNIQUE in invariants:
+        result_lines = _optimize_unique_lines(lines)
+        result_invariants = invariants
+    else:
+        result_lines = _optimize_sorted_scan(lines)
+        result_invariants = frozenset({INV_UNIQUE})
+    with open(output_file, 'w', encoding='utf-8') as f:
+        if result_lines:
+            f.write('\n'.join(result_lines) + '\n')
+    return result_invariants
+
+def _split_wildcard(line):
+    if line.startswith("+."): return line[2:], True
+    if line.startswith("."): return line[1:], True
+    return line, False
+
+def reversed_labels(domain):
+    """
+    域名按标签反转后的元组 (a.example.com -> ('com', 'example', 'a'))，仅用于 _optimize_sorted_scan 的排序键。
+    排序需要同时持有全部条目的标签元组，标签经 sys.intern 驻留后 com / cn / net 等高频标签在同一进程内只保留一份。
+    已去重输入走 _optimize_unique_lines 与白名单过滤，二者只按字符串切片查哈希表、不持有标签，不做驻留。
+    各规则集的阶段在 spawn 的 CPU 进程中执行，每个进程有独立的驻留表，跨规则集 (跨进程) 不共享。
+    """
+    return tuple(map(sys.intern, reversed(domain.split("."))))
+
+def _optimize_sorted_scan(lines):
     data = []
-    for line in lines:
+    for idx, line in enumerate(lines):
         line = line.strip()
         if not line or line.startswith("#"): continue
-        clean = line
-        is_wildcard = False
-        if clean.startswith("+."): clean, is_wildcard = clean[2:], True
-        elif clean.startswith("."): clean, is_wildcard = clean[1:], True
-        parts = clean.split(".")
-        parts.reverse() 
-        if parts: data.append({'parts': parts, 'is_wildcard': is_wildcard, 'original': line})
-    data.sort(key=lambda x: (x['parts'], not x['is_wildcard']))
+        clean, is_wildcard = _split_wildcard(line)
+        # 直接按元组自然序排序：同一域名下通配条目在前，输入序号保证与稳定排序一致
+        data.append((reversed_labels(clean), not is_wildcard, idx, line))
+    data.sort()
     result_lines = []
     last_root = None
-    for item in data:
-        curr, is_covered = item['parts'], False
+    last_original = None
+    for curr, is_exact, _, original in data:
+        is_covered = False
         if last_root is not None and len(curr) >= len(last_root) and curr[:len(last_root)] == last_root: is_covered = True
+        # 完全相同的行在排序后相邻，只保留第一条
+        if not is_covered and original != last_original:
+            result_lines.append(original)
+            last_original = original
+            last_root = None if is_exact else curr
+    return result_lines
+
+def _optimize_unique_lines(lines):
+    entries = []
+    roots = set()
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"): continue
+        clean, is_wildcard = _split_wildcard(line)
+        entries.append((line, clean, is_wildcard))
+        if is_wildcard: roots.add(clean)
+    result_lines = []
+    seen_roots = set()
+    for line, clean, is_wildcard in entries:
+        if is_wildcard:
+            # +.a.com 与 .a.com 等价，保留先出现的一条
+            if clean in seen_roots: continue
+            seen_roots.add(clean)
+        elif clean in roots:
+            continue
+        is_covered = False
+        idx = clean.find('.')
+        while idx != -1:
+            if clean[idx + 1:] in roots:
+                is_covered = True
+                break
+            idx = clean.find('.', idx + 1)
         if not is_covered:
-            result_lines.append(item['original'])
-            last_root = curr if item['is_wildcard'] else None
-    with open(output_file, 'w', encoding='utf-8') as f:
-        if result_lines:
-            f.write('\n'.join(result_lines) + '\n')
+            result_lines.append(line)
+    return result_lines
 
-def apply_advanced_whitelist_filter(block_in, allow_in, final_out):
+def _compile_allow_index(lines):
     allow_set = set()
     allow_parents_set = set()
-    
+    for line in lines:
+        line = line.strip().lower()
+        if not line or line.startswith('#'): continue
+        if line.startswith("+."): line = line[2:]
+        elif line.startswith("."): line = line[1:]
+        allow_set.add(line)
+        
+        # 构建白名单域名的所有父域名集合，用于 Option A 的子域防误杀检测
+        parts = line.split('.')
+        for i in range(1, len(parts)):
+            allow_parents_set.add(".".join(parts[i:]))
+    return AllowIndex(frozenset(allow_set), frozenset(allow_parents_set))
+
+def _allow_index_cache_path(digest):
+    # marshal 格式随 Python 版本变化，缓存文件名中带上解释器版本
+    name = f"{digest}-v{_ALLOW_INDEX_FORMAT}-py{sys.version_info[0]}{sys.version_info[1]}.marshal"
+    return os.path.join(CACHE_DIR, "allow-index", name)
+
+def _load_cached_allow_index(digest):
+    path = _allow_index_cache_path(digest)
+    try:
+        with open(path, 'rb') as f:
+            domains, parents = marshal.load(f)
+        os.utime(path)
+        return AllowIndex(domains, parents)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+
+def _save_allow_index(digest, index):
+    path = _allow_index_cache_path(digest)
+    cache_dir = os.path.dirname(path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            marshal.dump((index.domains, index.parents), f)
+        os.replace(tmp_path, path)
+        # 仅保留最近使用的若干份，避免缓存目录无限增长
+        entries = sorted((os.path.join(cache_dir, n) for n in os.listdir(cache_dir) if n.endswith(".marshal")), key=os.path.getmtime, reverse=True)
+        for old in entries[_ALLOW_INDEX_KEEP:]:
+            os.remove(old)
+    except OSError as e:
+        print(f"⚠️ 白名单索引缓存写入失败: {e}")
+
+def load_allow_index(allow_in):
+    """
+    按白名单文件内容的 sha256 获取不可变的白名单索引：
+    进程内缓存 → 磁盘缓存 (marshal 反序列化) → 从文本重新构建并写回磁盘。
+    """
+    text = ""
     if os.path.exists(allow_in):
         with open(allow_in, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip().lower()
-                if not line or line.startswith('#'): continue
-                if line.startswith("+."): line = line[2:]
-                elif line.startswith("."): line = line[1:]
-                allow_set.add(line)
-                
-                # 构建白名单域名的所有父域名集合，用于 Option A 的子域防误杀检测
-                parts = line.split('.')
-                for i in range(1, len(parts)):
-                    parent = ".".join(parts[i:])
-                    allow_parents_set.add(parent)
-                    
+            text = f.read()
+    digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    with _ALLOW_INDEX_LOCK:
+        index = _ALLOW_INDEXES.get(digest)
+        if index is None:
+            index = _load_cached_allow_index(digest)
+            if index is None:
+                index = _compile_allow_index(text.split('\n'))
+                _save_allow_index(digest, index)
+            _ALLOW_INDEXES[digest] = index
+    return index
+
+def prepare_allow_index(allow_in):
+    """预编译白名单索引并落盘，返回条目数 (供 CPU 进程池调用，避免回传整个索引)。"""
+    return len(load_allow_index(allow_in).domains)
+
+def is_allowlisted(pure, allow_set, allow_parents_set):
+    """拦截域名 (已去掉 +. / . 前缀) 是否应被白名单放行。"""
+    # 1. 检查当前拦截域名（或其父域名）是否在白名单中
+    if pure in allow_set: return True
+    idx = pure.find('.')
+    while idx != -1:
+        if pure[idx + 1:] in allow_set: return True
+        idx = pure.find('.', idx + 1)
+    # 2. 检查是否有任何白名单域名属于当前拦截域名的子域。
+    # 如果有，为了避免拦截父域时误杀白名单子域，当前拦截域也必须放行（Option A 策略）
+    return pure in allow_parents_set
+
+def apply_advanced_whitelist_filter(block_in, allow_in, final_out, invariants=NO_INVARIANTS):
+    """白名单过滤，仅删除不重排，返回拦截列表输入的不变量。"""
+    allow_set, allow_parents_set = load_allow_index(allow_in)
+
     final_lines = []
     if os.path.exists(block_in):
-        with open(block_in, 'r', encoding='utf-8') as f:
-            for line in f:
-                original = line.strip()
-                if not original or original.startswith('#'): continue
-                pure = original.lower()
-                if pure.startswith("+."): pure = pure[2:]
-                elif pure.startswith("."): pure = pure[1:]
-                
-                is_allowed = False
+        for line in read_text_bulk(block_in).split('\n'):
+            original = line.strip()
+            if not original or original.startswith('#'): continue
+            pure = original.lower()
+            if pure.startswith("+."): pure = pure[2:]
+            elif pure.startswith("."): pure = pure[1:]
+            
+            if not is_allowlisted(pure, allow_set, allow_parents_set):
+                final_lines.append(original)
                 
-                # 1. 检查当前拦截域名（或其父域名）是否在白名单中
-                parts = pure.split('.')
-                for i in range(len(parts)):
-                    parent = ".".join(parts[i:])
-                    if parent in allow_set:
-                        is_allowed = True
-                        break
-                        
-                # 2. 检查是否有任何白名单域名属于当前拦截域名的子域。
-                # 如果有，为了避免拦截父域时误杀白名单子域，当前拦截域也必须放行（Option A 策略）
-                if not is_allowed:
-                    if pure in allow_parents_set:
-                        is_allowed = True
-                        
-                if not is_allowed:
-                    final_lines.append(original)
-                    
     with open(final_out, 'w', encoding='utf-8') as f:
         if final_lines:
             f.write('\n'.join(final_lines) + '\n')
+    return invariants
+
+def promote_dense_subdomains(block_in, allow_in, final_out, threshold, apply=True, invariants=NO_INVARIANTS):
+    """
+    密集子域提升：同一可注册域名 (按随仓库附带的公共后缀列表) 下被拦截的不同子域达到 threshold 个，
+    且按 apply_advanced_whitelist_filter 的语义该可注册域名不会被白名单放行时，
+    其下全部条目 (含自身及 . / +. 形式) 合并为一条 +.<可注册域名>。
+    apply 为 False 时只统计候选，输出原样复制。返回 (不变量, 报告字典)。
+    """
+    lines = [line.strip() for line in read_text_bulk(block_in).split('\n')] if os.path.exists(block_in) else []
+    lines = [line for line in lines if line and not line.startswith('#')]
+    psl = public_suffix.default_list()
+    registrable = {}
+    subdomains = {}
+    for line in lines:
+        # 通配与 IP 条目不参与提升
+        if '*' in line or ':' in line or line[-1].isdigit(): continue
+        pure = line[2:] if line.startswith("+.") else line[1:] if line.startswith(".") else line
+        root = psl.registrable_domain(pure)
+        if root is None: continue
+        registrable[line] = root
+        if pure != root: subdomains.setdefault(root, set()).add(pure)
+
+    allow_set, allow_parents_set = load_allow_index(allow_in)
+    promoted, allowlisted = [], []
+    for root, subs in subdomains.items():
+        if len(subs) < threshold: continue
+        entry = {"domain": root, "subdomains": len(subs)}
+        (allowlisted if is_allowlisted(root, allow_set, allow_parents_set) else promoted).append(entry)
+    promoted.sort(key=lambda e: (-e["subdomains"], e["domain"]))
+    allowlisted.sort(key=lambda e: (-e["subdomains"], e["domain"]))
+
+    roots = {e["domain"] for e in promoted}
+    folded = sum(1 for line in lines if registrable.get(line) in roots)
+    if apply and roots:
+        kept = {line for line in lines if registrable.get(line) not in roots}
+        result_lines = sorted(kept | {"+." + root for root in roots})
+        result_invariants = SORTED_UNIQUE
+    else:
+        result_lines = lines
+        result_invariants = invariants
+    with open(final_out, 'w', encoding='utf-8') as f:
+        if result_lines:
+            f.write('\n'.join(result_lines) + '\n')
+    report = {
+        "threshold": threshold,
+        "applied": bool(apply),
+        "rules_before": len(lines),
+        "rules_after": len(result_lines),
+        "saved": folded - len(roots),
+        "promoted": promoted,
+        "allowlisted": allowlisted,
+    }
+    return result_invariants, report
+
+# 精简版规则集的评分方式：sources 为列出该规则的上游来源数，breadth 为覆盖范围 (标签越少越宽)
+PROFILE_SCORES = ("sources", "breadth")
+
+def select_budget_profile(final_in, source_paths, out_path, max_rules=None, max_bytes=None, score="sources", add_prefix=False):
+    """
+    按评分从规则集中选取不超过预算的子集 (精简版规则集)，输出有序去重，返回 (SORTED_UNIQUE, 统计字典)。
+    source_paths 为各来源清洗后的文件 (每行一个域名)；提升得到的 +. 后缀取其下子域的最大来源数。
+    同分时标签少 (覆盖更宽) 者优先，再按字典序，结果可复现。
+    max_bytes 按写出的 Mihomo 文本计 (add_prefix 时每行补 +. 前缀)，不含注释头。
+    """
+    if score not in PROFILE_SCORES:
+        raise ValueError(f"未知的评分方式: {score}")
+    lines = [line.strip() for line in read_text_bulk(final_in).split('\n')] if os.path.exists(final_in) else []
+    lines = [line for line in lines if line and not line.startswith('#')]
+
+    def pure(line):
+        return line[2:] if line.startswith("+.") else line[1:] if line.startswith(".") else line
+
+    counts = Counter()
+    if score == "sources":
+        for path in source_paths:
+            if os.path.exists(path):
+                counts.update(line for line in read_text_bulk(path).split('\n') if line and not line.startswith('#'))
+        roots = {pure(line) for line in lines if pure(line) not in counts}
+        if roots:
+            root_counts = {}
+            for domain, count in counts.items():
+                idx = domain.find('.')
+                while idx != -1:
+                    parent = domain[idx + 1:]
+                    if parent in roots and root_counts.get(parent, 0) < count: root_counts[parent] = count
+                    idx = domain.find('.', idx + 1)
+            counts.update(root_counts)
+
+    def rank(line):
+        labels = pure(line).count('.') + 1
+        primary = counts.get(pure(line), 0) if score == "sources" else -labels
+        return -primary, labels, line
+
+    selected, used_bytes = [], 0
+    for line in sorted(lines, key=rank):
+        size = len(line.encode('utf-8')) + 1 + (2 if add_prefix and not line.startswith("+.") else 0)
+        if max_rules is not None and len(selected) >= max_rules: break
+        if max_bytes is not None and used_bytes + size > max_bytes: break
+        selected.append(line)
+        used_bytes += size
+    with open(out_path, 'w', encoding='utf-8') as f:
+        if selected:
+            f.write('\n'.join(sorted(selected)) + '\n')
+    stats = {"total_rules": len(lines), "rules": len(selected), "bytes": used_bytes}
+    if score == "sources" and selected:
+        stats["min_sources"] = counts.get(pure(selected[-1]), 0)
+    return SORTED_UNIQUE, stats
+
+def content_change_time(key, digest):
+    """
+    返回 key 对应内容最后一次变化的时间：digest 与上次记录一致时沿用记录的时间，否则记为当前时间。
+    状态按 key 分文件保存在 CACHE_DIR/content-state/，不同 key 可在多线程中并发更新。
+    """
+    state_dir = os.path.join(CACHE_DIR, "content-state")
+    path = os.path.join(state_dir, re.sub(r'[^A-Za-z0-9_.-]', '_', key) + ".json")
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get("sha256") == digest:
+            return state["changed"]
+    except (OSError, ValueError, KeyError):
+        pass
+    changed = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    try:
+        os.makedirs(state_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"sha256": digest, "changed": changed}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ 内容状态写入失败: {e}")
+    return changed
 
 def compile_ruleset(cmd, output_name):
-    """执行规则集编译命令，失败时打印警告而非中断流程。"""
+    """执行规则集编译命令，失败时打印警告而非中断流程。编译子进程统一经由 compile 池限流。"""
     try:
-        subprocess.run(cmd, check=True, capture_output=True, text=True)
+        executors.compile_pool().submit(subprocess.run, cmd, check=True, capture_output=True, text=True).result()
     except subprocess.CalledProcessError as e:
         print(f"⚠️ 警告: 编译 {output_name} 发生异常:\n{e.stderr}")
 
-def finalize_output(src, dst_dir, base_name, mode):
+def precedence_pending(base_name):
+    """
+    规则集是否参与 providers.OVERLAP_PRECEDENCE 的优先级裁剪 (精简版除外，其在裁剪之后生成)。
+    这类规则集的最终内容要等 analytics.apply_precedence 之后才确定，由其统一记录内容变化时间。
+    """
+    if base_name in providers.OUTPUT_PROFILES: return False
+    return any(base_name in group for group in providers.OVERLAP_PRECEDENCE)
+
+def finalize_output(src, dst_dir, base_name, mode, invariants=NO_INVARIANTS):
     if not os.path.exists(src) or os.path.getsize(src) == 0: return
-    with open(src, 'r', encoding='utf-8') as f: lines = list(set(f.read().splitlines()))
-    lines.sort()
-    if mode == "add_prefix": lines = ["+." + line if not line.startswith("+.") else line for line in lines]
+    lines = read_text_bulk(src).splitlines()
+    if INV_UNIQUE not in invariants: lines = list(set(lines))
+    if INV_SORTED not in invariants: lines.sort()
+    if mode == "add_prefix":
+        # 已带 +. 的行与补前缀的行各自有序，线性归并即可保持整体有序且去重
+        prefixed = [line for line in lines if line.startswith("+.")]
+        added = ["+." + line for line in lines if not line.startswith("+.")]
+        lines = list(merge_sorted_unique(prefixed, added))
+    # 补前缀后可能出现 +.a.com 与 +.x.a.com 并存，写出前统一裁剪
+    lines = prune_subsumed(lines)
     
     rule_count = len(lines)
     print(f"✅ [Mihomo] {base_name:<25} | 规则数: {rule_count:,}")
 
-    date_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    # Updated 仅在规则内容变化时更新，内容不变的文件逐字节一致，不破坏 HTTP 缓存
+    body = "\n".join(lines) + "\n"
+    if precedence_pending(base_name):
+        # 此处若按裁剪前的内容记录，同一 key 每次构建会在裁剪前后两种内容间来回切换，Updated 随之每次变化
+        date_str = "pending"
+    else:
+        digest = hashlib.sha256(body.encode('utf-8')).hexdigest()
+        date_str = content_change_time(f"header:{os.path.basename(dst_dir)}/{base_name}.txt", digest)
     header = f"# Count: {rule_count}\n# Updated: {date_str}\n"
     txt_path = os.path.join(dst_dir, f"{base_name}.txt")
     mrs_path = os.path.join(dst_dir, f"{base_name}.mrs")
-    with open(txt_path, 'w', encoding='utf-8') as f: f.write(header + "\n".join(lines) + "\n")
+    with open(txt_path, 'w', encoding='utf-8') as f: f.write(header + body)
+    set_output_invariants(txt_path, SORTED_UNIQUE | {INV_PRUNED})
     if check_mihomo():
         compile_ruleset(
             ["mihomo", "convert-ruleset", "domain", "text", txt_path, mrs_path],
@@ -6,3 +6,13 @@ import os
 
 SCRIPTS_DIR = os.path.join(os.path.dirname(__file__), '..', 'scripts')
 sys.path.insert(0, os.path.abspath(SCRIPTS_DIR))
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _isolated_cache_dir(tmp_path, monkeypatch):
+    """Keep persisted build caches out of the repository during tests."""
+    import utils
+    monkeypatch.setattr(utils, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(utils, "_ALLOW_INDEXES", {})
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for analytics source contribution reports"""
+import json
+import pytest
+import analytics
+
+
+class TestSourceContributions:
+    """Test source_contributions: per-source unique counts and overlap matrix against the final set."""
+
+    def test_unique_and_overlap(self):
+        sources = [("u1", {"a.com", "b.com", "x.com"}), ("u2", {"b.com", "c.com"}), ("u3", {"b.com"})]
+        data = analytics.source_contributions("T", sources, ["a.com", "b.com", "c.com", "z.com"])
+        assert data["final_rules"] == 4
+        assert data["unattributed_rules"] == 1
+        assert [s["unique"] for s in data["sources"]] == [1, 1, 0]
+        assert [s["in_final"] for s in data["sources"]] == [2, 2, 1]
+        assert [s["rules"] for s in data["sources"]] == [3, 2, 1]
+        assert data["overlap"] == [[2, 1, 1], [1, 2, 1], [1, 1, 1]]
+
+    def test_no_sources(self):
+        data = analytics.source_contributions("T", [], ["a.com"])
+        assert data["sources"] == [] and data["overlap"] == []
+
+
+class TestReportFiles:
+    """Test write_report / report_source_files: JSON written under output/report."""
+
+    def test_report_source_files(self, tmp_path, monkeypatch, capsys):
+        monkeypatch.setattr(analytics, "REPORT_DIR", str(tmp_path / "report"))
+        s1, s2, final = tmp_path / "s1.txt", tmp_path / "s2.txt", tmp_path / "final.txt"
+        s1.write_text("a.com\nb.com\n", encoding='utf-8')
+        s2.write_text("b.com\n", encoding='utf-8')
+        final.write_text("a.com\nb.com\n", encoding='utf-8')
+        analytics.report_source_files("T", [("u1", str(s1)), ("u2", str(s2))], str(final))
+        data = json.loads((tmp_path / "report" / "sources_T.json").read_text(encoding='utf-8'))
+        assert [s["unique"] for s in data["sources"]] == [1, 0]
+        assert "⚠️ [来源]" in capsys.readouterr().out
+
+
+class TestRulesetIndex:
+    """Test RulesetIndex: cross-ruleset coverage with prune_subsumed semantics."""
+
+    def test_overlap_matrix(self):
+        index = analytics.RulesetIndex([
+            ("A", ["+.a.com", "b.com"]),
+            ("B", ["x.a.com", "b.com", "a.com", "c.com"]),
+            ("C", [".a.com", "*.q.a.com"]),
+        ])
+        matrix = index.overlap_matrix()
+        assert matrix[1] == [3, 0, 1]   # x.a.com / b.com / a.com by A; x.a.com by C (.a.com)
+        assert matrix[2] == [2, 0, 0]   # .a.com and *.q.a.com are both covered by +.a.com
+        assert matrix[0] == [0, 1, 0]   # b.com exact in B
+
+    def test_read_entries_skips_ips_and_comments(self, tmp_path):
+        path = tmp_path / "x.txt"
+        path.write_text("# Count: 3\n+.a.com\n1.1.1.0/24\n2001:db8::/32\nb.com\n", encoding='utf-8')
+        assert analytics.read_ruleset_entries(str(path)) == ["+.a.com", "b.com"]
+
+
+class TestApplyPrecedence:
+    """Test apply_precedence: lower-priority sets lose entries covered by higher-priority ones."""
+
+    def test_removes_covered_entries(self, tmp_path, monkeypatch):
+        import utils
+        monkeypatch.setattr(utils, "check_mihomo", lambda: False)
+        (tmp_path / "High.txt").write_text("+.a.com\n", encoding='utf-8')
+        (tmp_path / "Low.txt").write_text("# Count: 4\n# Updated: x\nx.a.com\n+.a.com\nb.com\n1.1.1.1\n", encoding='utf-8')
+        removed = analytics.apply_precedence(str(tmp_path), [["High", "Missing", "Low"]])
+        assert removed == {"Low": 2}
+        lines = (tmp_path / "Low.txt").read_text(encoding='utf-8').splitlines()
+        assert lines[0] == "# Count: 2" and lines[1].startswith("# Updated: ") and lines[1] != "# Updated: x"
+        assert lines[2:] == ["b.com", "1.1.1.1"]
+        assert (tmp_path / "High.txt").read_text(encoding='utf-8') == "+.a.com\n"
+
+    def test_header_stable_across_builds(self, tmp_path, monkeypatch):
+        """With precedence on, an unchanged build rewrites byte-identical headers (Updated is not restamped)."""
+        import itertools
+        from datetime import datetime, timedelta
+        import providers
+        import utils
+        ticks = itertools.count(1)
+
+        class _Clock:
+            @staticmethod
+            def now():
+                return datetime(2026, 1, 1) + timedelta(minutes=next(ticks))
+
+        monkeypatch.setattr(utils, "datetime", _Clock)
+        monkeypatch.setattr(utils, "check_mihomo", lambda: False)
+        monkeypatch.setattr(providers, "OVERLAP_PRECEDENCE", [["High", "Low"]])
+        out = tmp_path / "mihomo"
+        out.mkdir()
+        (tmp_path / "high.txt").write_text("a.com\n", encoding='utf-8')
+        (tmp_path / "low.txt").write_text("a.com\nb.com\nx.a.com\n", encoding='utf-8')
+
+        def build():
+            utils.finalize_output(str(tmp_path / "high.txt"), str(out), "High", "add_prefix")
+            utils.finalize_output(str(tmp_path / "low.txt"), str(out), "Low", "none")
+            analytics.apply_precedence(str(out), providers.OVERLAP_PRECEDENCE)
+            return (out / "High.txt").read_bytes(), (out / "Low.txt").read_bytes()
+
+        first = build()
+        low = first[1].decode('utf-8').splitlines()
+        assert low[0] == "# Count: 1" and low[1].startswith("# Updated: 2026-01-01 ") and low[2:] == ["b.com"]
+        assert b"pending" not in first[0]
+        assert build() == first
+        # 内容真正变化时才更新时间
+        (tmp_path / "low.txt").write_text("a.com\nb.com\nc.com\n", encoding='utf-8')
+        assert build()[1] != first[1]
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for build_adg.adg_block_rules"""
+from build_adg import adg_block_rules
+
+
+class TestAdgBlockRules:
+    """Test adg_block_rules: every ||x^ is a suffix root, so covered subdomains are dropped."""
+
+    def test_subdomain_of_bare_domain_dropped(self):
+        assert adg_block_rules(["a.com", "x.a.com", "y.x.a.com"]) == ["||a.com^"]
+
+    def test_prefixed_and_bare_forms_deduplicated(self):
+        assert adg_block_rules(["+.a.com", "a.com", ".a.com", "x.a.com"]) == ["||a.com^"]
+
+    def test_unrelated_and_lookalike_kept(self):
+        lines = ["a.com", "xa.com", "b.org", "# Count: 3", ""]
+        assert adg_block_rules(lines) == ["||a.com^", "||xa.com^", "||b.org^"]
+
+    def test_order_preserved(self):
+        assert adg_block_rules(["z.net", "x.a.com", "a.com"]) == ["||z.net^", "||a.com^"]
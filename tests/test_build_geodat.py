@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for build_geodat (geosite.dat / geoip.dat protobuf writer)"""
+import re
+import ipaddress
+import pytest
+import build_geodat
+from build_geodat import domain_entry, DOMAIN_FULL, DOMAIN_REGEX, DOMAIN_SUFFIX
+
+
+def _read_varint(buf, pos):
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _fields(buf):
+    """Minimal protobuf wire-format decoder: yields (field number, value) for varint / length-delimited fields."""
+    pos = 0
+    while pos < len(buf):
+        key, pos = _read_varint(buf, pos)
+        field, wire = key >> 3, key & 7
+        if wire == 0:
+            value, pos = _read_varint(buf, pos)
+        elif wire == 2:
+            length, pos = _read_varint(buf, pos)
+            value, pos = bytes(buf[pos:pos + length]), pos + length
+        else:
+            raise ValueError(f"unexpected wire type {wire}")
+        yield field, value
+
+
+def decode_geosite(data):
+    sites = {}
+    for _, entry in _fields(data):
+        code, domains = None, []
+        for field, value in _fields(entry):
+            if field == 1:
+                code = value.decode()
+            elif field == 2:
+                d = dict(_fields(value))
+                domains.append((d.get(1, 0), d[2].decode()))
+        sites[code] = domains
+    return sites
+
+
+def decode_geoip(data):
+    geoips = {}
+    for _, entry in _fields(data):
+        code, cidrs = None, []
+        for field, value in _fields(entry):
+            if field == 1:
+                code = value.decode()
+            elif field == 2:
+                c = dict(_fields(value))
+                cidrs.append(f"{ipaddress.ip_address(c[1])}/{c.get(2, 0)}")
+        geoips[code] = cidrs
+    return geoips
+
+
+class TestDomainEntry:
+    """Test domain_entry: Mihomo entry → v2ray Domain type/value."""
+
+    def test_suffix_and_full(self):
+        assert domain_entry("+.example.com") == (DOMAIN_SUFFIX, "example.com")
+        assert domain_entry("example.com") == (DOMAIN_FULL, "example.com")
+
+    @pytest.mark.parametrize("rule,match,no_match", [
+        (".example.com", ["a.example.com", "a.b.example.com"], ["example.com"]),
+        ("*.lan", ["a.lan"], ["lan", "a.b.lan"]),
+        ("+.*.lan", ["a.lan", "x.a.lan"], ["lan"]),
+        ("time.*.com", ["time.apple.com"], ["time.com", "time.a.b.com"]),
+        ("ntp*.com", ["ntp1.com", "ntp.com"], ["x.ntp1.com"]),
+    ])
+    def test_regex_semantics(self, rule, match, no_match):
+        kind, pattern = domain_entry(rule)
+        assert kind == DOMAIN_REGEX
+        for domain in match:
+            assert re.search(pattern, domain), domain
+        for domain in no_match:
+            assert not re.search(pattern, domain), domain
+
+
+class TestRunAll:
+    """Test run_all: every ruleset becomes one geosite and/or geoip category, cross-checked with a decoder."""
+
+    def test_roundtrip(self, tmp_path):
+        txt_dir, out_dir = tmp_path / "mihomo", tmp_path / "geodat"
+        txt_dir.mkdir()
+        (txt_dir / "ADs_merged.txt").write_text("# Count: 2\n+.ads.com\ntrack.net\n", encoding='utf-8')
+        (txt_dir / "cnip.txt").write_text("1.0.1.0/24\n1.0.0.0/24\n2001:db8::/33\n2001:db8:8000::/33\n", encoding='utf-8')
+        (txt_dir / "private.txt").write_text("+.lan\n10.0.0.0/8\n10.1.0.0/16\n", encoding='utf-8')
+        build_geodat.run_all(str(txt_dir), str(out_dir))
+
+        sites = decode_geosite((out_dir / "geosite.dat").read_bytes())
+        assert sites == {
+            "ADS_MERGED": [(DOMAIN_SUFFIX, "ads.com"), (DOMAIN_FULL, "track.net")],
+            "PRIVATE": [(DOMAIN_SUFFIX, "lan")],
+        }
+        geoips = decode_geoip((out_dir / "geoip.dat").read_bytes())
+        assert geoips == {
+            "CNIP": ["1.0.0.0/23", "2001:db8::/32"],
+            "PRIVATE": ["10.0.0.0/8"],
+        }
+        checksum = (out_dir / "geosite.dat.sha256sum").read_text(encoding='utf-8')
+        assert checksum.endswith("  geosite.dat\n")
+
+    def test_zero_prefix_is_omitted_but_decodes(self, tmp_path):
+        txt_dir, out_dir = tmp_path / "mihomo", tmp_path / "geodat"
+        txt_dir.mkdir()
+        (txt_dir / "all_IP.txt").write_text("0.0.0.0/0\n", encoding='utf-8')
+        build_geodat.run_all(str(txt_dir), str(out_dir))
+        assert decode_geoip((out_dir / "geoip.dat").read_bytes()) == {"ALL_IP": ["0.0.0.0/0"]}
+
+    def test_decorated_ip_lines(self, tmp_path):
+        txt_dir, out_dir = tmp_path / "mihomo", tmp_path / "geodat"
+        txt_dir.mkdir()
+        (txt_dir / "CN_merged.txt").write_text(
+            "+.baidu.com\n+.IP-CIDR,8.8.8.0/24\nIP-CIDR,1.2.3.0/24,no-resolve\nIP-CIDR6,2001:db8::/32,no-resolve\n",
+            encoding='utf-8')
+        build_geodat.run_all(str(txt_dir), str(out_dir))
+        assert decode_geosite((out_dir / "geosite.dat").read_bytes()) == {"CN_MERGED": [(DOMAIN_SUFFIX, "baidu.com")]}
+        assert decode_geoip((out_dir / "geoip.dat").read_bytes()) == {
+            "CN_MERGED": ["1.2.3.0/24", "8.8.8.0/24", "2001:db8::/32"],
+        }
+
+
+def test_collapse_networks_skips_unparsable():
+    nets = build_geodat.collapse_networks(["10.0.0.0/8", "+.IP-CIDR,8.8.8.0/24", "not-an-ip"])
+    assert [str(n) for n in nets] == ["10.0.0.0/8"]
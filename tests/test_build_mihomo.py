@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for build_mihomo output profiles"""
+import build_mihomo
+import executors
+import providers
+import utils
+
+
+def test_profiles_follow_precedence_pruning(tmp_path, monkeypatch):
+    """Lite profiles are built from the final ruleset, so entries removed by precedence never reappear."""
+    import analytics
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(utils, "check_mihomo", lambda: False)
+    monkeypatch.setattr(utils, "WORK_DIR", str(tmp_path / "work"))
+    monkeypatch.setattr(executors, "run_cpu", lambda fn, *args, **kwargs: fn(*args, **kwargs))
+    monkeypatch.setattr(providers, "OVERLAP_PRECEDENCE", [["Reject_Drop_merged", "ADs_merged"]])
+    monkeypatch.setattr(providers, "OUTPUT_PROFILES", {
+        "ADs_merged_lite": {"source": "ADs_merged", "max_rules": 10, "max_bytes": None, "score": "sources"},
+    })
+    monkeypatch.setattr(build_mihomo, "_PROFILE_SOURCES", {})
+    (tmp_path / "work").mkdir()
+    out = tmp_path / "output" / "mihomo"
+    out.mkdir(parents=True)
+
+    ads, drop, src = tmp_path / "ads.txt", tmp_path / "drop.txt", tmp_path / "src.txt"
+    ads.write_text("ads.com\ndrop.net\ntrack.org\n", encoding='utf-8')
+    drop.write_text("+.drop.net\n", encoding='utf-8')
+    src.write_text("ads.com\ndrop.net\ntrack.org\n", encoding='utf-8')
+    utils.finalize_output(str(drop), str(out), "Reject_Drop_merged", "none")
+    utils.finalize_output(str(ads), str(out), "ADs_merged", "add_prefix")
+    build_mihomo._register_profile_sources("ADs_merged", [str(src)], "add_prefix")
+
+    analytics.apply_precedence(str(out), providers.OVERLAP_PRECEDENCE)
+    build_mihomo._emit_profiles()
+
+    lite = (out / "ADs_merged_lite.txt").read_text(encoding='utf-8').splitlines()
+    assert lite[0] == "# Count: 2"
+    assert lite[2:] == ["+.ads.com", "+.track.org"]
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for build_mmdb (MaxMind DB writer for IP rulesets)"""
+import random
+import ipaddress
+import pytest
+import build_mmdb
+from build_mmdb import METADATA_MARKER
+
+
+class Reader:
+    """Minimal reference MaxMind DB reader, written from the format spec independently of the writer."""
+
+    def __init__(self, buf):
+        self.buf = buf
+        start = buf.rindex(METADATA_MARKER) + len(METADATA_MARKER)
+        self.metadata, _ = self._decode(start, start)
+        self.node_count = self.metadata["node_count"]
+        self.record_size = self.metadata["record_size"]
+        self.node_bytes = self.record_size * 2 // 8
+        self.tree_size = self.node_count * self.node_bytes
+        self.data_start = self.tree_size + 16
+
+    def _decode(self, pos, base):
+        ctrl = self.buf[pos]
+        pos += 1
+        type_num, size = ctrl >> 5, ctrl & 0x1F
+        if type_num == 0:
+            type_num = self.buf[pos] + 7
+            pos += 1
+        if type_num == 1:
+            raise AssertionError("writer does not emit pointers")
+        if size >= 29:
+            extra = size - 28
+            value = int.from_bytes(self.buf[pos:pos + extra], "big")
+            pos += extra
+            size = (29, 285, 65821)[extra - 1] + value
+        if type_num == 2:
+            return self.buf[pos:pos + size].decode(), pos + size
+        if type_num in (5, 6, 9, 10):
+            return int.from_bytes(self.buf[pos:pos + size], "big"), pos + size
+        if type_num == 7:
+            result = {}
+            for _ in range(size):
+                key, pos = self._decode(pos, base)
+                result[key], pos = self._decode(pos, base)
+            return result, pos
+        if type_num == 11:
+            result = []
+            for _ in range(size):
+                item, pos = self._decode(pos, base)
+                result.append(item)
+            return result, pos
+        raise AssertionError(f"unexpected type {type_num}")
+
+    def _record(self, node, side):
+        raw = self.buf[node * self.node_bytes:(node + 1) * self.node_bytes]
+        if self.record_size == 24:
+            return int.from_bytes(raw[side * 3:side * 3 + 3], "big")
+        if self.record_size == 28:
+            nibble = raw[3] >> 4 if side == 0 else raw[3] & 0x0F
+            low = raw[0:3] if side == 0 else raw[4:7]
+            return nibble << 24 | int.from_bytes(low, "big")
+        return int.from_bytes(raw[side * 4:side * 4 + 4], "big")
+
+    def lookup(self, ip):
+        address = ipaddress.ip_address(ip)
+        value, bits = int(address), address.max_prefixlen
+        node = 0
+        if bits == 32:
+            # IPv4 位于 ::/96 之下：先沿 96 个 0 位下行
+            for _ in range(96):
+                if node >= self.node_count: break
+                node = self._record(node, 0)
+        for i in range(bits):
+            if node >= self.node_count: break
+            node = self._record(node, value >> (bits - 1 - i) & 1)
+        if node == self.node_count:
+            return None
+        assert node > self.node_count
+        offset = self.data_start + node - self.node_count - 16
+        return self._decode(offset, self.data_start)[0]
+
+
+def _build(rulesets):
+    tree = build_mmdb.build_tree([(code, [ipaddress.ip_network(n) for n in nets]) for code, nets in rulesets])
+    return Reader(build_mmdb.encode_database(tree))
+
+
+class TestEncodeDatabase:
+    """Test build_tree + encode_database against the reference reader."""
+
+    def test_metadata(self):
+        reader = _build([("cnip", ["1.0.0.0/24"])])
+        meta = reader.metadata
+        assert meta["database_type"] == "Meta-geoip0"
+        assert meta["ip_version"] == 6
+        assert meta["binary_format_major_version"] == 2
+        assert meta["record_size"] == 24
+
+    def test_lookups(self):
+        reader = _build([
+            ("cnip", ["1.0.0.0/24", "1.0.1.0/24", "2001:db8::/32"]),
+            ("private", ["10.0.0.0/8", "fc00::/7"]),
+            ("custom_direct_ip", ["10.1.0.0/16"]),
+        ])
+        assert reader.lookup("1.0.0.1") == "cnip"
+        assert reader.lookup("1.0.1.255") == "cnip"
+        assert reader.lookup("1.0.2.0") is None
+        assert reader.lookup("2001:db8:ffff::1") == "cnip"
+        assert reader.lookup("fd00::1") == "private"
+        assert reader.lookup("10.2.0.1") == "private"
+        # 嵌套网段：地址同时属于多个规则集
+        assert reader.lookup("10.1.2.3") == ["custom_direct_ip", "private"]
+        assert reader.lookup("8.8.8.8") is None
+        assert reader.lookup("2400::1") is None
+
+    def test_adjacent_networks_are_merged(self):
+        split = _build([("cnip", ["1.0.0.0/25", "1.0.0.128/25"])])
+        whole = _build([("cnip", ["1.0.0.0/24"])])
+        assert split.buf == whole.buf
+
+    def test_empty(self):
+        reader = _build([])
+        assert reader.node_count == 1
+        assert reader.lookup("1.1.1.1") is None
+
+    def test_random_against_ipaddress(self):
+        rng = random.Random(48)
+        rulesets = {}
+        for code in ("a", "b", "c"):
+            nets = {ipaddress.IPv4Network((rng.randrange(1 << 32), rng.randint(8, 28)), strict=False)
+                    for _ in range(1000)}
+            rulesets[code] = sorted(nets)
+        reader = _build([(code, [str(n) for n in nets]) for code, nets in rulesets.items()])
+        assert reader.record_size in (24, 28, 32)
+        for _ in range(2000):
+            ip = ipaddress.IPv4Address(rng.randrange(1 << 32))
+            expected = sorted(code for code, nets in rulesets.items() if any(ip in n for n in nets))
+            got = reader.lookup(str(ip))
+            got = [] if got is None else [got] if isinstance(got, str) else got
+            assert got == expected, ip
+
+
+@pytest.mark.parametrize("record_size", [24, 28, 32])
+def test_pack_node_layout(record_size):
+    left, right = (1 << record_size) - 2, (1 << record_size) // 3
+    reader = Reader.__new__(Reader)
+    reader.buf = build_mmdb._pack_node(left, right, record_size)
+    reader.record_size, reader.node_bytes = record_size, record_size // 4
+    assert (reader._record(0, 0), reader._record(0, 1)) == (left, right)
+
+
+class TestRunAll:
+    """Test run_all: IP entries of every ruleset become one mmdb, domains are ignored."""
+
+    def test_roundtrip(self, tmp_path):
+        txt_dir, out_dir = tmp_path / "mihomo", tmp_path / "geodat"
+        txt_dir.mkdir()
+        (txt_dir / "ADs_merged.txt").write_text("+.ads.com\n", encoding='utf-8')
+        (txt_dir / "cnip.txt").write_text("# Count: 2\n1.0.1.0/24\n1.0.0.0/24\n2001:db8::/32\n", encoding='utf-8')
+        (txt_dir / "Custom_Proxy_IP.txt").write_text("+.lan\n::ffff:8.8.8.0/120\n", encoding='utf-8')
+        build_mmdb.run_all(str(txt_dir), str(out_dir))
+
+        data = (out_dir / "geoip.mmdb").read_bytes()
+        reader = Reader(data)
+        assert reader.lookup("1.0.0.7") == "cnip"
+        assert reader.lookup("2001:db8::1") == "cnip"
+        assert reader.lookup("8.8.8.8") == "custom_proxy_ip"
+        assert reader.metadata["build_epoch"] > 0
+        assert (out_dir / "geoip.mmdb.sha256sum").read_text(encoding='utf-8').endswith("  geoip.mmdb\n")
+
+        # 内容不变时 build_epoch 不变，文件逐字节一致
+        build_mmdb.run_all(str(txt_dir), str(out_dir))
+        assert (out_dir / "geoip.mmdb").read_bytes() == data
+
+    def test_decorated_ip_lines(self, tmp_path):
+        txt_dir, out_dir = tmp_path / "mihomo", tmp_path / "geodat"
+        txt_dir.mkdir()
+        (txt_dir / "CN_merged.txt").write_text(
+            "+.baidu.com\n+.IP-CIDR,8.8.8.0/24\nIP-CIDR,1.2.3.0/24,no-resolve\nIP-CIDR6,2001:db8::/32,no-resolve\n",
+            encoding='utf-8')
+        build_mmdb.run_all(str(txt_dir), str(out_dir))
+        reader = Reader((out_dir / "geoip.mmdb").read_bytes())
+        assert reader.lookup("8.8.8.8") == "cn_merged"
+        assert reader.lookup("1.2.3.4") == "cn_merged"
+        assert reader.lookup("2001:db8::1") == "cn_merged"
+        assert reader.lookup("1.2.4.1") is None
@@ -79,3 +79,184 @@ class TestConvertTxtToJson:
         result, data = self._run(["example.com # comment"])
         assert result is True
         assert "example.com" in data["rules"][0]["domain"]
+
+    def test_presorted_input_matches_default(self):
+        """Known sorted+unique input skips re-sorting but yields identical JSON."""
+        from utils import SORTED_UNIQUE
+        lines = sorted(["+.a.com", "+.b.com", ".a.com", "*.c.com", "x.com", "y.com", "10.0.0.0/8"])
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False, encoding='utf-8') as tf:
+            tf.write('\n'.join(lines) + '\n')
+            txt_path = tf.name
+        outputs = []
+        for inv in (frozenset(), SORTED_UNIQUE):
+            json_path = txt_path + '.json'
+            assert convert_txt_to_json(txt_path, json_path, inv) is True
+            with open(json_path, 'r', encoding='utf-8') as f:
+                outputs.append(json.load(f))
+            os.unlink(json_path)
+        os.unlink(txt_path)
+        assert outputs[0] == outputs[1]
+        assert outputs[1]["rules"][0]["domain_suffix"] == ["a.com", "b.com", "c.com"]
+
+
+class TestConsolidateRegexes:
+    """Test consolidate_regexes: trie factoring must be semantically equivalent."""
+
+    @staticmethod
+    def _to_regex(rule):
+        import re
+        if rule.startswith('+.'):
+            return "^(.*\\.)?" + re.escape(rule[2:]).replace(r'\*', '.*') + "$"
+        return "^" + re.escape(rule).replace(r'\*', '.*') + "$"
+
+    @staticmethod
+    def _matches_any(patterns, domain):
+        import re
+        return any(re.search(p, domain) for p in patterns)
+
+    def test_equivalence_over_generated_domains(self):
+        import random
+        from build_singbox import consolidate_regexes
+        rnd = random.Random(2024)
+        labels = ["a", "ab", "ads", "x-1", "cdn", "time", "ntp"]
+        tlds = ["com", "net", "cn"]
+        rules = set()
+        for _ in range(300):
+            parts = [rnd.choice(labels + ["*", "t*", "*x"]) for _ in range(rnd.randint(1, 3))]
+            rule = ".".join(parts + [rnd.choice(tlds)])
+            if '*' not in rule:
+                rule = "*" + rule
+            rules.add(rnd.choice(["", "+."]) + rule)
+        original = {self._to_regex(r) for r in rules}
+        consolidated = consolidate_regexes(original)
+        assert len(consolidated) < len(original)
+        domains = set()
+        for _ in range(3000):
+            parts = [rnd.choice(labels + ["zz", "tq", "qx", "a-b"]) for _ in range(rnd.randint(1, 5))]
+            domains.add(".".join(parts + [rnd.choice(tlds + ["org"])]))
+        for rule in rules:
+            domains.add(rule.lstrip('+.').replace('*', rnd.choice(["", "k", "k.m"])))
+        for domain in domains:
+            assert self._matches_any(original, domain) == self._matches_any(consolidated, domain), domain
+
+    def test_single_regex_unchanged(self):
+        from build_singbox import consolidate_regexes
+        regex = "^(.*\\.)?ads\\.example\\.com$"
+        assert consolidate_regexes({regex}) == [regex]
+
+    def test_shared_suffix_factored(self):
+        from build_singbox import consolidate_regexes
+        result = consolidate_regexes({"^(.*\\.)?a.*\\.example\\.com$", "^(.*\\.)?b.*\\.example\\.com$"})
+        assert len(result) == 1
+        assert result[0].endswith("\\.example\\.com$")
+
+    def test_anchors_not_mixed(self):
+        from build_singbox import consolidate_regexes
+        result = consolidate_regexes({"^a.*\\.com$", "^(.*\\.)?b.*\\.com$"})
+        assert len(result) == 2
+
+    def test_unparseable_kept(self):
+        from build_singbox import consolidate_regexes
+        regex = "^time\\d*\\..*\\.(com|net)$"
+        assert regex in consolidate_regexes({regex, "^a.*\\.com$"})
+
+    def test_chunking(self, monkeypatch):
+        import build_singbox
+        monkeypatch.setattr(build_singbox, "MAX_REGEX_ALTERNATIVES", 2)
+        regexes = {f"^{c}.*\\.com$" for c in "abcde"}
+        assert len(build_singbox.consolidate_regexes(regexes)) == 3
+
+
+class TestLowerWildcard:
+    """Test lower_wildcard: rewrite wildcards into cheaper equivalent matchers."""
+
+    def test_keyword(self):
+        from build_singbox import lower_wildcard
+        assert lower_wildcard("*tracker*", False) == ("domain_keyword", "tracker")
+
+    def test_keyword_with_apex(self):
+        from build_singbox import lower_wildcard
+        assert lower_wildcard("*.ntp.*", True) == ("domain_keyword", ".ntp.")
+
+    def test_strict_suffix(self):
+        from build_singbox import lower_wildcard
+        assert lower_wildcard("*.example.com", True) == ("domain_suffix", ".example.com")
+
+    def test_not_lowerable(self):
+        from build_singbox import lower_wildcard
+        assert lower_wildcard("time.*.com", False) is None
+        assert lower_wildcard("foo.*", True) is None
+        assert lower_wildcard("*a*b*", False) is None
+        assert lower_wildcard("*", True) is None
+
+    def test_equivalence_with_regex(self):
+        """Lowered matcher must accept exactly what the regex it replaces accepts."""
+        import re
+        from build_singbox import lower_wildcard
+        cases = [("*ads*", False), ("*.ntp.*", True), ("*.example.com", True), ("*-cdn-*", False)]
+        domains = ["ads.com", "x.ads.cn", "ntp.org", "a.ntp.org", "example.com", "a.example.com",
+                   "b.a.example.com", "notexample.com", "a-cdn-b.net", "cdn.net", "pads.io"]
+        for body, with_apex in cases:
+            escaped = re.escape(body).replace(r'\*', '.*')
+            regex = f"^(.*\\.)?{escaped}$" if with_apex else f"^{escaped}$"
+            kind, value = lower_wildcard(body, with_apex)
+            for d in domains:
+                lowered = value in d if kind == "domain_keyword" else d.endswith(value)
+                assert lowered == bool(re.search(regex, d)), (body, d)
+
+    def test_convert_reports_keywords(self, tmp_path):
+        import json
+        src, dst = tmp_path / "x.txt", tmp_path / "x.json"
+        src.write_text("*tracker*\n+.*.example.com\ntime.*.com\n", encoding='utf-8')
+        assert convert_txt_to_json(str(src), str(dst)) is True
+        rule = json.loads(dst.read_text(encoding='utf-8'))["rules"][0]
+        assert rule["domain_keyword"] == ["tracker"]
+        assert rule["domain_suffix"] == [".example.com"]
+        assert rule["domain_regex"] == ["^time\\..*\\.com$"]
+
+
+class TestConvertPruning:
+    """Test convert_txt_to_json: covered entries are pruned before emitting."""
+
+    def test_convert_prunes_covered_entries(self, tmp_path):
+        """Exact, suffix and wildcard entries under a broader suffix are dropped."""
+        import json
+        src, dst = tmp_path / "Custom.txt", tmp_path / "Custom.json"
+        src.write_text("+.a.com\nx.a.com\n+.y.a.com\ntime.*.a.com\nb.com\n1.1.1.1\n", encoding='utf-8')
+        assert convert_txt_to_json(str(src), str(dst)) is True
+        rule = json.loads(dst.read_text(encoding='utf-8'))["rules"][0]
+        assert rule == {"domain": ["b.com"], "domain_suffix": ["a.com"], "ip_cidr": ["1.1.1.1/32"]}
+
+
+class TestWriteRulesetJson:
+    """Test write_ruleset_json: streaming writer, pretty layout identical to json.dump(indent=2)."""
+
+    RULE = {"domain": ["a.com", "例子.中国"], "domain_suffix": [], "ip_cidr": [f"10.0.{i}.0/24" for i in range(10)]}
+
+    def test_pretty_matches_json_dump(self, tmp_path, monkeypatch):
+        import json
+        import build_singbox
+        monkeypatch.setattr(build_singbox, "_JSON_WRITE_BATCH", 3)
+        path = tmp_path / "x.json"
+        build_singbox.write_ruleset_json(str(path), self.RULE)
+        expected = json.dumps({"version": 5, "rules": [self.RULE]}, indent=2, ensure_ascii=False)
+        assert path.read_text(encoding='utf-8') == expected
+
+    def test_compact_roundtrip(self, tmp_path, monkeypatch):
+        import json
+        import build_singbox
+        monkeypatch.setattr(build_singbox, "_JSON_WRITE_BATCH", 3)
+        path = tmp_path / "x.json"
+        build_singbox.write_ruleset_json(str(path), self.RULE, compact=True)
+        text = path.read_text(encoding='utf-8')
+        assert text == json.dumps({"version": 5, "rules": [self.RULE]}, separators=(',', ':'), ensure_ascii=False)
+
+    def test_convert_auto_compact(self, tmp_path, monkeypatch):
+        import build_singbox
+        monkeypatch.setattr(build_singbox, "COMPACT_JSON_MIN_RULES", 2)
+        src, dst = tmp_path / "x.txt", tmp_path / "x.json"
+        src.write_text("a.com\nb.com\n", encoding='utf-8')
+        assert convert_txt_to_json(str(src), str(dst)) is True
+        assert "\n" not in dst.read_text(encoding='utf-8')
+        assert convert_txt_to_json(str(src), str(dst), compact=False) is True
+        assert "\n" in dst.read_text(encoding='utf-8')
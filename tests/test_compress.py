@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for compress precompressed artifacts"""
+import gzip
+import json
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+import analytics
+import compress
+import executors
+
+
+class TestCompressFile:
+    """Test compress_file: deterministic gzip variant with recorded sizes."""
+
+    def test_gzip_roundtrip_and_sizes(self, tmp_path):
+        path = tmp_path / "A.txt"
+        path.write_bytes(b"example.com\n" * 1000)
+        sizes = compress.compress_file(str(path))
+        packed = (tmp_path / "A.txt.gz").read_bytes()
+        assert gzip.decompress(packed) == path.read_bytes()
+        assert sizes["size"] == 12000 and sizes["gzip"] == len(packed) < 12000
+
+    def test_gzip_is_deterministic(self, tmp_path):
+        path = tmp_path / "A.txt"
+        path.write_bytes(b"a.com\n")
+        compress.compress_file(str(path))
+        first = (tmp_path / "A.txt.gz").read_bytes()
+        compress.compress_file(str(path))
+        assert (tmp_path / "A.txt.gz").read_bytes() == first
+
+    def test_optional_variants_skipped_when_missing(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(compress, "zstandard", None)
+        monkeypatch.setattr(compress, "brotli", None)
+        path = tmp_path / "A.json"
+        path.write_text("{}")
+        assert set(compress.compress_file(str(path))) == {"size", "gzip"}
+        assert not (tmp_path / "A.json.zst").exists()
+
+
+class TestPrecompressOutputs:
+    """Test precompress_outputs: only text/JSON artifacts, sizes written to the build report."""
+
+    def test_report(self, tmp_path, monkeypatch):
+        pool = executors.MeteredPool("test", ThreadPoolExecutor(max_workers=2), 2)
+        monkeypatch.setattr(executors, "cpu_pool", lambda: pool)
+        monkeypatch.setattr(analytics, "REPORT_DIR", str(tmp_path / "report"))
+        out = tmp_path / "mihomo"
+        out.mkdir()
+        (out / "A.txt").write_text("a.com\n")
+        (out / "A.mrs").write_bytes(b"\x00")
+        (out / "manifest.json").write_text("{}")
+        files = compress.precompress_outputs([str(out), str(tmp_path / "missing")])
+        pool.shutdown()
+        assert list(files) == [str(out / "A.txt").replace("\\", "/")]
+        assert not (out / "A.mrs.gz").exists() and not (out / "manifest.json.gz").exists()
+        report = json.loads((tmp_path / "report" / "compression.json").read_text(encoding='utf-8'))
+        assert report["totals"]["size"] == 6 and "gzip" in report["variants"]
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for delta.emit_deltas"""
+import json
+import pytest
+import delta
+
+
+class TestEmitDeltas:
+    """Test emit_deltas: added/removed files and manifest between consecutive builds."""
+
+    def _manifest(self, out_dir):
+        return json.loads((out_dir / "delta" / "manifest.json").read_text(encoding='utf-8'))
+
+    def test_first_build_has_no_base(self, tmp_path):
+        (tmp_path / "A.txt").write_text("# Count: 2\nb.com\na.com\n", encoding='utf-8')
+        entry = delta.emit_deltas(str(tmp_path))["rulesets"]["A"]
+        assert entry["base"] is None
+        assert entry["target"] == delta.ruleset_version(["a.com", "b.com"])
+        assert sorted(p.name for p in (tmp_path / "delta").iterdir()) == ["manifest.json"]
+
+    def test_added_and_removed(self, tmp_path):
+        src = tmp_path / "A.txt"
+        src.write_text("# Updated: 1\na.com\nb.com\n", encoding='utf-8')
+        first = delta.emit_deltas(str(tmp_path))["rulesets"]["A"]["target"]
+        src.write_text("# Updated: 2\nb.com\nc.com\n", encoding='utf-8')
+        entry = delta.emit_deltas(str(tmp_path))["rulesets"]["A"]
+        assert entry["base"] == first
+        assert (entry["added"], entry["removed"]) == (1, 1)
+        assert (tmp_path / "delta" / entry["added_file"]).read_text() == "c.com\n"
+        assert (tmp_path / "delta" / entry["removed_file"]).read_text() == "a.com\n"
+        assert self._manifest(tmp_path)["rulesets"]["A"] == entry
+
+    def test_unchanged_ruleset_has_no_delta_files(self, tmp_path):
+        (tmp_path / "A.txt").write_text("# Updated: 1\na.com\n", encoding='utf-8')
+        delta.emit_deltas(str(tmp_path))
+        (tmp_path / "A.txt").write_text("# Updated: 2\na.com\n", encoding='utf-8')
+        entry = delta.emit_deltas(str(tmp_path))["rulesets"]["A"]
+        assert entry["base"] == entry["target"]
+        assert (entry["added"], entry["removed"]) == (0, 0)
+        assert "added_file" not in entry
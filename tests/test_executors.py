@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for executors.MeteredPool"""
+import pytest
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from executors import MeteredPool
+
+
+class TestMeteredPool:
+    """Test MeteredPool: bounded pool wrapper with queue depth / utilization metrics."""
+
+    def _pool(self, workers=2):
+        return MeteredPool("test", ThreadPoolExecutor(max_workers=workers), workers)
+
+    def test_result_passthrough(self):
+        pool = self._pool()
+        assert pool.submit(lambda a, b: a + b, 1, b=2).result() == 3
+        pool.shutdown()
+
+    def test_exception_passthrough(self):
+        pool = self._pool()
+        future = pool.submit(lambda: 1 / 0)
+        with pytest.raises(ZeroDivisionError):
+            future.result()
+        pool.shutdown()
+
+    def test_peak_queue_depth(self):
+        """Tasks beyond the worker count are counted as queued."""
+        pool = self._pool(workers=1)
+        gate = threading.Event()
+        futures = [pool.submit(gate.wait) for _ in range(4)]
+        assert pool.stats()["queue_depth"] == 3
+        gate.set()
+        for f in futures:
+            f.result()
+        stats = pool.stats()
+        assert stats["peak_queue_depth"] == 3
+        assert stats["queue_depth"] == 0
+        assert stats["completed"] == 4
+        pool.shutdown()
+
+    def test_stats_updated_before_result(self):
+        """A caller woken by result() already sees its task counted."""
+        pool = self._pool(workers=2)
+        for i in range(200):
+            pool.submit(lambda: None).result()
+            assert pool.stats()["completed"] == i + 1
+        with pytest.raises(ZeroDivisionError):
+            pool.submit(lambda: 1 / 0).result()
+        assert pool.stats()["completed"] == 201
+        pool.shutdown()
+
+    def test_map_preserves_order(self):
+        pool = self._pool()
+        assert pool.map(lambda x: x * 2, [1, 2, 3]) == [2, 4, 6]
+        pool.shutdown()
+
+    def test_empty_pool_stats(self):
+        pool = self._pool()
+        stats = pool.stats()
+        assert stats["submitted"] == 0
+        assert stats["utilization"] == 0.0
+        pool.shutdown()
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for manifest.write_manifest and stable output headers"""
+import json
+import pytest
+import utils
+import manifest
+
+
+class TestWriteManifest:
+    """Test write_manifest: per-file sha256 / size / rule count / last content change."""
+
+    def test_entries(self, tmp_path):
+        (tmp_path / "A.txt").write_text("# Count: 2\na.com\n+.b.com\n", encoding='utf-8')
+        (tmp_path / "A.mrs").write_bytes(b"\x00\x01")
+        (tmp_path / "B.json").write_text(json.dumps({"version": 5, "rules": [{"domain": ["a"], "domain_suffix": ["b", "c"]}]}))
+        files = manifest.write_manifest(str(tmp_path))["files"]
+        assert sorted(files) == ["A.mrs", "A.txt", "B.json"]
+        assert files["A.txt"]["rules"] == 2
+        assert files["A.mrs"]["rules"] == 2
+        assert files["B.json"]["rules"] == 3
+        assert files["A.mrs"]["size"] == 2
+        assert files["A.txt"]["sha256"] == manifest.file_sha256(str(tmp_path / "A.txt"))
+        on_disk = json.loads((tmp_path / "manifest.json").read_text(encoding='utf-8'))
+        assert on_disk["files"] == files
+
+    def test_changed_time_kept_while_content_unchanged(self, tmp_path, monkeypatch):
+        (tmp_path / "A.txt").write_text("a.com\n", encoding='utf-8')
+        first = manifest.write_manifest(str(tmp_path))["files"]["A.txt"]["changed"]
+        monkeypatch.setattr(utils, "datetime", _FixedDatetime)
+        assert manifest.write_manifest(str(tmp_path))["files"]["A.txt"]["changed"] == first
+        (tmp_path / "A.txt").write_text("b.com\n", encoding='utf-8')
+        assert manifest.write_manifest(str(tmp_path))["files"]["A.txt"]["changed"] == "2000-01-01 00:00:00"
+
+
+class _FixedDatetime:
+    @staticmethod
+    def now():
+        import datetime
+        return datetime.datetime(2000, 1, 1)
+
+
+class TestStableHeader:
+    """Test finalize_output: identical rules produce a byte-identical file."""
+
+    def test_rebuild_is_byte_identical(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(utils, "check_mihomo", lambda: False)
+        src = tmp_path / "src.txt"
+        src.write_text("a.com\nb.com\n", encoding='utf-8')
+        out = tmp_path / "out"
+        out.mkdir()
+        utils.finalize_output(str(src), str(out), "X", "none", utils.SORTED_UNIQUE)
+        first = (out / "X.txt").read_bytes()
+        monkeypatch.setattr(utils, "datetime", _FixedDatetime)
+        utils.finalize_output(str(src), str(out), "X", "none", utils.SORTED_UNIQUE)
+        assert (out / "X.txt").read_bytes() == first
+        src.write_text("a.com\nc.com\n", encoding='utf-8')
+        utils.finalize_output(str(src), str(out), "X", "none", utils.SORTED_UNIQUE)
+        assert b"# Updated: 2000-01-01 00:00:00" in (out / "X.txt").read_bytes()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for rule_history (SQLite rule history store)"""
+import pytest
+import providers
+import rule_history
+from rule_history import connect, domain_history, record_build, ruleset_diff
+
+
+def _write(txt_dir, name, rules):
+    txt_dir.mkdir(exist_ok=True)
+    (txt_dir / f"{name}.txt").write_text("# Count: 0\n" + "".join(r + "\n" for r in rules), encoding='utf-8')
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "history.sqlite3")
+
+
+class TestRecordBuild:
+    """Test record_build: a span stays open while its rule persists and a new span opens when it returns."""
+
+    def test_spans_and_sources(self, tmp_path, db):
+        txt_dir = tmp_path / "mihomo"
+        _write(txt_dir, "ADs_merged", ["+.ads.com", "+.track.net"])
+        sources = {"ADs_merged": [("https://a.example/list", {"ads.com"}), ("https://b.example/list", {"ads.com", "track.net"})]}
+        b1, stats = record_build(str(txt_dir), db, sources, built_at="2026-01-01 00:00:00")
+        assert stats == {"ADs_merged": {"added": 2, "removed": 0}}
+
+        _write(txt_dir, "ADs_merged", ["+.ads.com", "+.new.org"])
+        sources = {"ADs_merged": [("https://c.example/list", {"new.org"})]}
+        b2, stats = record_build(str(txt_dir), db, sources, built_at="2026-01-02 00:00:00")
+        assert stats == {"ADs_merged": {"added": 1, "removed": 1}}
+
+        _write(txt_dir, "ADs_merged", ["+.ads.com", "+.new.org", "+.track.net"])
+        b3, stats = record_build(str(txt_dir), db, {}, built_at="2026-01-03 00:00:00")
+        assert stats == {"ADs_merged": {"added": 1, "removed": 0}}
+
+        conn = connect(db)
+        try:
+            history = domain_history(conn, "ads.com")
+            assert [(h["rule"], h["first_build"], h["last_build"], h["sources"]) for h in history] == [
+                ("+.ads.com", b1, None, ["https://a.example/list", "https://b.example/list"]),
+            ]
+            assert history[0]["first_seen"] == "2026-01-01 00:00:00"
+            # 离开后重新进入的规则新开一个区间
+            track = domain_history(conn, "track.net", ruleset="ADs_merged")
+            assert [(h["first_build"], h["last_build"]) for h in track] == [(b1, b1), (b3, None)]
+            assert track[0]["sources"] == ["https://b.example/list"]
+            # 子域名通过父域后缀条目命中
+            assert [h["rule"] for h in domain_history(conn, "x.new.org")] == ["+.new.org"]
+            assert domain_history(conn, "ads.com", ruleset="CN_merged") == []
+
+            assert ruleset_diff(conn, "ADs_merged", b1, b2) == (["+.new.org"], ["+.track.net"])
+            assert ruleset_diff(conn, "ADs_merged", b2, b3) == (["+.track.net"], [])
+            assert ruleset_diff(conn, "ADs_merged", b1, b3) == (["+.new.org"], [])
+            assert ruleset_diff(conn, "ADs_merged", b2, b1) == (["+.track.net"], ["+.new.org"])
+            assert ruleset_diff(conn, "CN_merged", b1, b2) == ([], [])
+        finally:
+            conn.close()
+
+    def test_missing_ruleset_closes_spans(self, tmp_path, db):
+        txt_dir = tmp_path / "mihomo"
+        _write(txt_dir, "cnip", ["1.0.0.0/24"])
+        b1, _ = record_build(str(txt_dir), db, {})
+        (txt_dir / "cnip.txt").unlink()
+        _write(txt_dir, "private", ["10.0.0.0/8"])
+        b2, _ = record_build(str(txt_dir), db, {})
+        conn = connect(db)
+        try:
+            assert ruleset_diff(conn, "cnip", b1, b2) == ([], ["1.0.0.0/24"])
+            assert domain_history(conn, "10.0.0.0/8")[0]["ruleset"] == "private"
+        finally:
+            conn.close()
+
+
+def test_disabled_by_default(tmp_path, monkeypatch):
+    monkeypatch.setattr(providers, "RULE_HISTORY", False)
+    monkeypatch.setattr(rule_history, "_SOURCES", {})
+    rule_history.register_sources("ADs_merged", [("url", {"a.com"})])
+    assert rule_history._SOURCES == {}
+    assert rule_history.record_if_enabled(str(tmp_path)) is None
+
+
+def test_registered_sources_are_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(providers, "RULE_HISTORY", True)
+    monkeypatch.setattr(rule_history, "_SOURCES", {})
+    src = tmp_path / "clean_source.txt"
+    src.write_text("ads.com\n", encoding='utf-8')
+    rule_history.register_sources("ADs_merged", [("https://a.example/list", str(src))])
+    txt_dir = tmp_path / "mihomo"
+    _write(txt_dir, "ADs_merged", ["+.ads.com"])
+    rule_history.record_if_enabled(str(txt_dir))
+    conn = connect(rule_history.db_path())
+    try:
+        assert domain_history(conn, "ads.com")[0]["sources"] == ["https://a.example/list"]
+    finally:
+        conn.close()
+
+
+def test_cli(tmp_path, db, capsys):
+    txt_dir = tmp_path / "mihomo"
+    _write(txt_dir, "ADs_merged", ["+.ads.com"])
+    record_build(str(txt_dir), db, {})
+    _write(txt_dir, "ADs_merged", ["+.ads.com", "bad.net"])
+    record_build(str(txt_dir), db, {})
+    assert rule_history.main(["--db", db, "diff", "ADs_merged"]) == 0
+    assert "+ bad.net" in capsys.readouterr().out
+    assert rule_history.main(["--db", db, "domain", "a.ads.com"]) == 0
+    assert "+.ads.com" in capsys.readouterr().out
+    assert rule_history.main(["--db", str(tmp_path / "missing.sqlite3"), "builds"]) == 1
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for rule_index (memory-mapped suffix / CIDR query index)"""
+import re
+import json
+import pytest
+import rule_index
+from rule_index import Match, RuleIndex, build_index
+from build_singbox import convert_txt_to_json
+
+
+RULESETS = {
+    "ADs_merged": ["+.ads.com", "track.net", ".doubleclick.net", "*.tracker.org"],
+    "Fake_IP_Filter_merged": ["+.lan", "time.*.com", "+.*.msftncsi.com", "ntp*.org", "*"],
+    "cnip": ["1.0.0.0/24", "1.0.1.0/24", "2001:db8::/32"],
+    "private": ["+.local", "10.0.0.0/8", "10.1.0.0/16", "fc00::/7"],
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    txt_dir = tmp_path / "mihomo"
+    txt_dir.mkdir()
+    for name, rules in RULESETS.items():
+        (txt_dir / f"{name}.txt").write_text("# Count: 0\n" + "\n".join(rules) + "\n", encoding='utf-8')
+    build_index(str(txt_dir), str(tmp_path / "rule_index.bin"))
+    with RuleIndex(str(tmp_path / "rule_index.bin")) as idx:
+        yield idx
+
+
+class TestQuery:
+    """Test RuleIndex.query: suffix, exact, wildcard and CIDR matches with the matching rule."""
+
+    def test_domains(self, index):
+        assert index.query("ads.com") == [Match("ADs_merged", "+.ads.com")]
+        assert index.query("x.y.ADS.com.") == [Match("ADs_merged", "+.ads.com")]
+        assert index.query("track.net") == [Match("ADs_merged", "track.net")]
+        assert index.query("a.track.net") == []
+        # .x 与 *.x 按 optimize_smart_self / sing-box domain_suffix 语义同时匹配 x 本身
+        assert index.query("doubleclick.net") == [Match("ADs_merged", ".doubleclick.net")]
+        assert index.query("a.b.tracker.org") == [Match("ADs_merged", "*.tracker.org")]
+        assert index.query("example.com") == []
+
+    def test_wildcards(self, index):
+        assert index.query("time.apple.com") == [Match("Fake_IP_Filter_merged", "time.*.com")]
+        assert index.query("www.msftncsi.com") == [Match("Fake_IP_Filter_merged", "+.*.msftncsi.com")]
+        assert index.query("ntp1.org") == [Match("Fake_IP_Filter_merged", "ntp*.org")]
+        assert index.query("printer.lan") == [Match("Fake_IP_Filter_merged", "+.lan")]
+
+    def test_ips(self, index):
+        assert index.query("1.0.1.9") == [Match("cnip", "1.0.1.0/24")]
+        assert index.query("10.1.2.3") == [Match("private", "10.0.0.0/8"), Match("private", "10.1.0.0/16")]
+        assert index.query("2001:db8::1") == [Match("cnip", "2001:db8::/32")]
+        assert index.query("fd12::1") == [Match("private", "fc00::/7")]
+        assert index.query("8.8.8.8") == []
+
+
+def _singbox_matches(rule_dict, domain):
+    """Brute-force evaluation of a sing-box headless rule's domain matchers."""
+    if domain in rule_dict.get("domain", []):
+        return True
+    for suffix in rule_dict.get("domain_suffix", []):
+        if suffix.startswith('.'):
+            if domain.endswith(suffix): return True
+        elif domain == suffix or domain.endswith('.' + suffix):
+            return True
+    if any(keyword in domain for keyword in rule_dict.get("domain_keyword", [])):
+        return True
+    return any(re.search(regex, domain) for regex in rule_dict.get("domain_regex", []))
+
+
+def test_matches_agree_with_convert_txt_to_json(index, tmp_path):
+    domains = ["ads.com", "a.ads.com", "track.net", "x.track.net", "doubleclick.net", "a.doubleclick.net",
+               "tracker.org", "a.tracker.org", "time.apple.com", "time.com", "msftncsi.com", "www.msftncsi.com",
+               "ntp.org", "ntp1.org", "x.ntp1.org", "lan", "a.lan", "local", "b.local", "example.com"]
+    for name in ("ADs_merged", "Fake_IP_Filter_merged", "private"):
+        txt_path = tmp_path / "mihomo" / f"{name}.txt"
+        json_path = tmp_path / f"{name}.json"
+        convert_txt_to_json(str(txt_path), str(json_path))
+        rule_dict = json.loads(json_path.read_text(encoding='utf-8'))["rules"][0]
+        for domain in domains:
+            expected = _singbox_matches(rule_dict, domain)
+            got = any(match.ruleset == name for match in index.query(domain))
+            assert got == expected, (name, domain)
+
+
+def test_decorated_ip_lines(tmp_path):
+    txt_dir = tmp_path / "mihomo"
+    txt_dir.mkdir()
+    (txt_dir / "CN_merged.txt").write_text(
+        "+.baidu.com\n+.IP-CIDR,8.8.8.0/24\nIP-CIDR,1.2.3.0/24,no-resolve\nIP-CIDR6,2001:db8::/32,no-resolve\n",
+        encoding='utf-8')
+    stats = build_index(str(txt_dir), str(tmp_path / "rule_index.bin"))
+    assert stats["networks"] == 3 and stats["domain_keys"] == 1
+    with RuleIndex(str(tmp_path / "rule_index.bin")) as index:
+        assert index.query("8.8.8.8") == [Match("CN_merged", "8.8.8.0/24")]
+        assert index.query("1.2.3.4") == [Match("CN_merged", "1.2.3.0/24")]
+        assert index.query("2001:db8::1") == [Match("CN_merged", "2001:db8::/32")]
+        assert index.query("www.baidu.com") == [Match("CN_merged", "+.baidu.com")]
+
+
+def test_rejects_foreign_file(tmp_path):
+    path = tmp_path / "not_an_index.bin"
+    path.write_bytes(b"\x00" * 64)
+    with pytest.raises(ValueError):
+        RuleIndex(str(path))
+
+
+def test_cli(index, tmp_path, capsys):
+    path = str(tmp_path / "rule_index.bin")
+    assert rule_index.main(["query", "--index", path, "a.ads.com", "10.9.9.9"]) == 0
+    out = capsys.readouterr().out
+    assert "+.ads.com" in out and "10.0.0.0/8" in out
+    assert rule_index.main(["query", "--index", path, "example.com"]) == 1
@@ -75,3 +75,14 @@ class TestDownloadFilesParallel:
             assert os.path.getsize(out_path) == 0
         finally:
             os.unlink(out_path)
+
+    @patch('utils.download_file')
+    def test_source_dir_keeps_per_source_files(self, mock_download, tmp_path):
+        """source_dir → each successful source saved separately, failed ones skipped."""
+        mock_download.side_effect = lambda url, *a, **k: {"http://a.com": "a.com", "http://c.com": "c.com\n"}.get(url, "")
+        out_path = tmp_path / "raw.txt"
+        sources = utils.download_files_parallel(str(out_path), ["http://a.com", "http://b.com", "http://c.com"],
+                                                source_dir=str(tmp_path / "sources"))
+        assert [url for url, _ in sources] == ["http://a.com", "http://c.com"]
+        assert [open(p, encoding='utf-8').read() for _, p in sources] == ["a.com\n", "c.com\n"]
+        assert out_path.read_text(encoding='utf-8') == "a.com\nc.com\n"
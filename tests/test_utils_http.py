@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Tests for utils.download_file against a local HTTP server stand-in"""
+import gzip
+import time
+import zlib
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import utils
+
+BODY = ("example.com\n" * 2000 + "例子.中国\n").encode('utf-8')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        _Handler.requests.append((self.path, self.headers.get("Accept-Encoding")))
+        encoding = self.path.strip("/")
+        if encoding == "gzip":
+            payload = gzip.compress(BODY)
+        elif encoding == "deflate":
+            payload = zlib.compress(BODY)
+        elif encoding == "rawdeflate":
+            obj = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+            payload = obj.compress(BODY) + obj.flush()
+            encoding = "deflate"
+        else:
+            payload = BODY
+            encoding = None
+        self.send_response(200)
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+class TestDownloadFileEncoding:
+    """Test download_file: Accept-Encoding negotiation with streaming decompression."""
+
+    @pytest.mark.parametrize("encoding", ["identity", "gzip", "deflate", "rawdeflate"])
+    def test_decodes(self, server, encoding, monkeypatch, capsys):
+        monkeypatch.setattr(utils, "_DOWNLOAD_CHUNK", 256)
+        assert utils.download_file(f"{server}/{encoding}", retries=1) == BODY.decode('utf-8')
+        assert "传输:" in capsys.readouterr().out
+
+    def test_sends_accept_encoding(self, server):
+        utils.download_file(f"{server}/identity", retries=1)
+        path, accept = _Handler.requests[-1]
+        assert "gzip" in accept and "deflate" in accept
+
+    def test_wire_bytes_smaller_for_gzip(self, server, capsys):
+        utils.download_file(f"{server}/gzip", retries=1)
+        out = capsys.readouterr().out
+        wire = float(out.split("传输: ")[1].split("KB")[0].replace(",", ""))
+        assert wire * 1024 < len(BODY) / 10
+
+    def test_unsupported_encoding_raises(self):
+        with pytest.raises(ValueError):
+            utils._content_decoder("compress")
+
+
+class _SlowHandler(BaseHTTPRequestHandler):
+    """/slow sleeps before answering, /fail returns 500, /trickle streams slowly, /ok answers immediately."""
+    hits = []
+    aborted = []
+
+    def do_GET(self):
+        _SlowHandler.hits.append(self.path)
+        if self.path.startswith("/trickle"):
+            self.send_response(200)
+            self.send_header("Content-Length", str(64 * 100))
+            self.end_headers()
+            start = time.monotonic()
+            try:
+                for _ in range(100):
+                    self.wfile.write(b"x" * 64)
+                    self.wfile.flush()
+                    time.sleep(0.05)
+            except OSError:
+                # 客户端关闭了落选的连接
+                _SlowHandler.aborted.append((self.path, time.monotonic() - start))
+            return
+        if self.path.startswith("/slow"):
+            time.sleep(1.5)
+        if self.path.startswith("/fail"):
+            self.send_response(500)
+            self.end_headers()
+            return
+        payload = self.path.encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def flaky_server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _SlowHandler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+class TestHedgedDownload:
+    """Test download_file: hedged mirror requests, per-source deadline, jittered backoff."""
+
+    def test_hedge_to_fast_mirror(self, flaky_server):
+        start = time.monotonic()
+        text = utils.download_file(f"{flaky_server}/slow", mirrors=[f"{flaky_server}/ok"], hedge_after=0.2, retries=1)
+        assert text == "/ok"
+        assert time.monotonic() - start < 1.2
+
+    def test_losing_request_is_closed(self, flaky_server, monkeypatch):
+        import executors
+        monkeypatch.setattr(utils, "_DOWNLOAD_CHUNK", 64)
+        submitted = executors.fetch_pool().stats()["submitted"]
+        text = utils.download_file(f"{flaky_server}/trickle", mirrors=[f"{flaky_server}/ok5"], hedge_after=0.2, retries=1)
+        assert text == "/ok5"
+        # 两个请求都经由有界的 fetch 池执行
+        assert executors.fetch_pool().stats()["submitted"] == submitted + 2
+        # 落选的 /trickle 连接被关闭，不会读完 5 秒的响应体
+        deadline = time.monotonic() + 3
+        while not _SlowHandler.aborted and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert [path for path, _ in _SlowHandler.aborted] == ["/trickle"]
+        assert _SlowHandler.aborted[0][1] < 3
+
+    def test_cancelled_attempt_does_not_start(self, flaky_server):
+        attempt = utils._FetchAttempt(f"{flaky_server}/ok6")
+        attempt.cancel()
+        with pytest.raises(ConnectionAbortedError):
+            utils._fetch_once(attempt.url, 5, attempt)
+        assert "/ok6" not in _SlowHandler.hits
+
+    def test_failure_switches_to_mirror_immediately(self, flaky_server):
+        start = time.monotonic()
+        text = utils.download_file(f"{flaky_server}/fail", mirrors=[f"{flaky_server}/ok2"], hedge_after=10, retries=1)
+        assert text == "/ok2"
+        assert time.monotonic() - start < 1.0
+
+    def test_primary_wins_when_fast(self, flaky_server):
+        assert utils.download_file(f"{flaky_server}/ok3", mirrors=[f"{flaky_server}/ok4"], retries=1) == "/ok3"
+        assert "/ok4" not in _SlowHandler.hits
+
+    def test_deadline(self, flaky_server, capsys):
+        start = time.monotonic()
+        assert utils.download_file(f"{flaky_server}/slow2", mirrors=[], deadline=0.3, retries=3) == ""
+        assert time.monotonic() - start < 1.0
+        assert "下载失败" in capsys.readouterr().out
+
+    def test_backoff_between_rounds(self, flaky_server, monkeypatch):
+        delays = []
+        monkeypatch.setattr(utils, "_backoff_delay", lambda attempt: delays.append(attempt) or 0.01)
+        assert utils.download_file(f"{flaky_server}/fail2", mirrors=[f"{flaky_server}/fail3"], retries=3) == ""
+        assert delays == [0, 1]
+        assert _SlowHandler.hits.count("/fail2") == 3 and _SlowHandler.hits.count("/fail3") == 3
+
+    def test_backoff_is_exponential_with_jitter(self):
+        for attempt in range(4):
+            base = utils.DOWNLOAD_BACKOFF_BASE * 2 ** attempt
+            assert base * 0.5 <= utils._backoff_delay(attempt) <= base * 1.5
+
+
+class TestMirrorUrls:
+    """Test mirror_urls: GitHub raw URLs are rewritten to configured mirrors."""
+
+    def test_raw_githubusercontent(self):
+        mirrors = utils.mirror_urls("https://raw.githubusercontent.com/o/r/refs/heads/main/a/b.txt")
+        assert mirrors[0] == "https://cdn.jsdelivr.net/gh/o/r@main/a/b.txt"
+
+    def test_github_raw(self):
+        mirrors = utils.mirror_urls("https://github.com/o/r/raw/meta/geo/x.list")
+        assert mirrors[0] == "https://cdn.jsdelivr.net/gh/o/r@meta/geo/x.list"
+
+    def test_no_mirror(self):
+        assert utils.mirror_urls("https://ruleset.skk.moe/List/non_ip/ai.conf") == []
+
+
+class TestLocalSources:
+    """Test resolve_local_source / download_file: repository URLs are served from the working tree."""
+
+    PREFIX = "https://raw.githubusercontent.com/wuiiled/Wuiiled_Setup/master/"
+
+    def test_resolves_existing_file(self, monkeypatch):
+        monkeypatch.setattr(utils, "_hedged_fetch", lambda *a, **k: pytest.fail("network used"))
+        before = utils.local_source_hits()
+        text = utils.download_file(self.PREFIX + "scripts/fake-ip-addon.txt")
+        with open(utils.resolve_local_source(self.PREFIX + "scripts/fake-ip-addon.txt"), encoding='utf-8') as f:
+            assert text == f.read()
+        assert utils.local_source_hits() == before + 1
+
+    def test_missing_file_falls_back_to_network(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(utils, "_hedged_fetch", lambda candidates, *a: calls.append(candidates) or "remote")
+        assert utils.download_file(self.PREFIX + "rules/does-not-exist.txt", mirrors=[]) == "remote"
+        assert calls == [[self.PREFIX + "rules/does-not-exist.txt"]]
+
+    def test_rejects_paths_outside_repo(self):
+        assert utils.resolve_local_source(self.PREFIX + "../../etc/passwd") is None
+        assert utils.resolve_local_source("https://example.com/rules/Custom_Proxy.txt") is None
@@ -72,3 +72,112 @@ class TestNormalizeDomainLine:
 
     def test_comma_separated_takes_first(self):
         assert normalize_domain_line("example.com,extra") == "example.com"
+
+
+class TestProcessNormalizeDomain:
+    """Test process_normalize_domain: bulk-decoded fast path keeps per-line semantics."""
+
+    LINES = [
+        "Example.COM", "0.0.0.0 ads.example.com", "||track.example.org^", "@@||allow.example.net^",
+        "! comment", "+.suffix.example.cn", "1.2.3.4", "1.2.3.4.5", "a_b.example.com", "-bad.example.com",
+        "bad-.example.com", "example.com.", "*.wild.com", "domain-suffix,rule.example.com", "  spaced.example.com  ",
+        "中文.example.com", "ÜBER.example.com", "",
+    ]
+
+    def _expected(self, lines, skip_allow_rules):
+        result = set()
+        for line in lines:
+            line = line.strip().lower()
+            if not line or (skip_allow_rules and line.startswith("@@")): continue
+            res = normalize_domain_line(line)
+            if res: result.add(res)
+        return sorted(result)
+
+    def _run(self, tmp_path, content, skip_allow_rules=False):
+        from utils import process_normalize_domain
+        src, dst = tmp_path / "in.txt", tmp_path / "out.txt"
+        src.write_bytes(content)
+        process_normalize_domain(str(src), str(dst), skip_allow_rules=skip_allow_rules)
+        return dst.read_text(encoding='utf-8').splitlines()
+
+    def test_ascii_parity(self, tmp_path):
+        ascii_lines = [l for l in self.LINES if l.isascii()]
+        content = '\n'.join(ascii_lines).encode('ascii')
+        assert self._run(tmp_path, content) == self._expected(ascii_lines, False)
+
+    def test_non_ascii_fallback_parity(self, tmp_path):
+        content = '\n'.join(self.LINES).encode('utf-8')
+        assert self._run(tmp_path, content, True) == self._expected(self.LINES, True)
+
+    def test_crlf_and_cr_newlines(self, tmp_path):
+        assert self._run(tmp_path, b"a.example.com\r\nb.example.com\rc.example.com") == \
+            ["a.example.com", "b.example.com", "c.example.com"]
+
+
+class TestSourceFormats:
+    """Test per-format parsers: each must match normalize_domain_line on every line, whatever the declared format."""
+
+    CORPUS = [
+        # hosts
+        "0.0.0.0 ads.example.com", "127.0.0.1\ttrack.example.net", "0.0.0.0 localhost", "0.0.0.0 1.2.3.4",
+        "0.0.0.0 a.example.com b.example.com", "0.0.0.0 c.example.com # tail", "0.0.0.0a.example.com",
+        # adguard
+        "||ads.example.org^", "@@||allow.example.org^", "||opt.example.org^$important", "||*.wild.example.org^",
+        "|https.example.org^", "||dot.example.org.^", "! title", "!#comment", "@@|bar|",
+        # clash classical
+        "domain,exact.example.com", "domain-suffix,suffix.example.com,reject", "domain-keyword,keyword",
+        "domain-keyword,kw.example.com", "ip-cidr,1.2.3.0/24,no-resolve", "domain-wildcard,*.w.example.com",
+        "domain,x.example.com$y", "domain,trail.example.com.", ",lead.example.com", "foo.bar,baz.example.com",
+        "process-name,app.exe", "domain-suffix,sp ace.example.com",
+        # domainset
+        "plain.example.com", ".dot.example.com", "+.plus.example.com", "..double.example.com", "+.",
+        ".", "1.2.3.4", "a_b.example.com", "-bad.example.com", "example.com.", "# comment", "x.example.com#c",
+        # yaml
+        "payload:", "  - '+.lan'", "- domain-suffix,y.example.com", "dns:", "fake-ip-filter:",
+    ]
+
+    def test_every_parser_matches_generic(self):
+        from utils import SOURCE_FORMATS, _FORMAT_PARSERS
+        for fmt in SOURCE_FORMATS:
+            parse = _FORMAT_PARSERS[fmt]
+            for line in self.CORPUS:
+                line = line.strip()
+                assert parse(line) == normalize_domain_line(line), (fmt, line)
+
+    @pytest.mark.parametrize("lines,expected", [
+        (["# hosts", "0.0.0.0 a.com", "0.0.0.0 b.com", "c.com"], "hosts"),
+        (["! adguard", "||a.com^", "@@||b.com^"], "adguard"),
+        (["DOMAIN-SUFFIX,a.com", "DOMAIN,b.com", "IP-CIDR,1.2.3.0/24"], "clash"),
+        (["payload:", "  - '+.a.com'", "  - 'b.com'"], "yaml"),
+        ([".a.com", "+.b.com", "c.com"], "domainset"),
+        ([], "domainset"),
+    ])
+    def test_detect_source_format(self, lines, expected):
+        from utils import detect_source_format
+        assert detect_source_format('\n'.join(lines)) == expected
+
+    @pytest.mark.parametrize("fmt", [None, "domainset", "hosts", "adguard", "clash", "yaml"])
+    def test_process_parity_with_declared_format(self, tmp_path, fmt):
+        from utils import process_normalize_domain
+        src, dst = tmp_path / "in.txt", tmp_path / "out.txt"
+        src.write_text('\n'.join(self.CORPUS), encoding='utf-8')
+        process_normalize_domain(str(src), str(dst), fmt=fmt)
+        expected = sorted({r for r in map(normalize_domain_line, (l.strip() for l in self.CORPUS)) if r})
+        assert dst.read_text(encoding='utf-8').splitlines() == expected
+
+
+class TestParseFakeipText:
+    """Test parse_fakeip_text: fast yaml/list paths must match the generic parse_fakeip_line."""
+
+    LINES = [
+        "dns:", "  fake-ip-filter:", "    - '+.lan'", '    - "*.local"', "    - +.msftncsi.com", "  - ' spaced.com'",
+        "  - '#hidden'", "  - 'a'", "  - 'q\\'uote'", "-\tx.com", "- - y.com", "+.plain.com", "time.*.com",
+        "# comment", "fake-ip-filter-mode: blacklist", "  ", "trail.com  ",
+    ]
+
+    @pytest.mark.parametrize("fmt", [None, "yaml", "domainset"])
+    def test_parity(self, fmt):
+        from utils import parse_fakeip_text, parse_fakeip_line
+        text = '\n'.join(self.LINES).lower()
+        expected = {r for r in map(parse_fakeip_line, self.LINES) if r}
+        assert parse_fakeip_text(text, fmt) == expected
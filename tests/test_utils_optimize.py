@@ -80,3 +80,246 @@ class TestOptimizeSmartSelf:
         assert os.path.getsize(out_path) == 0
         os.unlink(in_path)
         os.unlink(out_path)
+
+    def test_unique_input_matches_sorted_scan(self):
+        """Hash path for unique input must keep the same rules as the sort-based scan."""
+        import random
+        from utils import SORTED_UNIQUE
+        rnd = random.Random(7)
+        labels = ["a", "b", "c", "com", "net"]
+        lines = set()
+        for _ in range(400):
+            name = ".".join(rnd.choice(labels) for _ in range(rnd.randint(1, 4)))
+            lines.add(rnd.choice(["", "+.", "."]) + name)
+        lines = sorted(lines)
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False, encoding='utf-8') as inf:
+            inf.write('\n'.join(lines) + '\n')
+            in_path = inf.name
+        outputs = []
+        for inv in (frozenset(), SORTED_UNIQUE):
+            out_path = in_path + '.out'
+            returned = optimize_smart_self(in_path, out_path, inv)
+            with open(out_path, 'r', encoding='utf-8') as f:
+                outputs.append((f.read().splitlines(), returned))
+            os.unlink(out_path)
+        os.unlink(in_path)
+        (scan, scan_inv), (fast, fast_inv) = outputs
+        assert sorted(scan) == sorted(fast)
+        assert fast == sorted(fast)
+        assert fast_inv == SORTED_UNIQUE
+        assert "unique" in scan_inv
+
+    def test_exact_duplicates_removed(self):
+        result = self._run(["a.com", "a.com", "b.com"])
+        assert result.count("a.com") == 1
+
+
+class TestReversedLabels:
+    """Test reversed_labels: reversed, interned label tuples used as the sorted-scan key."""
+
+    def test_reversed(self):
+        from utils import reversed_labels
+        assert reversed_labels("a.example.com") == ("com", "example", "a")
+        assert reversed_labels("com") == ("com",)
+
+    def test_labels_are_interned(self):
+        import sys
+        from utils import reversed_labels
+        # 运行时拼接出的字符串不会自动驻留，相同标签仍应得到同一对象
+        first = reversed_labels(".".join(["a", "exam" + "ple", "c" + "om"]))
+        second = reversed_labels(".".join(["b", "exa" + "mple", "co" + "m"]))
+        assert first[0] is second[0] is sys.intern("com")
+        assert first[1] is second[1]
+
+    def test_parent_is_tuple_prefix(self):
+        from utils import reversed_labels
+        child, parent = reversed_labels("x.a.example.com"), reversed_labels("example.com")
+        assert child[:len(parent)] == parent
+        assert reversed_labels("xexample.com")[:2] != parent
+
+    def test_sorted_scan_shares_label_objects(self, monkeypatch):
+        """Keys built by the sort path hold one object per distinct label."""
+        import utils
+        keys = []
+        real = utils.reversed_labels
+        monkeypatch.setattr(utils, "reversed_labels", lambda domain: keys.append(real(domain)) or keys[-1])
+        lines = [".".join([f"h{i}", "exam" + "ple", "c" + "om"]) for i in range(50)] + ["+.cdn.example.com"]
+        assert sorted(utils._optimize_sorted_scan(lines)) == sorted(lines)
+        assert len({id(key[0]) for key in keys}) == 1
+        assert len({id(key[1]) for key in keys}) == 1
+
+
+class TestMergeSortedUnique:
+    """Test merge_sorted_unique: linear merge of sorted runs with dedup."""
+
+    def test_merge(self):
+        from utils import merge_sorted_unique
+        assert list(merge_sorted_unique(["a", "c"], ["b", "c", "d"])) == ["a", "b", "c", "d"]
+
+    def test_empty(self):
+        from utils import merge_sorted_unique
+        assert list(merge_sorted_unique([], [])) == []
+
+
+class TestPruneSubsumed:
+    """Test prune_subsumed: drop entries covered by a broader suffix rule in the same set."""
+
+    def test_exact_under_suffix(self):
+        from utils import prune_subsumed
+        assert prune_subsumed(["+.a.com", "a.com", "x.a.com", "b.com"]) == ["+.a.com", "b.com"]
+
+    def test_dot_suffix_keeps_apex(self):
+        """.S only covers strict subdomains, so the apex stays."""
+        from utils import prune_subsumed
+        assert prune_subsumed([".a.com", "a.com", "x.a.com", "+.y.a.com"]) == [".a.com", "a.com"]
+
+    def test_nested_suffixes(self):
+        from utils import prune_subsumed
+        assert prune_subsumed(["+.x.a.com", "+.a.com", ".b.a.com"]) == ["+.a.com"]
+        assert prune_subsumed([".a.com", "+.a.com"]) == ["+.a.com"]
+
+    def test_wildcards(self):
+        from utils import prune_subsumed
+        lines = ["+.a.com", "*.a.com", "+.*.x.a.com", "foo*.b.a.com", "a.*", "*a.com", "*.c.com"]
+        assert prune_subsumed(lines) == ["+.a.com", "a.*", "*a.com", "*.c.com"]
+
+    def test_ips_comments_and_order_preserved(self):
+        from utils import prune_subsumed
+        lines = ["# header", "z.com", "+.3.4", "1.2.3.4", "10.0.0.0/8", "2001:db8::/32", "z.com", "a.com"]
+        assert prune_subsumed(lines) == ["# header", "z.com", "+.3.4", "1.2.3.4", "10.0.0.0/8", "2001:db8::/32", "a.com"]
+
+    def test_finalize_prunes_prefixed_output(self, tmp_path):
+        import utils
+        src = tmp_path / "final.txt"
+        src.write_text("+.x.a.com\na.com\nb.com\n", encoding='utf-8')
+        utils.finalize_output(str(src), str(tmp_path), "OUT", "add_prefix", utils.SORTED_UNIQUE)
+        out = (tmp_path / "OUT.txt").read_text(encoding='utf-8').splitlines()
+        assert [l for l in out if not l.startswith('#')] == ["+.a.com", "+.b.com"]
+        assert utils.INV_PRUNED in utils.get_output_invariants(str(tmp_path / "OUT.txt"))
+
+
+class TestPruneWildcardSubsumed:
+    """Test prune_wildcard_subsumed: Mihomo wildcard semantics (* = one label, +. = apex + subdomains, . = subdomains)."""
+
+    @staticmethod
+    def _matches(pattern, domain):
+        """Reference Mihomo matcher, written independently of the implementation."""
+        labels = domain.split('.')
+        if pattern.startswith('+.') or pattern.startswith('.'):
+            body = pattern[2:] if pattern.startswith('+.') else pattern[1:]
+            fixed = body.split('.')
+            extra = len(labels) - len(fixed)
+            if extra < (0 if pattern.startswith('+.') else 1): return False
+            labels = labels[extra:]
+        else:
+            fixed = pattern.split('.')
+            if len(fixed) != len(labels): return False
+        return all(f == '*' or f == l for f, l in zip(fixed, labels))
+
+    def test_single_label_star(self):
+        from utils import prune_wildcard_subsumed
+        lines = ["*.lan", "a.lan", "b.c.lan", "*.*.lan"]
+        assert prune_wildcard_subsumed(lines) == ["*.lan", "b.c.lan", "*.*.lan"]
+
+    def test_suffix_covers_wildcard(self):
+        from utils import prune_wildcard_subsumed
+        lines = ["+.nintendo.net", "*.srv.nintendo.net", "+.*.srv.nintendo.net", "*.lan", "+.local"]
+        assert prune_wildcard_subsumed(lines) == ["+.nintendo.net", "*.lan", "+.local"]
+
+    def test_equivalent_patterns_keep_shortest(self):
+        from utils import prune_wildcard_subsumed
+        assert prune_wildcard_subsumed(["+.*.lan", ".lan"]) == [".lan"]
+
+    def test_mid_label_star_only_prunes_unportable(self):
+        """time.*.com cannot be expressed by SmartDNS, so it only removes entries that are equally unportable."""
+        from utils import prune_wildcard_subsumed
+        lines = ["time.*.com", "time.apple.com", "time.*.*.com", "time.*.x.com"]
+        assert prune_wildcard_subsumed(lines) == ["time.*.com", "time.apple.com", "time.*.*.com"]
+
+    def test_partial_labels_ips_comments_untouched(self):
+        from utils import prune_wildcard_subsumed
+        lines = ["# header", "*.com", "ntp*.com", "1.2.3.4", "2001:db8::/32", "x.com"]
+        assert prune_wildcard_subsumed(lines) == ["# header", "*.com", "ntp*.com", "1.2.3.4", "2001:db8::/32"]
+
+    def test_coverage_preserved_exhaustively(self):
+        """Union of matched domains is unchanged over a small universe."""
+        import itertools
+        import random
+        from utils import prune_wildcard_subsumed
+        alphabet = ["a", "b", "*"]
+        universe = ['.'.join(p) for n in range(1, 5) for p in itertools.product(["a", "b", "c"], repeat=n)]
+        rnd = random.Random(7)
+        for _ in range(200):
+            lines = set()
+            for _ in range(rnd.randint(1, 8)):
+                body = '.'.join(rnd.choice(alphabet) for _ in range(rnd.randint(1, 3)))
+                lines.add(rnd.choice(["", "+.", "."]) + body)
+            lines = sorted(lines)
+            kept = prune_wildcard_subsumed(lines)
+            before = {d for d in universe if any(self._matches(p, d) for p in lines)}
+            after = {d for d in universe if any(self._matches(p, d) for p in kept)}
+            assert before == after, lines
+
+
+class TestMergeSortedFiles:
+    """Test merge_sorted_files: per-source normalized files merge to the combined result."""
+
+    def test_matches_combined_normalize(self, tmp_path):
+        import utils
+        raw = ["0.0.0.0 b.com\n||a.com^\n", "c.com\n+.a.com\nB.com\n"]
+        paths = []
+        for i, text in enumerate(raw):
+            src, dst = tmp_path / f"s{i}.txt", tmp_path / f"s{i}_clean.txt"
+            src.write_text(text, encoding='utf-8')
+            utils.process_normalize_domain(str(src), str(dst))
+            paths.append(str(dst))
+        (tmp_path / "all.txt").write_text("".join(raw), encoding='utf-8')
+        utils.process_normalize_domain(str(tmp_path / "all.txt"), str(tmp_path / "all_clean.txt"))
+        assert utils.merge_sorted_files(paths, str(tmp_path / "merged.txt")) == utils.SORTED_UNIQUE
+        assert (tmp_path / "merged.txt").read_text() == (tmp_path / "all_clean.txt").read_text()
+
+
+class TestSelectBudgetProfile:
+    """Test select_budget_profile: rank rules by score and keep the best ones within a budget."""
+
+    def _run(self, tmp_path, lines, sources, **kwargs):
+        from utils import select_budget_profile
+        final = tmp_path / "final.txt"
+        final.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+        paths = []
+        for i, src in enumerate(sources):
+            path = tmp_path / f"src_{i}.txt"
+            path.write_text('\n'.join(src) + '\n', encoding='utf-8')
+            paths.append(str(path))
+        out = tmp_path / "lite.txt"
+        _, stats = select_budget_profile(str(final), paths, str(out), **kwargs)
+        return out.read_text(encoding='utf-8').splitlines(), stats
+
+    def test_source_count_ranking(self, tmp_path):
+        lines = ["a.com", "b.com", "c.com", "d.com"]
+        sources = [["a.com", "b.com", "c.com"], ["b.com", "c.com"], ["c.com", "d.com"]]
+        result, stats = self._run(tmp_path, lines, sources, max_rules=2)
+        assert result == ["b.com", "c.com"]
+        assert stats == {"total_rules": 4, "rules": 2, "bytes": 12, "min_sources": 2}
+
+    def test_promoted_suffix_inherits_subdomain_count(self, tmp_path):
+        lines = ["+.tracker.example", "a.com"]
+        sources = [["x.tracker.example", "a.com"], ["x.tracker.example"]]
+        result, _ = self._run(tmp_path, lines, sources, max_rules=1)
+        assert result == ["+.tracker.example"]
+
+    def test_byte_budget_with_prefix(self, tmp_path):
+        lines = ["a.com", "b.com", "c.com"]
+        # 每行写出为 "+.x.com\n"，8 字节
+        result, stats = self._run(tmp_path, lines, [lines], max_bytes=17, add_prefix=True)
+        assert result == ["a.com", "b.com"]
+        assert stats["bytes"] == 16
+
+    def test_breadth_score(self, tmp_path):
+        lines = ["x.y.a.com", "b.com", "z.c.com"]
+        result, _ = self._run(tmp_path, lines, [], max_rules=2, score="breadth")
+        assert result == ["b.com", "z.c.com"]
+
+    def test_unknown_score(self, tmp_path):
+        with pytest.raises(ValueError):
+            self._run(tmp_path, ["a.com"], [], score="nope")
@@ -76,3 +76,144 @@ class TestApplyAdvancedWhitelistFilter:
         for p in [block_path, allow_path, out_path]:
             if os.path.exists(p):
                 os.unlink(p)
+
+
+class TestAllowIndex:
+    """Test load_allow_index: content-hash keyed, disk-persisted allowlist index."""
+
+    def _write(self, tmp_path, lines):
+        path = tmp_path / "allow.txt"
+        path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+        return str(path)
+
+    def test_index_contents(self, tmp_path):
+        import utils
+        index = utils.load_allow_index(self._write(tmp_path, ["+.a.example.com", "# c", "b.org"]))
+        assert index.domains == frozenset({"a.example.com", "b.org"})
+        assert index.parents == frozenset({"example.com", "com", "org"})
+
+    def test_loaded_from_disk_cache(self, tmp_path, monkeypatch):
+        import utils
+        path = self._write(tmp_path, ["a.example.com"])
+        first = utils.load_allow_index(path)
+        monkeypatch.setattr(utils, "_ALLOW_INDEXES", {})
+        monkeypatch.setattr(utils, "_compile_allow_index", lambda lines: pytest.fail("index rebuilt"))
+        assert utils.load_allow_index(path) == first
+
+    def test_content_change_rebuilds(self, tmp_path):
+        import utils
+        path = self._write(tmp_path, ["a.com"])
+        assert "a.com" in utils.load_allow_index(path).domains
+        self._write(tmp_path, ["b.com"])
+        assert utils.load_allow_index(path).domains == frozenset({"b.com"})
+
+    def test_corrupt_cache_rebuilds(self, tmp_path, monkeypatch):
+        import utils
+        path = self._write(tmp_path, ["a.com"])
+        utils.load_allow_index(path)
+        cache_dir = os.path.join(utils.CACHE_DIR, "allow-index")
+        for name in os.listdir(cache_dir):
+            with open(os.path.join(cache_dir, name), 'wb') as f:
+                f.write(b"garbage")
+        monkeypatch.setattr(utils, "_ALLOW_INDEXES", {})
+        assert utils.load_allow_index(path).domains == frozenset({"a.com"})
+
+    def test_missing_file_is_empty(self, tmp_path):
+        import utils
+        index = utils.load_allow_index(str(tmp_path / "missing.txt"))
+        assert not index.domains and not index.parents
+
+
+class TestPromoteDenseSubdomains:
+    """Test promote_dense_subdomains: collapse dense sibling subdomains into one +. suffix."""
+
+    def _run(self, tmp_path, block_lines, allow_lines, threshold=3, apply=True):
+        from utils import promote_dense_subdomains
+        block, allow, out = tmp_path / "block.txt", tmp_path / "allow.txt", tmp_path / "out.txt"
+        block.write_text('\n'.join(block_lines) + '\n', encoding='utf-8')
+        allow.write_text('\n'.join(allow_lines) + '\n', encoding='utf-8')
+        _, report = promote_dense_subdomains(str(block), str(allow), str(out), threshold, apply)
+        return out.read_text(encoding='utf-8').splitlines(), report
+
+    def test_promotes_registrable_domain(self, tmp_path):
+        lines = ["a1.tracker.example", "a2.tracker.example", "x.a3.tracker.example", "tracker.example", "keep.com"]
+        result, report = self._run(tmp_path, lines, ["other.com"])
+        assert result == ["+.tracker.example", "keep.com"]
+        assert report["promoted"] == [{"domain": "tracker.example", "subdomains": 3}]
+        assert report["saved"] == 3
+
+    def test_below_threshold_untouched(self, tmp_path):
+        lines = ["a1.tracker.example", "a2.tracker.example", "keep.com"]
+        result, report = self._run(tmp_path, lines, [])
+        assert result == lines
+        assert report["promoted"] == []
+
+    def test_uses_public_suffix(self, tmp_path):
+        """Siblings under com.cn / github.io are grouped by their own registrable domain, not the suffix."""
+        lines = ["a.x.com.cn", "b.y.com.cn", "c.z.com.cn", "u1.github.io", "u2.github.io", "u3.github.io"]
+        result, report = self._run(tmp_path, lines, [])
+        assert result == lines
+        assert report["promoted"] == []
+
+    def test_allowlisted_subdomain_blocks_promotion(self, tmp_path):
+        lines = ["a.ads.example", "b.ads.example", "c.ads.example"]
+        result, report = self._run(tmp_path, lines, ["cdn.ads.example"])
+        assert result == lines
+        assert report["allowlisted"] == [{"domain": "ads.example", "subdomains": 3}]
+
+    def test_dry_run_reports_only(self, tmp_path):
+        lines = [".a.ads.example", "+.b.ads.example", "c.ads.example"]
+        result, report = self._run(tmp_path, lines, [], apply=False)
+        assert result == lines
+        assert report["applied"] is False
+        assert report["saved"] == 2
+
+
+class TestPublicSuffixList:
+    """Test public_suffix.PublicSuffixList: normal, wildcard and exception rules."""
+
+    def _psl(self):
+        from public_suffix import PublicSuffixList
+        return PublicSuffixList(["// comment", "com", "com.cn", "*.ck", "!www.ck", "github.io extra", ""])
+
+    @pytest.mark.parametrize("domain,expected", [
+        ("a.b.example.com", "example.com"),
+        ("x.example.com.cn", "example.com.cn"),
+        ("u.github.io", "u.github.io"),
+        ("a.b.foo.ck", "b.foo.ck"),
+        ("a.www.ck", "www.ck"),
+        ("a.b.unlisted", "b.unlisted"),
+        ("com.cn", None),
+        ("foo.ck", None),
+    ])
+    def test_registrable_domain(self, domain, expected):
+        assert self._psl().registrable_domain(domain) == expected
+
+    def test_bundled_list_loads(self):
+        from public_suffix import default_list
+        psl = default_list()
+        assert psl.registrable_domain("ad.x.example.co.uk") == "example.co.uk"
+        assert psl.registrable_domain("t.example.com") == "example.com"
+
+    @pytest.mark.parametrize("domain,expected", [
+        # 通配规则 *.compute.amazonaws.com：区域一级也属于公共后缀
+        ("a.ec2-1-2-3-4.us-west-2.compute.amazonaws.com", "ec2-1-2-3-4.us-west-2.compute.amazonaws.com"),
+        ("x.y.example.gd.cn", "example.gd.cn"),
+        ("cdn.example.com.cn", "example.com.cn"),
+        ("static.shop.myshopify.com", "shop.myshopify.com"),
+        # 通配 *.ck 与例外 !www.ck
+        ("a.b.foo.ck", "b.foo.ck"),
+        ("a.www.ck", "www.ck"),
+        ("us-west-2.compute.amazonaws.com", None),
+    ])
+    def test_bundled_list_multi_level(self, domain, expected):
+        from public_suffix import default_list
+        assert default_list().registrable_domain(domain) == expected
+
+    def test_bundled_list_is_upstream_snapshot(self):
+        from public_suffix import DEFAULT_LIST_PATH
+        with open(DEFAULT_LIST_PATH, encoding='utf-8') as f:
+            text = f.read()
+        # 未经裁剪的上游文件：带版本头，ICANN 与 PRIVATE 两段完整
+        assert "// VERSION: " in text[:1024] and "// COMMIT: " in text[:1024]
+        assert "===END ICANN DOMAINS===" in text and "===END PRIVATE DOMAINS===" in text